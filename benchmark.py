@@ -0,0 +1,327 @@
+"""
+Micro-benchmark pipeline data dashboard (tanpa Streamlit server & tanpa Firestore).
+
+Contoh:
+    python benchmark.py timestamps --n 200000
+    python benchmark.py pipeline --sizes 10000 100000 1000000 --out bench.json
+    python benchmark.py pipeline --sizes 10000 100000 --baseline bench.json --max-regression 0.25
+    python benchmark.py memory --n 200000
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, time as dt_time
+
+import numpy as np
+import pandas as pd
+
+import dashboard
+import fake_backend
+
+
+def _parse_flexible_date_baseline(ts):
+    """parse_flexible_date versi lama (strptime bertingkat per baris), sebagai pembanding."""
+    if not ts: return None
+    if hasattr(ts, 'date'): return ts
+    ts_str = str(ts)
+    try: return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        try: return datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                d = datetime.strptime(ts_str, "%Y-%m-%d").date()
+                return datetime.combine(d, dt_time(0,0,0))
+            except: return None
+
+
+def make_timestamps(n, days=365, seed=0):
+    """Campuran realistis: mayoritas format POS, sebagian ISO 'Z', dan stempel Z-REPORT 23:59:59."""
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    out = []
+    for _ in range(n):
+        t = start + timedelta(seconds=rnd.randint(0, days * 86400 - 1))
+        r = rnd.random()
+        if r < 0.90: out.append(t.strftime("%Y-%m-%d %H:%M:%S"))
+        elif r < 0.95: out.append(t.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+        else: out.append(t.strftime("%Y-%m-%d") + " 23:59:59")
+    return out
+
+
+def _seconds_per_million(fn, n):
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1_000_000 / n
+
+
+def bench_timestamps(n):
+    stamps = make_timestamps(n)
+    dashboard._parse_timestamp_str.cache_clear()
+    results = {
+        "parse_flexible_date (lama, per baris)":
+            _seconds_per_million(lambda: [_parse_flexible_date_baseline(t) for t in stamps], n),
+        "parse_flexible_date (fast path + cache)":
+            _seconds_per_million(lambda: [dashboard.parse_flexible_date(t) for t in stamps], n),
+        "parse_timestamp_column (batch)":
+            _seconds_per_million(lambda: dashboard.parse_timestamp_column(stamps), n),
+    }
+    print(f"Parsing {n:,} timestamp (hasil dikonversi ke detik per 1 juta timestamp)")
+    for name, sec in results.items():
+        print(f"  {name:<42} {sec:8.2f} s / 1 juta")
+    return results
+
+
+# --- PIPELINE (normalize -> filter tanggal -> analisa -> Excel) ---
+
+def make_transactions(n, days=365, seed=0, end_date=date(2024, 12, 31)):
+    """n transaksi sintetis (generator fake_backend) tersebar rata di `days` hari terakhir s/d end_date."""
+    rnd = random.Random(seed)
+    catalog = [(cat, name, price) for cat, items in fake_backend.MENU_CATALOG.items() for name, price in items]
+    per_day = math.ceil(n / days)
+    out = []
+    for offset in range(days - 1, -1, -1):
+        day = (end_date - timedelta(days=offset)).isoformat()
+        out += [fake_backend.make_transaction(rnd, day, seq, "BM", catalog) for seq in range(1, min(per_day, n - len(out)) + 1)]
+    return out
+
+
+def _current_rss():
+    """RSS proses saat ini (byte). Linux: /proc/self/statm; lainnya: puncak ru_maxrss sebagai pendekatan."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _RssSampler:
+    """Sampling RSS di thread terpisah selama satu tahap -> puncak RSS tahap itu."""
+    def __init__(self, interval=0.01):
+        self.interval, self.peak, self._stop = interval, _current_rss(), threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval): self.peak = max(self.peak, _current_rss())
+
+    def __enter__(self):
+        self.start = _current_rss(); self._thread.start(); return self
+
+    def __exit__(self, *exc):
+        self._stop.set(); self._thread.join(); self.peak = max(self.peak, _current_rss())
+
+
+def measure(fn, trace_alloc=True, repeat=3):
+    """
+    Jalankan fn `repeat` kali untuk waktu (diambil yang tercepat, mengurangi noise) & puncak RSS,
+    lalu 1 pass terpisah (opsional) untuk alokasi via tracemalloc (tracemalloc memperlambat eksekusi,
+    jadi waktunya tidak dicampur). Return (hasil run terakhir, metrik).
+    """
+    wall = float("inf")
+    with _RssSampler() as rss:
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            result = fn()
+            wall = min(wall, time.perf_counter() - t0)
+    metrics = {"wall_s": round(wall, 4), "rss_peak_mb": round(rss.peak / 2**20, 1),
+               "rss_delta_mb": round((rss.peak - rss.start) / 2**20, 1)}
+    if trace_alloc:
+        del result
+        tracemalloc.start()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics["alloc_peak_mb"] = round(peak / 2**20, 1)
+    return result, metrics
+
+
+def _excel_stage(df_orders, df_items):
+    fd, path = tempfile.mkstemp(suffix=".xlsx"); os.close(fd)
+    try:
+        dashboard.create_esb_style_excel(df_orders, df_items, "Benchmark", "ALL", "ALL", output_path=path)
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def bench_pipeline(sizes, trace_alloc=True, skip_excel=False, repeat=3):
+    """
+    Tahap pipeline pada dataset sintetis per ukuran:
+      normalize   : normalize_transactions (pengganti process_data_for_display + process_data_for_analysis)
+      date_filter : build_day_index + slice_by_date (30 hari terakhir & seluruh rentang)
+      analysis    : compute_daily_rollups + agregat KPI/kategori/top menu dari rollup
+      excel       : create_esb_style_excel ke file sementara
+    """
+    results = []
+    for n in sizes:
+        t0 = time.perf_counter()
+        history = make_transactions(n)
+        print(f"\n{n:,} transaksi (data dibuat dalam {time.perf_counter() - t0:.1f} s)")
+
+        def date_filter():
+            o_idx, i_idx = dashboard.build_day_index(df_orders), dashboard.build_day_index(df_items)
+            last = df_orders["Tanggal"].iloc[-1]
+            for d1 in (last - timedelta(days=29), df_orders["Tanggal"].iloc[0]):
+                dashboard.slice_by_date(df_orders, o_idx, d1, last)
+                dashboard.slice_by_date(df_items, i_idx, d1, last)
+            return o_idx, i_idx
+
+        def analysis():
+            rollups = dashboard.compute_daily_rollups(df_orders, df_items)
+            for dim, key in (("kategori", "Kategori"), ("item", "Nama Menu"), ("bayar", "Metode Bayar")):
+                dashboard.rollup_by(rollups, dim, key)
+            return rollups
+
+        (df_orders, df_items), m = measure(lambda: dashboard.normalize_transactions(history), trace_alloc, repeat)
+        stages = [("normalize", m)]
+        del history
+        stages.append(("date_filter", measure(date_filter, trace_alloc, repeat)[1]))
+        stages.append(("analysis", measure(analysis, trace_alloc, repeat)[1]))
+        if not skip_excel: stages.append(("excel", measure(lambda: _excel_stage(df_orders, df_items), trace_alloc, repeat)[1]))
+
+        for stage, m in stages:
+            results.append({"size": n, "stage": stage, "orders": len(df_orders), "items": len(df_items), **m})
+            alloc = f"{m['alloc_peak_mb']:8.1f} MB alloc" if "alloc_peak_mb" in m else ""
+            print(f"  {stage:<12} {m['wall_s']:9.3f} s {m['rss_peak_mb']:9.1f} MB RSS (+{m['rss_delta_mb']:.1f}) {alloc}")
+        del df_orders, df_items
+    return results
+
+
+def check_regressions(results, baseline, max_regression, min_seconds=0.1):
+    """
+    Bandingkan dengan hasil JSON sebelumnya. Regresi = waktu (atau puncak alokasi) naik lebih dari max_regression
+    (fraksi). Selisih waktu di bawah min_seconds diabaikan (noise). Return list pesan regresi.
+    """
+    old = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    failures = []
+    for r in results:
+        prev = old.get((r["size"], r["stage"]))
+        if prev is None: continue
+        if r["wall_s"] > prev["wall_s"] * (1 + max_regression) and r["wall_s"] - prev["wall_s"] > min_seconds:
+            failures.append(f"{r['stage']} @ {r['size']:,}: waktu {prev['wall_s']:.3f} s -> {r['wall_s']:.3f} s")
+        if "alloc_peak_mb" in r and "alloc_peak_mb" in prev and r["alloc_peak_mb"] > prev["alloc_peak_mb"] * (1 + max_regression) + 1:
+            failures.append(f"{r['stage']} @ {r['size']:,}: alokasi {prev['alloc_peak_mb']:.1f} MB -> {r['alloc_peak_mb']:.1f} MB")
+    return failures
+
+
+# --- MEMORI SKEMA LAMA vs SKEMA RINGKAS ---
+
+LEGACY_TEXT_COLUMNS = ["Tipe Order", "Metode Bayar", "Kasir", "Nama Menu", "Kategori", "Kategori Item", "Dokumen"]
+
+
+def legacy_schema(df_orders, df_items):
+    """
+    Tabel yang sama dalam skema lama: Tanggal = objek date, Waktu = objek time, nominal = float64,
+    teks = tipe string bawaan pandas (object di pandas 2, str di pandas 3) seperti hasil normalize_transactions dulu.
+    """
+    def convert(df):
+        out = df.copy()
+        for c in LEGACY_TEXT_COLUMNS:
+            if c in out: out[c] = out[c].astype(object).infer_objects()
+        for c in dashboard.MONEY_COLUMNS + ["Harga Satuan", "Total"]:
+            if c in out: out[c] = out[c].astype(float)
+        out["Tanggal"] = np.array(out["Tanggal"].dt.date.tolist() + [None], dtype=object)[:-1]
+        if "Waktu" in out: out["Waktu"] = np.array((pd.Timestamp(0) + out["Waktu"]).dt.time.tolist() + [None], dtype=object)[:-1]
+        if "Jam" in out: out["Jam"] = out["Jam"].astype(int)
+        return out
+    return convert(df_orders), convert(df_items)
+
+
+def _mb(nbytes):
+    return round(nbytes / 2**20, 2)
+
+
+def _groupby_suite(df_orders, df_items):
+    """groupby yang dipakai tab & sheet Excel (Payment, Category, Item Sales, Hourly) + rollup harian."""
+    sold = dashboard.sales_items(df_items)
+    df_orders.groupby("Metode Bayar", observed=True).agg({"Grand Total": "sum", "Kode Unik": "count"})
+    sold.groupby("Kategori", observed=True).agg({"Total": "sum", "Qty": "sum"})
+    sold.groupby(["Kategori", "Nama Menu", "Tipe Order"], observed=True).agg({"Qty": "sum", "Total": "sum"})
+    df_orders.groupby("Jam").agg({"Grand Total": "sum", "Kode Unik": "count"})
+    return dashboard.compute_daily_rollups(df_orders, df_items)
+
+
+def bench_memory(n, repeat=3):
+    """Memori (deep) per kolom & waktu groupby: skema lama vs skema ringkas pada data yang sama."""
+    df_orders, df_items = dashboard.normalize_transactions(make_transactions(n))
+    df_orders["Dokumen"] = pd.Categorical(df_orders["Tanggal"].dt.strftime("%Y-%m-%d"))  # Seperti tabel dari mirror
+    df_items["Dokumen"] = pd.Categorical(df_items["Tanggal"].dt.strftime("%Y-%m-%d"))
+    old_orders, old_items = legacy_schema(df_orders, df_items)
+    print(f"{n:,} transaksi: {len(df_orders):,} order, {len(df_items):,} item\n")
+
+    report = {"size": n, "tables": {}, "groupby": {}}
+    for table, old, new in (("orders", old_orders, df_orders), ("items", old_items, df_items)):
+        old_cols, new_cols = old.memory_usage(deep=True, index=False), new.memory_usage(deep=True, index=False)
+        cols = {c: {"old_mb": _mb(old_cols[c]), "new_mb": _mb(new_cols[c]), "old_dtype": str(old[c].dtype),
+                    "new_dtype": "category" if isinstance(new[c].dtype, pd.CategoricalDtype) else str(new[c].dtype)}
+                for c in new.columns}
+        report["tables"][table] = {"old_mb": _mb(old_cols.sum()), "new_mb": _mb(new_cols.sum()), "columns": cols}
+        print(f"Tabel {table}: {_mb(old_cols.sum()):.1f} MB -> {_mb(new_cols.sum()):.1f} MB "
+              f"({old_cols.sum() / max(new_cols.sum(), 1):.1f}x lebih kecil)")
+        for c, m in cols.items():
+            if m["old_mb"] != m["new_mb"]:
+                print(f"  {c:<14} {m['old_dtype']:>10} {m['old_mb']:9.2f} MB -> {m['new_dtype']:<15} {m['new_mb']:9.2f} MB")
+
+    for label, (o, i) in (("old", (old_orders, old_items)), ("new", (df_orders, df_items))):
+        report["groupby"][f"{label}_wall_s"] = measure(lambda: _groupby_suite(o, i), trace_alloc=False, repeat=repeat)[1]["wall_s"]
+    g = report["groupby"]
+    print(f"\ngroupby tab/Excel + rollup harian: {g['old_wall_s']:.3f} s -> {g['new_wall_s']:.3f} s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline data dashboard.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ts = sub.add_parser("timestamps", help="Biaya parsing timestamp per 1 juta baris.")
+    p_ts.add_argument("--n", type=int, default=200_000)
+    p_pl = sub.add_parser("pipeline", help="Waktu, puncak RSS & alokasi per tahap pipeline (hasil JSON).")
+    p_pl.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p_pl.add_argument("--out", help="Tulis hasil ke file JSON ini.")
+    p_pl.add_argument("--baseline", help="File JSON hasil sebelumnya untuk dibandingkan.")
+    p_pl.add_argument("--max-regression", type=float, default=0.20, help="Batas kenaikan (fraksi) sebelum dianggap gagal.")
+    p_pl.add_argument("--min-seconds", type=float, default=0.1, help="Selisih waktu di bawah ini dianggap noise.")
+    p_pl.add_argument("--repeat", type=int, default=3, help="Ulangan per tahap; waktu = run tercepat.")
+    p_pl.add_argument("--no-alloc", action="store_true", help="Lewati pass tracemalloc (lebih cepat).")
+    p_pl.add_argument("--skip-excel", action="store_true")
+    p_mem = sub.add_parser("memory", help="Memori & waktu groupby: skema lama vs skema ringkas.")
+    p_mem.add_argument("--n", type=int, default=200_000)
+    p_mem.add_argument("--repeat", type=int, default=3)
+    p_mem.add_argument("--out", help="Tulis hasil ke file JSON ini.")
+    args = parser.parse_args()
+
+    if args.command == "timestamps":
+        bench_timestamps(args.n)
+    elif args.command == "memory":
+        report = bench_memory(args.n, args.repeat)
+        if args.out:
+            with open(args.out, "w") as f: json.dump(report, f, indent=2)
+            print(f"\nHasil ditulis ke {args.out}")
+    elif args.command == "pipeline":
+        results = bench_pipeline(args.sizes, trace_alloc=not args.no_alloc, skip_excel=args.skip_excel, repeat=args.repeat)
+        report = {"created": datetime.now().isoformat(timespec="seconds"), "repeat": args.repeat,
+                  "environment": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                                  "platform": platform.platform(), "cpu_count": os.cpu_count()},
+                  "results": results}
+        if args.out:
+            with open(args.out, "w") as f: json.dump(report, f, indent=2)
+            print(f"\nHasil ditulis ke {args.out}")
+        if args.baseline:
+            with open(args.baseline) as f: baseline = json.load(f)
+            failures = check_regressions(results, baseline, args.max_regression, args.min_seconds)
+            if failures:
+                print(f"\nREGRESI (> {args.max_regression:.0%}):")
+                for msg in failures: print(f"  {msg}")
+                sys.exit(1)
+            print(f"\nTidak ada regresi dibanding {args.baseline} (batas {args.max_regression:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
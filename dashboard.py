@@ -1,24 +1,45 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import firebase_admin
 from firebase_admin import credentials, firestore
-from io import BytesIO
-from datetime import datetime, date, time as dt_time
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.api_core import exceptions as google_exceptions
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from datetime import datetime, date, timedelta, time as dt_time
 import altair as alt
 import xlsxwriter
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
 import time
 import os
 import json 
+import threading
+import functools
+import itertools
+import math
+import operator
+import tempfile
+import shutil
+import hashlib
+import hmac
+import concurrent.futures
+import collections
+import contextlib
+import uuid
 
 # ==============================================================================
 # 1. KONFIGURASI HALAMAN
 # ==============================================================================
 
-st.set_page_config(layout="wide", page_title="Dashboard X-POS (Enterprise)")
-
 # Master List Cabang (Untuk Pilihan Dropdown)
 ALL_BRANCHES_MASTER = ["COLEGA_PIK", "HOKEE_PIK", "HOKEE_KG", "Testing"]
+ALL_BRANCHES_OPTION = "Semua Cabang"   # Mode gabungan (muncul jika user punya akses > 1 cabang)
+
+# Backend data: "firestore" (default) atau "fake" (Firestore palsu in-memory berisi data sintetis,
+# untuk benchmark & uji tanpa kredensial; ukuran data lihat fake_backend.client_from_env)
+DATA_BACKEND = os.environ.get("DASHBOARD_BACKEND", "firestore").lower()
 
 # ==============================================================================
 # 2. FIREBASE AUTH & USER MANAGEMENT (NEW)
@@ -28,7 +49,7 @@ ALL_BRANCHES_MASTER = ["COLEGA_PIK", "HOKEE_PIK", "HOKEE_KG", "Testing"]
 def initialize_firebase():
     """Inisialisasi Firebase & Auto-Create Admin jika belum ada."""
     try:
-        if not firebase_admin._apps:
+        if DATA_BACKEND == "firestore" and not firebase_admin._apps:
             if 'firebase_credentials' in st.secrets:
                 cred_info = dict(st.secrets['firebase_credentials'])
                 cred = credentials.Certificate(cred_info)
@@ -49,15 +70,16 @@ def initialize_firebase():
                     st.stop()
         
         # --- AUTO CREATE ADMIN IF NOT EXISTS ---
-        db = firestore.client()
+        db = get_firestore_client()
         # Cek apakah user admin sudah ada
         admin_ref = db.collection('users').document('admin')
         if not admin_ref.get().exists:
             # Jika belum ada, buat user default
             default_admin = {
-                "pin": "123",
+                "pin_hash": hash_pin("123"),
                 "role": "administrator",
                 "access_branches": ["ALL"], # Bisa akses semua
+                "policy_version": 1,
                 "created_at": firestore.SERVER_TIMESTAMP
             }
             admin_ref.set(default_admin)
@@ -66,26 +88,191 @@ def initialize_firebase():
     except Exception as e:
         st.error(f"Firebase Init Error: {e}"); st.stop()
 
+@st.cache_resource
+def _fake_firestore_client():
+    import fake_backend  # Hanya dimuat untuk backend palsu
+    return fake_backend.client_from_env(ALL_BRANCHES_MASTER)
+
 def get_firestore_client():
+    """Client backend data. Semua akses data (transaksi, menu, user) lewat sini, lihat DATA_BACKEND."""
+    if DATA_BACKEND == "fake": return _fake_firestore_client()
     return firestore.client()
 
-def authenticate_user(username, pin):
-    """Cek validitas user dan ambil data role-nya."""
-    db = get_firestore_client()
+# --- PIN & LOGIN ---
+# PIN disimpan sebagai hash scrypt (salt acak per user, memory-hard) di field 'pin_hash'.
+# PIN teks polos (field 'pin', data lama) & hash dengan biaya lama diganti otomatis saat login berhasil berikutnya.
+# Percobaan login dibatasi token bucket per username & per IP: PIN 3-4 digit tidak bisa ditebak beruntun.
+PIN_SCRYPT_N = int(os.environ.get("DASHBOARD_PIN_SCRYPT_N", 2 ** 15))   # Biaya (pangkat 2): memori ≈ 128·N·r byte, ~0.15 detik
+PIN_SCRYPT_R, PIN_SCRYPT_P = 8, 1
+USER_RECORD_TTL = 300          # Detik; record user dibaca ulang dari Firestore paling cepat tiap 5 menit
+USER_RECORD_CACHE_MAX = 1024   # Jumlah record user yang disimpan (LRU)
+LOGIN_LIMIT_USER = (5, 60.0)   # (kapasitas bucket, detik per token): 5 percobaan beruntun, lalu 1 per menit
+LOGIN_LIMIT_IP = (20, 6.0)     # Per IP: 20 percobaan beruntun, lalu 10 per menit (banyak kasir bisa berbagi 1 IP)
+LOGIN_BUCKETS_MAX = 10000     # Batas lunak: hanya bucket yang sudah penuh lagi yang dibuang (lihat take_login_tokens)
+
+def _scrypt(pin, salt, n, r, p):
+    return hashlib.scrypt(str(pin).encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + (1 << 20))
+
+def hash_pin(pin):
+    """PIN -> 'scrypt$N$r$p$salt$hash' (hex), dengan biaya PIN_SCRYPT_* saat ini."""
+    salt = os.urandom(16)
+    digest = _scrypt(pin, salt, PIN_SCRYPT_N, PIN_SCRYPT_R, PIN_SCRYPT_P)
+    return f"scrypt${PIN_SCRYPT_N}${PIN_SCRYPT_R}${PIN_SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def verify_pin(pin, record):
+    """Cek PIN terhadap dokumen user. Return (cocok, perlu_hash_ulang); perbandingan waktu-konstan."""
+    stored = record.get('pin_hash')
+    if not stored:  # Data lama: PIN teks polos
+        legacy = record.get('pin')
+        return legacy is not None and hmac.compare_digest(str(legacy).encode(), str(pin).encode()), True
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        check = _scrypt(pin, bytes.fromhex(salt), n, r, p).hex()
+    except ValueError:
+        return False, False
+    return hmac.compare_digest(check, digest), (n, r, p) != (PIN_SCRYPT_N, PIN_SCRYPT_R, PIN_SCRYPT_P)
+
+@st.cache_resource
+def _user_record_store():
+    """Cache record user untuk login (per proses, dipakai bersama semua sesi). {username: (waktu, record/None)}, urutan LRU."""
+    return {"lock": threading.Lock(), "entries": collections.OrderedDict()}
+
+def get_user_record(username):
+    """Dokumen users/{username} (None jika tidak ada), lewat cache; Firestore hanya dibaca jika entri belum ada / lewat TTL."""
+    store, now = _user_record_store(), time.time()
+    with store['lock']:
+        hit = store['entries'].get(username)
+        if hit and now - hit[0] < USER_RECORD_TTL:
+            store['entries'].move_to_end(username)
+            trace_count("cache.user_record.hit")
+            return hit[1]
+    with trace_span("firestore.user"):
+        doc = get_firestore_client().collection('users').document(username).get()
+    trace_count("firestore.round_trips")
+    record = doc.to_dict() if doc.exists else None
+    with store['lock']:
+        store['entries'][username] = (now, record)
+        store['entries'].move_to_end(username)
+        while len(store['entries']) > USER_RECORD_CACHE_MAX: store['entries'].popitem(last=False)
+    return record
+
+@st.cache_resource
+def _login_buckets():
+    """Token bucket percobaan login. {(jenis, kunci): (token, waktu, (kapasitas, detik_per_token))}, urutan LRU."""
+    return {"lock": threading.Lock(), "buckets": collections.OrderedDict(), "swept": 0.0}
+
+def _bucket_full(bucket, now):
+    left, last, (capacity, per_token) = bucket
+    return left + (now - last) / per_token >= capacity
+
+def take_login_tokens(*buckets):
+    """
+    Ambil 1 token dari semua bucket sekaligus (atau tidak sama sekali).
+    buckets: ((jenis, kunci), (kapasitas, detik_per_token)). Return 0 jika boleh mencoba, selain itu detik tunggu.
+    Di atas LOGIN_BUCKETS_MAX hanya bucket yang sudah penuh lagi yang dibuang (sama dengan bucket baru), jadi
+    membanjiri username/IP sampah tidak bisa mereset bucket target yang masih terisi ulang.
+    """
+    registry, now = _login_buckets(), time.monotonic()
+    with registry['lock']:
+        tokens = {}
+        for key, (capacity, per_token) in buckets:
+            left, last, _ = registry['buckets'].pop(key, (capacity, now, None))
+            tokens[key] = min(capacity, left + (now - last) / per_token)
+        wait = max([0.0] + [(1 - tokens[key]) * per_token for key, (_, per_token) in buckets])
+        for key, limit in buckets:
+            registry['buckets'][key] = (tokens[key] - (0 if wait else 1), now, limit)
+        if len(registry['buckets']) > LOGIN_BUCKETS_MAX and now - registry['swept'] >= 1.0:  # Sapu maks. 1x/detik
+            registry['swept'] = now
+            for key in [k for k, b in registry['buckets'].items() if _bucket_full(b, now)]:
+                registry['buckets'].pop(key)
+    return wait
+
+def reset_login_bucket(key):
+    registry = _login_buckets()
+    with registry['lock']:
+        registry['buckets'].pop(key, None)
+
+def _migrate_pin_hash(username, pin):
+    """Ganti PIN teks polos / hash biaya lama dengan hash baru (dipanggil setelah login berhasil)."""
+    try:
+        get_firestore_client().collection('users').document(username).update(
+            {"pin_hash": hash_pin(pin), "pin": firestore.DELETE_FIELD})
+        invalidate_user_cache(username)
+        print(f"INFO: PIN user '{username}' dimigrasi ke hash scrypt (N={PIN_SCRYPT_N}).")
+    except Exception as e:
+        print(f"WARNING: Migrasi hash PIN user '{username}' gagal: {e}")
+
+def authenticate_user(username, pin, ip=None):
+    """Cek validitas user dan ambil data role-nya. ip: alamat klien untuk pembatasan percobaan per IP."""
+    buckets = [(("user", username), LOGIN_LIMIT_USER)] + ([(("ip", ip), LOGIN_LIMIT_IP)] if ip else [])
+    wait = take_login_tokens(*buckets)
+    if wait:
+        return False, f"Terlalu banyak percobaan. Coba lagi dalam {int(wait) + 1} detik."
     try:
         # Cari dokumen user berdasarkan ID (username)
-        doc = db.collection('users').document(username).get()
-        if doc.exists:
-            data = doc.to_dict()
-            if data.get('pin') == pin:
-                return True, data
-            else:
-                return False, "PIN Salah!"
-        else:
+        data = get_user_record(username)
+        if data is None:
             return False, "Username tidak ditemukan."
+        is_valid, needs_rehash = verify_pin(pin, data)
+        if not is_valid:
+            return False, "PIN Salah!"
+        reset_login_bucket(("user", username))
+        if needs_rehash: _migrate_pin_hash(username, pin)
+        return True, data
     except Exception as e:
         return False, f"Error Database: {e}"
 
+# --- HAK AKSES (POLICY) ---
+# Hak akses user dikompilasi sekali jadi policy (cabang, tab, versi) dan disimpan per proses.
+# Setiap perubahan role/cabang menaikkan field 'policy_version' di dokumen user; versi itu dicek
+# (baca 1 field saja) paling cepat tiap POLICY_CHECK_SECONDS, record lengkap dibaca ulang hanya jika versi berubah.
+POLICY_CHECK_SECONDS = 10
+
+def compile_policy(username, record):
+    """Dokumen user -> policy: {"username", "role", "branches" (urutan ALL_BRANCHES_MASTER), "tabs" (ROLE_TABS), "version"}."""
+    role = record.get('role', 'staff')
+    access = record.get('access_branches', [])
+    return {
+        "username": username,
+        "role": role,
+        "branches": tuple(b for b in ALL_BRANCHES_MASTER if "ALL" in access or b in access),
+        "tabs": ROLE_TABS.get(role, ROLE_TABS['staff']),
+        "version": record.get('policy_version', 0),
+    }
+
+@st.cache_resource
+def _policy_store():
+    """Policy per username (per proses, dipakai bersama semua sesi user itu). {username: (waktu_cek, policy/None)}, urutan LRU."""
+    return {"lock": threading.Lock(), "entries": collections.OrderedDict()}
+
+def get_user_policy(username):
+    """Policy user yang sedang login; None jika dokumen user sudah dihapus."""
+    store, now = _policy_store(), time.time()
+    with store['lock']:
+        entry = store['entries'].get(username)
+    if entry and now - entry[0] < POLICY_CHECK_SECONDS:
+        trace_count("cache.policy.hit")
+        return entry[1]
+
+    with trace_span("firestore.policy_version"):
+        snap = get_firestore_client().collection('users').document(username).get(field_paths=["policy_version"])
+    trace_count("firestore.round_trips")
+    if not snap.exists:
+        policy = None
+    elif entry and entry[1] and entry[1]['version'] == (snap.to_dict() or {}).get('policy_version', 0):
+        policy = entry[1]
+    else:
+        _forget_user(username)  # Versi berubah -> record login user ini juga basi (daftar user tidak perlu dibuang)
+        record = get_user_record(username)
+        policy = compile_policy(username, record) if record is not None else None
+        trace_count("policy.compiled")
+    with store['lock']:
+        store['entries'][username] = (now, policy)
+        store['entries'].move_to_end(username)
+        while len(store['entries']) > USER_RECORD_CACHE_MAX: store['entries'].popitem(last=False)
+    return policy
+
 def add_new_user_to_db(new_username, new_pin, role, branches):
     """Fitur Admin untuk menambah user baru."""
     db = get_firestore_client()
@@ -95,21 +282,47 @@ def add_new_user_to_db(new_username, new_pin, role, branches):
             return False, "Username sudah dipakai!"
         
         payload = {
-            "pin": new_pin,
+            "pin_hash": hash_pin(new_pin),
             "role": role,
             "access_branches": branches, # List: ["COLEGA_PIK", ...] atau ["ALL"]
+            "policy_version": 1,
             "created_at": firestore.SERVER_TIMESTAMP
         }
         doc_ref.set(payload)
+        invalidate_user_cache(new_username)
         return True, f"User {new_username} berhasil dibuat."
     except Exception as e:
         return False, str(e)
 
+def update_user_access(username, role, branches):
+    """
+    Fitur Admin untuk ubah role/akses cabang. Berlaku di sesi user itu paling lambat POLICY_CHECK_SECONDS.
+    Ditolak jika: tanpa cabang, admin yang sedang login menurunkan role-nya sendiri, atau menurunkan admin terakhir.
+    """
+    if not branches:
+        return False, "Pilih minimal 1 cabang."
+    db = get_firestore_client()
+    try:
+        if role != 'administrator':
+            if username == st.session_state.get('user_name'):
+                return False, "Tidak bisa menurunkan role akun Anda sendiri."
+            admins = [d.id for d in db.collection('users').where('role', '==', 'administrator').stream()]
+            trace_count("firestore.round_trips")
+            if admins == [username]:
+                return False, "Tidak bisa menurunkan administrator terakhir."
+        db.collection('users').document(username).update(
+            {"role": role, "access_branches": branches, "policy_version": firestore.Increment(1)})
+        invalidate_user_cache(username)
+        return True, f"Akses user {username} diperbarui."
+    except Exception as e:
+        return False, str(e)
+
 def delete_user_from_db(username):
     """Fitur Admin untuk hapus user."""
     db = get_firestore_client()
     try:
         db.collection('users').document(username).delete()
+        invalidate_user_cache(username)
         return True
     except Exception as e:
         return False
@@ -118,9 +331,12 @@ def get_all_users():
     """Ambil list semua user untuk ditampilkan ke Admin."""
     db = get_firestore_client()
     users = []
-    docs = db.collection('users').stream()
+    with trace_span("firestore.users"):
+        docs = list(db.collection('users').stream())
+    trace_count("firestore.round_trips")
     for doc in docs:
         d = doc.to_dict()
+        d.pop('pin', None); d.pop('pin_hash', None)  # PIN / hash tidak ikut ke cache & tampilan
         d['username'] = doc.id
         users.append(d)
     return users
@@ -129,15 +345,11 @@ def get_all_users():
 # 3. LOGIN & SESSION UI
 # ==============================================================================
 
-# Init Session
-if 'logged_in' not in st.session_state:
-    st.session_state['logged_in'] = False
-if 'user_name' not in st.session_state:
-    st.session_state['user_name'] = ""
-if 'user_role' not in st.session_state:
-    st.session_state['user_role'] = ""
-if 'user_branches' not in st.session_state:
-    st.session_state['user_branches'] = []
+def init_session():
+    if 'logged_in' not in st.session_state:
+        st.session_state['logged_in'] = False
+    if 'user_name' not in st.session_state:
+        st.session_state['user_name'] = ""
 
 def login_page():
     st.markdown("<style>.stTextInput > div > div > input {text-align: center;}</style>", unsafe_allow_html=True)
@@ -155,12 +367,10 @@ def login_page():
             
             if submitted:
                 if user_input and pin_input:
-                    is_valid, data_or_msg = authenticate_user(user_input, pin_input)
+                    is_valid, data_or_msg = authenticate_user(user_input, pin_input, ip=st.context.ip_address)
                     if is_valid:
                         st.session_state['logged_in'] = True
                         st.session_state['user_name'] = user_input
-                        st.session_state['user_role'] = data_or_msg.get('role', 'staff')
-                        st.session_state['user_branches'] = data_or_msg.get('access_branches', [])
                         
                         st.success(f"Selamat Datang, {user_input}!")
                         time.sleep(0.5)
@@ -171,7 +381,7 @@ def login_page():
                     st.warning("Mohon isi Username dan PIN.")
 
 def logout():
-    for key in ['logged_in', 'user_name', 'user_role', 'user_branches']:
+    for key in ['logged_in', 'user_name']:
         if key in st.session_state:
             del st.session_state[key]
     st.rerun()
@@ -180,190 +390,1581 @@ def logout():
 # 4. CORE DATA FUNCTIONS (RESTORED ORIGINAL LOGIC)
 # ==============================================================================
 
-def fetch_data(branch_name, debug_mode=False):
-    """Mengambil data transaksi dari Cloud Firestore."""
-    if debug_mode:
-        st.cache_data.clear()
-        
+# --- TRACING (MODE DEBUG) ---
+# Trace per rerun: span (durasi blok kode) + counter (round-trip Firestore, dokumen, byte, cache hit/miss)
+# + ukuran DataFrame. Hanya aktif untuk sesi yang memulai trace (Mode Debug); tanpa trace aktif,
+# trace_span / trace_count praktis no-op. Thread worker (fetch paralel) ikut tercatat karena membawa
+# ScriptRunContext sesi yang sama. DASHBOARD_TRACE_LOG=path -> setiap trace juga ditulis sebagai JSON Lines.
+TRACE_LOG_PATH = os.environ.get("DASHBOARD_TRACE_LOG")
+
+@st.cache_resource
+def _trace_registry():
+    """Trace yang sedang berjalan per sesi: {session_id: trace}."""
+    return {"lock": threading.Lock(), "traces": {}}
+
+def _current_trace():
+    traces = _trace_registry()['traces']
+    if not traces: return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return traces.get(ctx.session_id) if ctx else None
+
+def start_trace():
+    """Mulai trace untuk rerun sesi ini. Return trace (dict) atau None jika di luar Streamlit."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None: return None
+    trace = {"id": uuid.uuid4().hex[:12], "session": ctx.session_id, "started": datetime.now().isoformat(timespec="seconds"),
+             "t0": time.perf_counter(), "lock": threading.Lock(), "spans": [], "counters": {}, "frames": {}}
+    registry = _trace_registry()
+    with registry['lock']: registry['traces'][ctx.session_id] = trace
+    return trace
+
+def stop_trace():
+    """Buang trace sesi ini (Mode Debug dimatikan). Return None."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    registry = _trace_registry()
+    if ctx is not None and registry['traces']:
+        with registry['lock']: registry['traces'].pop(ctx.session_id, None)
+    return None
+
+def end_trace(trace):
+    """Tutup trace (span berikutnya tidak dicatat lagi) dan tulis ke TRACE_LOG_PATH jika diset."""
+    registry = _trace_registry()
+    with registry['lock']:
+        if registry['traces'].get(trace['session']) is trace: registry['traces'].pop(trace['session'])
+    trace['total_ms'] = round((time.perf_counter() - trace['t0']) * 1000, 1)
+    if TRACE_LOG_PATH:
+        try:
+            with open(TRACE_LOG_PATH, "a") as f:
+                for rec in trace_records(trace): f.write(json.dumps(rec, default=str) + "\n")
+        except OSError as e: print(f"WARNING: Gagal menulis trace log: {e}")
+
+@contextlib.contextmanager
+def trace_span(name, **fields):
+    """Catat durasi blok `with` sebagai span. Field tambahan bisa diisi di dalam blok lewat dict yang di-yield."""
+    trace = _current_trace()
+    if trace is None:
+        yield {}
+        return
+    start = time.perf_counter()
+    try: yield fields
+    finally:
+        end = time.perf_counter()
+        span = {"name": name, "start_ms": round((start - trace['t0']) * 1000, 1), "ms": round((end - start) * 1000, 2),
+                "thread": threading.current_thread().name, **fields}
+        with trace['lock']: trace['spans'].append(span)
+
+def trace_count(name, n=1):
+    """Tambah counter trace (mis. "firestore.round_trips", "cache.tables.miss")."""
+    trace = _current_trace()
+    if trace is None: return
+    with trace['lock']: trace['counters'][name] = trace['counters'].get(name, 0) + n
+
+def trace_frame(name, df):
+    """Catat ukuran & memori DataFrame (memory_usage deep hanya dihitung saat trace aktif)."""
+    trace = _current_trace()
+    if trace is None: return
+    info = {"rows": len(df), "columns": len(df.columns), "mb": round(df.memory_usage(deep=True).sum() / 2**20, 2)}
+    with trace['lock']: trace['frames'][name] = info
+
+def trace_records(trace):
+    """Trace sebagai list record datar (untuk log terstruktur / JSON Lines)."""
+    base = {"trace": trace['id'], "started": trace['started']}
+    return ([{**base, "type": "span", **sp} for sp in trace['spans']] +
+            [{**base, "type": "counter", "name": k, "value": v} for k, v in trace['counters'].items()] +
+            [{**base, "type": "frame", "name": k, **v} for k, v in trace['frames'].items()] +
+            [{**base, "type": "total", "ms": trace.get('total_ms')}])
+
+def _to_date_key(d):
+    """date/datetime/str -> 'YYYY-MM-DD' (format ID dokumen daily_reports)."""
+    if d is None: return None
+    if hasattr(d, 'strftime'): return d.strftime("%Y-%m-%d")
+    return str(d)[:10]
+
+def _doc_to_transactions(date_key, data):
+    """Ubah satu dokumen daily_reports menjadi list transaksi (atau 1 baris Z-REPORT)."""
+    trx_list = data.get('transactions', [])
+    if trx_list and isinstance(trx_list, list):
+        return list(trx_list)
+    if 'summary' in data:
+        summary = data['summary']
+        if summary.get('total_sales', 0) > 0:
+            return [{
+                "order_id": f"Z-REPORT-{date_key}",
+                "unique_code": "DAILY-CLOSE",
+                "timestamp": f"{date_key} 23:59:59",
+                "total_final": summary.get('total_sales', 0),
+                "items": [],
+                "status": "completed",
+                "order_type": "Laporan Harian",
+                "payment_method": "Rekap Manual"
+            }]
+    return []
+
+def list_daily_reports(db, branch_name, since_key=None):
+    """
+    Listing ringan dokumen daily_reports: hanya field `date` yang diminta (field mask), payload transaksi
+    tidak ikut terunduh. since_key: hanya dokumen dengan ID >= since_key (Firestore menagih 1 baca per dokumen
+    yang di-listing); None = listing penuh. Return: {date_key: update_time ISO (None jika backend tidak menyediakan)}.
+    """
+    coll = db.collection('branches').document(branch_name).collection('daily_reports')
+    query = coll.select(['date'])
+    if since_key: query = query.where(FieldPath.document_id(), '>=', coll.document(since_key))
+    with trace_span("firestore.list", branch=branch_name) as span:
+        listing = {doc.id: (doc.update_time.isoformat() if getattr(doc, 'update_time', None) else None) for doc in query.stream()}
+        span['docs'] = len(listing)
+    trace_count("firestore.round_trips"); trace_count("firestore.docs_listed", len(listing))
+    return listing
+
+DOC_FETCH_BATCH = 100   # Jumlah dokumen per panggilan get_all
+
+# Field dokumen daily_reports yang dibaca dashboard. Salinan menu (`master_data`) & field lain tidak ikut diunduh.
+# Firestore tidak bisa memasker isi array, jadi `transactions` tetap terbawa utuh; pemangkasan per kolom
+# dilakukan di mirror lokal (lihat CONSUMER_FIELDS).
+DAILY_REPORT_FIELDS = ["date", "transactions", "summary"]
+
+def get_daily_reports(db, branch_name, date_keys, field_paths=DAILY_REPORT_FIELDS):
+    """Ambil beberapa dokumen daily_reports (batch get, hanya field_paths). Return: {date_key: data_dict}."""
+    coll = db.collection('branches').document(branch_name).collection('daily_reports')
+    keys = list(date_keys)
+    payloads = {}
+    for i in range(0, len(keys), DOC_FETCH_BATCH):
+        with trace_span("firestore.get_all", branch=branch_name, docs=len(keys[i:i + DOC_FETCH_BATCH])):
+            for snap in db.get_all([coll.document(k) for k in keys[i:i + DOC_FETCH_BATCH]], field_paths=field_paths):
+                if snap.exists: payloads[snap.id] = snap.to_dict() or {}
+        trace_count("firestore.round_trips")
+    trace_count("firestore.docs_fetched", len(payloads))
+    if _current_trace() is not None:  # Perkiraan byte yang dideserialisasi (ukuran JSON payload), hanya saat tracing
+        trace_count("firestore.bytes", sum(len(json.dumps(d, default=str)) for d in payloads.values()))
+    return payloads
+
+def _content_hash(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+# --- MIRROR LOKAL (PARQUET) ---
+# Hari yang sudah tutup buku disimpan di disk sebagai tabel hasil normalize_transactions, 1 file per bulan:
+#   {MIRROR_DIR}/{cabang}/orders_YYYY-MM.parquet & items_YYYY-MM.parquet  (bulan = bulan kolom Tanggal)
+#   {MIRROR_DIR}/{cabang}/manifest.json  {"version", "docs": {date_key: {"t": update_time, "h": hash isi,
+#                                         "m": [bulan file], "r": [order, item] yang ditolak normalisasi}}}
+# Kolom "Dokumen" = ID dokumen daily_reports asal baris (dipakai untuk mengganti hari yang berubah).
+# Firestore hanya dibaca untuk delta: dokumen baru / berubah (menurut update_time) + hari ini (tidak pernah disimpan).
+MIRROR_DIR = os.environ.get("DASHBOARD_MIRROR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "mirror"))
+MIRROR_VERSION = 3              # Naikkan jika skema tabel berubah (mirror lama dibangun ulang dari Firestore)
+
+@st.cache_resource
+def _mirror_locks():
+    """1 lock per cabang (per proses) supaya 2 sesi tidak menyinkron mirror yang sama bersamaan."""
+    return {"lock": threading.Lock(), "branches": {}}
+
+def _mirror_lock(branch_name):
+    locks = _mirror_locks()
+    with locks['lock']:
+        return locks['branches'].setdefault(branch_name, threading.Lock())
+
+def _mirror_path(branch_name, name):
+    return os.path.join(MIRROR_DIR, branch_name, name)
+
+def _read_mirror_manifest(branch_name):
     try:
-        db = get_firestore_client()
-        reports_ref = db.collection('branches').document(branch_name).collection('daily_reports')
-        docs = reports_ref.stream()
-        
-        all_transactions = []
-        for doc in docs:
-            data = doc.to_dict()
-            date_key = doc.id
-            trx_list = data.get('transactions', [])
-            
-            if trx_list and isinstance(trx_list, list):
-                all_transactions.extend(trx_list)
-            elif 'summary' in data:
-                summary = data['summary']
-                if summary.get('total_sales', 0) > 0:
-                    dummy_trx = {
-                        "order_id": f"Z-REPORT-{date_key}",
-                        "unique_code": "DAILY-CLOSE",
-                        "timestamp": f"{date_key} 23:59:59", 
-                        "total_final": summary.get('total_sales', 0),
-                        "items": [], 
-                        "status": "completed",
-                        "order_type": "Laporan Harian",
-                        "payment_method": "Rekap Manual"
-                    }
-                    all_transactions.append(dummy_trx)
-            
-        return all_transactions
+        with open(_mirror_path(branch_name, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MIRROR_VERSION: return manifest
+    except (OSError, ValueError): pass
+    return {"version": MIRROR_VERSION, "docs": {}}
+
+def _write_mirror_manifest(branch_name, manifest):
+    path = _mirror_path(branch_name, "manifest.json")
+    with open(path + ".tmp", "w") as f: json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def _write_parquet(df, path):
+    """
+    Simpan DataFrame ke Parquet (ditulis ke file sementara lalu rename).
+    Kolom object bertipe campuran (mis. Meja int/str) disimpan sebagai JSON string supaya tipe aslinya kembali saat dibaca.
+    """
+    json_cols = [c for c in df.columns if df[c].dtype == object and
+                 pd.api.types.infer_dtype(df[c], skipna=True) not in ("string", "date", "time", "empty", "boolean", "integer", "floating")]
+    if json_cols:
+        df = df.assign(**{c: [None if v is None else json.dumps(v, default=str) for v in df[c]] for c in json_cols})
+    df = df.copy(deep=False); df.attrs = {}  # attrs (jumlah baris ditolak) dicatat di manifest, bukan per file
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"mirror_json_columns": json.dumps(json_cols).encode()})
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def _read_parquet(path, columns=None, filters=None):
+    table = pq.read_table(path, columns=columns, filters=filters)
+    json_cols = json.loads((table.schema.metadata or {}).get(b"mirror_json_columns", b"[]"))
+    df = table.to_pandas()
+    for c in json_cols:
+        if c not in df: continue
+        codes, uniques = pd.factorize(df[c])  # Decode JSON sekali per nilai unik
+        decoded = np.empty(len(uniques) + 1, dtype=object)
+        for k, v in enumerate(uniques, 1): decoded[k] = json.loads(v)
+        df[c] = pd.Series(decoded[codes + 1], index=df.index, dtype=object)
+    return df
+
+def _normalize_days(days):
+    """
+    {date_key: [trx]} -> (df_orders, df_items, ditolak_per_dokumen) dengan kolom "Dokumen".
+    Kategori item diisi belakangan dari menu. ditolak_per_dokumen: {date_key: [order, item]}.
+    """
+    keys = sorted(days)
+    with trace_span("normalize", docs=len(keys)) as span:
+        df_o, df_i = normalize_transactions([t for k in keys for t in days[k]])
+        span.update(orders=len(df_o), items=len(df_i))
+    doc_of = np.repeat(np.arange(len(keys)), [len(days[k]) for k in keys])  # Order Key -> indeks dokumen
+    df_o["Dokumen"] = pd.Categorical.from_codes(doc_of[df_o["Order Key"].to_numpy(dtype=int)], keys)
+    df_i["Dokumen"] = pd.Categorical.from_codes(doc_of[df_i["Order Key"].to_numpy(dtype=int)], keys)
+    rejected = {}
+    for slot, bad_keys in enumerate((df_o.attrs.pop('rejected_keys'), df_i.attrs.pop('rejected_item_keys'))):
+        bad_docs, counts = np.unique(doc_of[np.asarray(bad_keys, dtype=int)], return_counts=True)
+        for d, n in zip(bad_docs, counts): rejected.setdefault(keys[d], [0, 0])[slot] = int(n)
+    return df_o, df_i, rejected
+
+def _rewrite_mirror_months(branch_name, months, replaced_docs, new_o=None, new_i=None):
+    """
+    Tulis ulang file bulan: baris lama dari replaced_docs dibuang, baris baru (new_o/new_i) bulan itu ditambahkan.
+    File bulan yang jadi kosong dihapus.
+    """
+    new_months = new_o["Timestamp"].dt.strftime("%Y-%m") if new_o is not None else None
+    for month in months:
+        paths = _mirror_path(branch_name, f"orders_{month}.parquet"), _mirror_path(branch_name, f"items_{month}.parquet")
+        parts = []
+        if os.path.exists(paths[0]) and os.path.exists(paths[1]):
+            old_o, old_i = _read_parquet(paths[0]), _read_parquet(paths[1])
+            parts.append((old_o[~old_o["Dokumen"].isin(replaced_docs)], old_i[~old_i["Dokumen"].isin(replaced_docs)]))
+        if new_o is not None:
+            month_o = new_o[new_months == month]
+            parts.append((month_o, new_i[new_i["Order Key"].isin(month_o["Order Key"])]))
+        df_o, df_i = concat_tables(parts)
+        if df_o.empty:
+            for path in paths:
+                if os.path.exists(path): os.remove(path)
+        else:
+            _write_parquet(df_i, paths[1])
+            _write_parquet(df_o, paths[0])
+
+MIRROR_RELIST_DAYS = 1   # Hari tutup buku terakhir di mirror yang tetap di-listing ulang (koreksi POS setelah tutup hari)
+
+def sync_branch_mirror(branch_name, db=None):
+    """
+    Sinkron mirror dengan Firestore berdasarkan metadata dokumen:
+    1. Listing ringan (update_time per dokumen) dibandingkan dengan manifest. Mirror kosong (pertama kali /
+       setelah sinkron ulang, lihat invalidate_branch_cache) -> listing penuh; selain itu hanya dokumen sejak
+       MIRROR_RELIST_DAYS hari sebelum hari terbaru di mirror (hari baru + hari ini). Edit hari yang lebih lama
+       baru terbaca saat sinkron ulang penuh.
+    2. Payload penuh hanya diambil untuk dokumen baru / berubah, dan hari ini (tidak pernah disimpan).
+    3. Dokumen yang update_time-nya berubah tapi isinya sama (hash) tidak ditulis ulang.
+    Return (manifest, hari_terbuka) - hari_terbuka: {date_key: [trx]} yang dibaca langsung, bukan dari mirror.
+    Gagal tulis disk -> WARNING, hari yang berubah ikut dikembalikan di hari_terbuka.
+    """
+    db = db or get_firestore_client()
+    today_key = date.today().strftime("%Y-%m-%d")
+    with _mirror_lock(branch_name), trace_span("mirror.sync", branch=branch_name):
+        manifest = _read_mirror_manifest(branch_name)
+        docs = manifest['docs']
+        fresh = not docs
+        since_key = None if fresh else (date.fromisoformat(max(docs)) - timedelta(days=MIRROR_RELIST_DAYS)).isoformat()
+        listing = list_daily_reports(db, branch_name, since_key)
+        to_fetch = [k for k, t in listing.items() if k >= today_key or t is None or docs.get(k, {}).get('t') != t]
+        deleted = [k for k in docs if k not in listing and (not since_key or k >= since_key)]
+        payloads = get_daily_reports(db, branch_name, to_fetch)
+
+        open_days, changed = {}, {}
+        for k, data in payloads.items():
+            if k >= today_key:
+                open_days[k] = _doc_to_transactions(k, data); continue
+            h = _content_hash(data)
+            if k in docs and docs[k]['h'] == h: docs[k]['t'] = listing[k]  # Hanya metadata yang berubah
+            else: changed[k] = (_doc_to_transactions(k, data), h)
+        print(f"INFO: Sync {branch_name}: {len(listing) - len(to_fetch)} dokumen dilewati (tidak berubah), "
+              f"{len(payloads)} diambil ({len(changed)} ditulis ke mirror, {len(deleted)} dihapus).")
+
+        try:
+            os.makedirs(_mirror_path(branch_name, ""), exist_ok=True)
+            if fresh:  # Mirror baru / versi skema lama: file bulan yang tersisa tidak dipakai lagi
+                for n in os.listdir(_mirror_path(branch_name, "")):
+                    if n.endswith(".parquet"): os.remove(_mirror_path(branch_name, n))
+            if changed or deleted:
+                replaced = set(changed) | set(deleted)
+                months = {m for k in replaced if k in docs for m in docs[k]['m']}
+                new_o = new_i = None
+                if changed:
+                    new_o, new_i, rejected = _normalize_days({k: trx for k, (trx, _) in changed.items()})
+                    doc_months = new_o["Timestamp"].dt.strftime("%Y-%m").groupby(new_o["Dokumen"], observed=True).unique()
+                    for k, (_, h) in changed.items():
+                        docs[k] = {"t": listing[k], "h": h, "m": sorted(doc_months.get(k, [])), "r": rejected.get(k, [0, 0])}
+                    months |= {m for k in changed for m in docs[k]['m']}
+                with trace_span("mirror.write", branch=branch_name, months=len(months)):
+                    _rewrite_mirror_months(branch_name, sorted(months), replaced, new_o, new_i)
+                for k in deleted: docs.pop(k, None)
+            _write_mirror_manifest(branch_name, manifest)
+        except OSError as e:
+            print(f"WARNING: Gagal menulis mirror {branch_name}: {e}")
+            manifest = _read_mirror_manifest(branch_name)
+            open_days.update({k: trx for k, (trx, _) in changed.items()})
+    return manifest, open_days
+
+def read_branch_mirror(branch_name, start_key=None, end_key=None, order_columns=None, item_columns=None):
+    """
+    Baca mirror cabang dengan pruning: file bulan di luar rentang dilewati, baris difilter Tanggal,
+    dan hanya kolom yang diminta yang dibaca (ORDER_BASE_COLUMNS / ITEM_BASE_COLUMNS selalu ikut).
+    Return list (df_orders, df_items) per bulan.
+    """
+    try: names = os.listdir(_mirror_path(branch_name, ""))
+    except FileNotFoundError: return []
+    months = sorted(n[len("orders_"):-len(".parquet")] for n in names if n.startswith("orders_") and n.endswith(".parquet"))
+    months = [m for m in months if (not start_key or m >= start_key[:7]) and (not end_key or m <= end_key[:7])]
+    filters = ([("Tanggal", ">=", pd.Timestamp(start_key))] if start_key else []) + \
+              ([("Tanggal", "<=", pd.Timestamp(end_key))] if end_key else [])
+    def cols(c, base): return None if c is None else list(dict.fromkeys(base + list(c)))
+    order_columns, item_columns = cols(order_columns, ORDER_BASE_COLUMNS), cols(item_columns, ITEM_BASE_COLUMNS)
+    with trace_span("mirror.read", branch=branch_name, months=len(months)) as span:
+        parts = [(_read_parquet(_mirror_path(branch_name, f"orders_{m}.parquet"), order_columns, filters or None),
+                  _read_parquet(_mirror_path(branch_name, f"items_{m}.parquet"), item_columns, filters or None))
+                 for m in months]
+        span['rows'] = sum(len(o) + len(i) for o, i in parts)
+    return parts
+
+def clear_branch_mirror(branch_name):
+    """Hapus mirror 1 cabang (sinkron berikutnya membaca ulang semua dokumen dari Firestore)."""
+    with _mirror_lock(branch_name):
+        shutil.rmtree(_mirror_path(branch_name, ""), ignore_errors=True)
+
+def load_branch_tables(branch_name, start_date=None, end_date=None, db=None, order_columns=None, item_columns=None):
+    """
+    Tabel order & item satu cabang: mirror lokal (hari tutup buku) + delta Firestore (hari ini / hari berubah).
+    order_columns / item_columns: hanya kolom ini yang dibaca (None = semua, lihat consumer_columns).
+    `db` bisa diisi client palsu / emulator untuk pengujian. Error dilempar ke pemanggil.
+    Kategori item belum diisi dari menu (lihat fetch_data).
+    """
+    start_key, end_key = _to_date_key(start_date), _to_date_key(end_date)
+    manifest, open_days = sync_branch_mirror(branch_name, db)
+    def in_range(k): return (not start_key or k >= start_key) and (not end_key or k <= end_key)
+    parts = read_branch_mirror(branch_name, start_key, end_key, order_columns, item_columns)
+    open_days = {k: v for k, v in open_days.items() if in_range(k)}
+    if any(k in manifest['docs'] for k in open_days):  # Mirror gagal ditulis -> versi langsung dari Firestore yang dipakai
+        parts = [(o[~o["Dokumen"].isin(open_days)], i[~i["Dokumen"].isin(open_days)]) for o, i in parts]
+    rejected = [sum(d['r'][slot] for k, d in manifest['docs'].items() if in_range(k)) for slot in (0, 1)]
+    if open_days:
+        open_o, open_i, open_rejected = _normalize_days(open_days)
+        if order_columns is not None: open_o = open_o[[c for c in open_o.columns if c in order_columns]]
+        if item_columns is not None: open_i = open_i[[c for c in open_i.columns if c in item_columns]]
+        parts.append((open_o, open_i))
+        for r in open_rejected.values(): rejected[0] += r[0]; rejected[1] += r[1]
+    with trace_span("concat_tables", branch=branch_name, parts=len(parts)):
+        df_orders, df_items = concat_tables(parts)
+    df_orders.attrs['rejected_rows'], df_items.attrs['rejected_items'] = rejected
+    return df_orders, df_items
+
+def load_menu_config(branch_name, db=None):
+    """Mengambil konfigurasi menu langsung dari Firestore (tanpa cache)."""
+    db = db or get_firestore_client()
+    config_ref = db.collection('branches').document(branch_name).collection('configuration').document('menu')
+    with trace_span("firestore.menu", branch=branch_name):
+        doc = config_ref.get()
+    trace_count("firestore.round_trips")
+    if doc.exists:
+        data = doc.to_dict()
+        return data.get('items', {})
+
+    # Fallback
+    docs = db.collection('branches').document(branch_name).collection('daily_reports')\
+             .order_by('date', direction=firestore.Query.DESCENDING).select(['master_data.menu']).limit(1).stream()
+    for d in docs:
+        return d.to_dict().get('master_data', {}).get('menu', {})
+
+    return {}
+
+# --- CACHE BERSAMA (lintas sesi/user) ---
+# Transaksi: TTL pendek karena dokumen hari ini masih bisa bertambah.
+# Menu: TTL lebih panjang, dan di-invalidate langsung setelah disimpan dari Editor.
+# User: di-invalidate langsung setelah tambah/hapus user dari tab Manajemen User.
+# max_entries membatasi ukuran cache; entri yang paling lama tidak dipakai dibuang duluan (LRU).
+CACHE_TTL_DATA = 120
+CACHE_TTL_MENU = 600
+CACHE_TTL_USERS = 600
+CACHE_MAX_ENTRIES = 64
+
+@st.cache_resource
+def _cache_generations():
+    """
+    Nomor generasi cache per (jenis, cabang). Generasi ikut menjadi bagian key
+    st.cache_data, jadi menaikkan generasi = invalidasi entri cabang itu saja
+    (entri lama tidak akan dipakai lagi dan hilang sendiri oleh TTL/LRU).
+    """
+    return {"lock": threading.Lock(), "data": {}, "menu": {}, "users": {}}
+
+def _cache_generation(kind, branch_name):
+    gens = _cache_generations()
+    with gens['lock']:
+        return gens[kind].get(branch_name, 0)
+
+def invalidate_branch_cache(branch_name, kinds=("data", "menu")):
+    """
+    Buang cache satu cabang saja. kinds: "data" (transaksi) dan/atau "menu".
+    "data" = sinkron ulang penuh (tombol debug admin): generasi tabel naik, mirror dihapus, listener live & rollup dilepas.
+    """
+    gens = _cache_generations()
+    with gens['lock']:
+        for kind in kinds:
+            gens[kind][branch_name] = gens[kind].get(branch_name, 0) + 1
+    if "data" in kinds:
+        clear_branch_mirror(branch_name)
+        stop_live_listener(branch_name)
+        rollups = _rollup_store()
+        with rollups['lock']:
+            for scope in [s for s in rollups['scopes'] if s == branch_name or (isinstance(s, tuple) and branch_name in s[1])]:
+                rollups['scopes'].pop(scope)
+
+def _forget_user(username=None):
+    """Buang record login & policy satu user (None = semua) tanpa menyentuh cache daftar user."""
+    for store in (_user_record_store(), _policy_store()):
+        with store['lock']:
+            if username is None: store['entries'].clear()
+            else: store['entries'].pop(username, None)
+
+def invalidate_user_cache(username=None):
+    """Buang cache daftar user (dan record login & policy user itu) setelah user ditambah/dihapus/diubah."""
+    gens = _cache_generations()
+    with gens['lock']:
+        gens['users'][""] = gens['users'].get("", 0) + 1
+    _forget_user(username)
+
+@st.cache_data(ttl=CACHE_TTL_DATA, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_tables(branch_name, start_key, end_key, generation, order_columns=None, item_columns=None):
+    trace_count("cache.tables.miss")
+    return load_branch_tables(branch_name, start_key, end_key, order_columns=order_columns, item_columns=item_columns)
+
+@st.cache_resource
+def _loaded_column_sets():
+    """
+    Set kolom yang sudah ada di cache _cached_tables per (cabang, rentang, generasi): {key: {(kolom order, kolom item): waktu}}.
+    Dipakai untuk menjawab permintaan kolom yang lebih sedikit dari entri cache yang sudah ada (superset).
+    """
+    return {"lock": threading.Lock(), "sets": {}}
+
+def _covering_columns(scope, order_columns, item_columns):
+    """Cari set kolom yang sudah dimuat (belum lewat TTL) dan mencakup permintaan; jika tidak ada, catat permintaan ini."""
+    registry, now = _loaded_column_sets(), time.time()
+    wanted = (order_columns, item_columns)
+    def covers(have, want): return have is None or (want is not None and set(want) <= set(have))
+    with registry['lock']:
+        for k in [k for k, v in registry['sets'].items() if not v or (k[0] == scope[0] and k[3] != scope[3])]:
+            registry['sets'].pop(k)  # Kosong / generasi lama cabang ini
+        sets = registry['sets'].setdefault(scope, {})
+        for cols in [c for c, t in sets.items() if now - t >= CACHE_TTL_DATA]: sets.pop(cols)
+        for cols in sets:
+            if covers(cols[0], order_columns) and covers(cols[1], item_columns): return cols
+        sets[wanted] = now
+    return wanted
+
+@st.cache_data(ttl=CACHE_TTL_MENU, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_menu_config(branch_name, generation):
+    trace_count("cache.menu.miss")
+    return load_menu_config(branch_name)
+
+@st.cache_data(ttl=CACHE_TTL_USERS, show_spinner=False)
+def _cached_users(generation):
+    trace_count("cache.users.miss")
+    return get_all_users()
+
+def fetch_all_users():
+    """Daftar user lewat cache bersama (Firestore hanya dibaca saat cache kosong/di-invalidate)."""
+    trace_count("cache.users.calls")
+    return _cached_users(_cache_generation("users", ""))
+
+def fetch_data(branch_name, debug_mode=False, start_date=None, end_date=None, menu_data=None, consumers=None, refresh=False):
+    """
+    Mengambil tabel order & item (lewat cache bersama, key: cabang + rentang tanggal + kolom).
+    consumers: nama konsumen di CONSUMER_FIELDS (mis. ("kpi", "detail")); hanya kolom yang mereka deklarasikan
+    yang dibaca. Jika cache sudah memegang set kolom yang lebih lengkap, entri itu yang dipakai. None = semua kolom.
+    Kategori item diisi dari menu_data di sini, jadi mirror/cache tidak perlu dibangun ulang saat menu berubah.
+    refresh=True: lewati cache bersama untuk pemanggilan ini saja: mirror disinkron ulang (inkremental, hanya dokumen
+    yang berubah) lalu tabel dibaca langsung. Cache, mirror & rollup sesi lain tidak disentuh.
+    """
+    try:
+        scope = (branch_name, _to_date_key(start_date), _to_date_key(end_date), _cache_generation("data", branch_name))
+        trace_count("cache.tables.calls")
+        with trace_span("fetch_data", branch=branch_name, refresh=refresh):
+            if refresh:
+                order_cols, item_cols = consumer_columns(consumers)
+                df_orders, df_items = load_branch_tables(branch_name, scope[1], scope[2], order_columns=order_cols, item_columns=item_cols)
+            else:
+                df_orders, df_items = _cached_tables(*scope, *_covering_columns(scope, *consumer_columns(consumers)))
     except Exception as e:
         if debug_mode: st.error(f"Fetch Error: {e}")
-        return []
+        df_orders, df_items = normalize_transactions([])
+    if "Nama Menu" in df_items:
+        df_items["Kategori"] = menu_categories(df_items["Nama Menu"], _build_category_map(menu_data))
+    return df_orders, df_items
 
 def fetch_menu_config(branch_name):
-    """Mengambil konfigurasi menu."""
-    db = get_firestore_client()
+    """Mengambil konfigurasi menu (lewat cache bersama)."""
     try:
-        config_ref = db.collection('branches').document(branch_name).collection('configuration').document('menu')
-        doc = config_ref.get()
-        if doc.exists:
-            data = doc.to_dict()
-            return data.get('items', {})
-        
-        # Fallback
-        docs = db.collection('branches').document(branch_name).collection('daily_reports')\
-                 .order_by('date', direction=firestore.Query.DESCENDING).limit(1).stream()
-        for d in docs:
-            return d.to_dict().get('master_data', {}).get('menu', {})
-        
-        return {} 
+        trace_count("cache.menu.calls")
+        return _cached_menu_config(branch_name, _cache_generation("menu", branch_name))
     except Exception as e:
         st.error(f"Gagal ambil data menu: {e}")
         return {}
 
-def save_menu_config_to_cloud(branch_name, new_menu_data):
-    """Menyimpan konfigurasi menu ke Firestore."""
+BRANCH_FETCH_WORKERS = 4   # Batas thread untuk ambil data beberapa cabang sekaligus
+
+def fetch_branches_parallel(branch_names, debug_mode=False, start_date=None, end_date=None, consumers=None, refresh=False):
+    """
+    Mengambil transaksi + menu beberapa cabang secara paralel (thread pool terbatas).
+    start_date/end_date, consumers, refresh: lihat fetch_data.
+    Waktu total ~ cabang paling lambat, bukan jumlah semua cabang.
+    Return: {cabang: (df_orders, df_items, menu_config)} dengan urutan sama seperti branch_names.
+    """
+    ctx = get_script_run_ctx()
+
+    def fetch_one(branch_name):
+        add_script_run_ctx(threading.current_thread(), ctx)  # Supaya st.cache_data / st.error jalan di thread worker
+        menu_data = fetch_menu_config(branch_name)
+        return fetch_data(branch_name, debug_mode, start_date, end_date, menu_data=menu_data, consumers=consumers,
+                          refresh=refresh) + (menu_data,)
+
+    workers = max(1, min(BRANCH_FETCH_WORKERS, len(branch_names)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch-branch") as pool:
+        return dict(zip(branch_names, pool.map(fetch_one, branch_names)))
+
+# --- SIMPAN MENU (DIFF) ---
+# Editor hanya mengirim item yang berubah (update per field di dokumen configuration/menu, bukan tulis ulang
+# seluruh menu), menaikkan field "version", dan mencatat diff-nya di configuration/menu/changelog/{versi}.
+# POS cukup menyimpan versi terakhir yang dimilikinya lalu membaca changelog dengan version > versi itu
+# (urut version); unduh menu penuh hanya jika belum punya versi sama sekali.
+
+def menu_items(menu_config):
+    """Config menu (per kategori: dict {nama: item} atau list item lama) -> {kategori: {nama: {"price", "online_price", "printer"}}}."""
+    out = {}
+    for category, items in (menu_config or {}).items():
+        if isinstance(items, dict): entries = [(k, v) for k, v in items.items() if isinstance(v, dict)]
+        elif isinstance(items, list): entries = [(v.get('name', ''), v) for v in items if isinstance(v, dict)]
+        else: continue
+        out[category] = {name: {"price": float(v.get('price', 0)), "online_price": float(v.get('online_price', 0)),
+                                "printer": v.get('printer', 'KITCHEN')} for name, v in entries}
+    return out
+
+def diff_menu(old_items, new_items):
+    """
+    Beda 2 menu (format menu_items): {"added": [...], "removed": [...], "changed": [...]}.
+    Tiap entri {"category", "name"}; added/changed + "item" (nilai baru), changed + "fields" (field yang berubah).
+    Item yang pindah kategori tercatat sebagai removed + added.
+    """
+    diff = {"added": [], "removed": [], "changed": []}
+    for category in sorted(old_items.keys() | new_items.keys()):
+        old, new = old_items.get(category, {}), new_items.get(category, {})
+        diff["removed"] += [{"category": category, "name": n} for n in sorted(old.keys() - new.keys())]
+        diff["added"] += [{"category": category, "name": n, "item": new[n]} for n in sorted(new.keys() - old.keys())]
+        for n in sorted(old.keys() & new.keys()):
+            fields = sorted(f for f, v in new[n].items() if old[n].get(f) != v)
+            if fields: diff["changed"].append({"category": category, "name": n, "item": new[n], "fields": fields})
+    return diff
+
+def menu_field_updates(current_menu, new_items, diff):
+    """
+    Diff -> {field path: nilai} untuk DocumentReference.update (nama dengan titik/spasi di-quote lewat FieldPath).
+    Kategori yang dihapus seluruhnya / masih format list lama ditulis per kategori, sisanya per item / per field.
+    """
+    def path(*parts): return FieldPath("items", *parts).to_api_repr()
+    whole = {c for c in current_menu if c not in new_items or not isinstance(current_menu[c], dict)}
+    updates = {path(c): new_items[c] if c in new_items else firestore.DELETE_FIELD for c in whole}
+    for e in diff["added"]:
+        if e["category"] not in whole: updates[path(e["category"], e["name"])] = e["item"]
+    for e in diff["removed"]:
+        if e["category"] not in whole: updates[path(e["category"], e["name"])] = firestore.DELETE_FIELD
+    for e in diff["changed"]:
+        if e["category"] not in whole:
+            for f in e["fields"]: updates[path(e["category"], e["name"], f)] = e["item"][f]
+    return updates
+
+MENU_CONFLICT_MSG = "Menu sudah diubah user lain sejak editor dibuka. Editor dimuat ulang, silakan ulangi perubahan."
+
+def save_menu_config_to_cloud(branch_name, new_menu_data, current_menu_data):
+    """
+    Menyimpan perubahan menu ke Firestore: diff terhadap menu yang dibuka di editor (current_menu_data, bisa dari cache),
+    ditulis bersama entri changelog-nya dalam 1 batch bersyarat:
+    - dokumen menu dibaca ulang langsung; jika isinya sudah berbeda dari yang dibuka editor, simpan dibatalkan
+      (diff dari menu basi akan mengembalikan perubahan admin lain);
+    - update menu hanya berlaku jika dokumen belum ditulis lagi sejak dibaca (last_update_time), dan
+      changelog/{versi} dibuat dengan create, jadi 2 simpan bersamaan tidak bisa memakai versi yang sama.
+    """
     try:
+        diff = diff_menu(menu_items(current_menu_data), new_menu_data)
+        if not any(diff.values()):
+            return True, "Tidak ada perubahan menu."
+
         db = get_firestore_client()
         config_ref = db.collection('branches').document(branch_name).collection('configuration').document('menu')
-        
-        payload = {
-            "last_updated": firestore.SERVER_TIMESTAMP,
-            "updated_by": st.session_state.get('user_name', 'Admin'),
-            "items": new_menu_data
-        }
-        
-        config_ref.set(payload)
-        return True, "Menu berhasil disimpan ke Cloud! Jangan lupa download di POS."
+        snap = config_ref.get()
+        trace_count("firestore.round_trips")
+        fresh = (snap.to_dict() or {}).get('items', {}) if snap.exists else current_menu_data
+        if menu_items(fresh) != menu_items(current_menu_data):
+            invalidate_branch_cache(branch_name, kinds=("menu",))
+            return False, MENU_CONFLICT_MSG
+        version = (snap.to_dict() or {}).get('version', 0) + 1 if snap.exists else 1
+        user = st.session_state.get('user_name', 'Admin')
+        meta = {"version": version, "last_updated": firestore.SERVER_TIMESTAMP, "updated_by": user}
+
+        batch = db.batch()
+        if snap.exists:
+            batch.update(config_ref, {**menu_field_updates(fresh, new_menu_data, diff), **meta},
+                         option=db.write_option(last_update_time=snap.update_time))
+        else:  # Belum ada dokumen menu (menu masih dari salinan daily_reports): tulis lengkap sekali
+            batch.create(config_ref, {**meta, "items": new_menu_data})
+        batch.create(config_ref.collection('changelog').document(f"{version:08d}"),
+                     {**diff, "version": version, "updated_by": user, "created_at": firestore.SERVER_TIMESTAMP})
+        batch.commit()
+        invalidate_branch_cache(branch_name, kinds=("menu",))
+        counts = f"{len(diff['added'])} baru, {len(diff['changed'])} diubah, {len(diff['removed'])} dihapus"
+        return True, f"Menu berhasil disimpan ke Cloud (versi {version}: {counts}). Jangan lupa download di POS."
+    except (google_exceptions.FailedPrecondition, google_exceptions.AlreadyExists):  # Tersalip simpan lain
+        invalidate_branch_cache(branch_name, kinds=("menu",))
+        return False, MENU_CONFLICT_MSG
     except Exception as e:
         return False, f"Gagal simpan: {e}"
 
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"   # Format standar timestamp dari POS
+
+@functools.lru_cache(maxsize=65536)
+def _parse_timestamp_str(ts_str):
+    """Parse 1 string timestamp. Di-cache per string unik (mis. stempel Z-REPORT 'YYYY-MM-DD 23:59:59')."""
+    # Fast path: "YYYY-MM-DD HH:MM:SS" tanpa strptime
+    if len(ts_str) == 19 and ts_str[4] == '-' and ts_str[7] == '-' and ts_str[10] == ' ' and ts_str[13] == ':' and ts_str[16] == ':':
+        try:
+            return datetime(int(ts_str[0:4]), int(ts_str[5:7]), int(ts_str[8:10]),
+                            int(ts_str[11:13]), int(ts_str[14:16]), int(ts_str[17:19]))
+        except ValueError: pass
+    try: return datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            d = datetime.strptime(ts_str, "%Y-%m-%d").date()
+            return datetime.combine(d, dt_time(0,0,0))
+        except: return None
+
 def parse_flexible_date(ts):
     if not ts: return None
     if hasattr(ts, 'date'): return ts
-    ts_str = str(ts)
-    try: return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        try: return datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-        except ValueError:
-            try:
-                d = datetime.strptime(ts_str, "%Y-%m-%d").date()
-                return datetime.combine(d, dt_time(0,0,0))
-            except: return None
-
-def process_data_for_display(history_data):
-    """Memproses data untuk tampilan tabel transaksi & perhitungan omset global."""
-    processed = []
-    for order in history_data:
-        try:
-            items = order.get('items', [])
-            if isinstance(items, dict): items = list(items.values())
-            
-            grand_total = float(order.get('total_final', order.get('total', 0)))
-            subtotal = float(order.get('subtotal', 0))
-            if subtotal == 0 and grand_total > 0: subtotal = grand_total # Fallback
-            
-            tax = float(order.get('tax_pb1', 0))
-            svc = float(order.get('service_charge', 0))
-            disc = float(order.get('discount_amount', 0))
-            
-            ts = order.get('timestamp') or order.get('completed_time')
-            ot = parse_flexible_date(ts)
+    return _parse_timestamp_str(str(ts))
 
-            if ot:
-                if ot.tzinfo is not None: ot = ot.replace(tzinfo=None)
-                pay_method = order.get('payment_method', '-')
-                if isinstance(pay_method, list): pay_method = ", ".join(pay_method)
-                
-                processed.append({
-                    "Kode Unik": order.get('order_id', order.get('unique_code', 'N/A')),
-                    "Tanggal": ot.date(),
-                    "Waktu": ot.time(),
-                    "Jam": ot.hour, 
-                    "Tipe Order": order.get('order_type', 'N/A'),
-                    "Meja": order.get('table_number', 'N/A'),
-                    "Subtotal": subtotal,
-                    "Diskon": disc,
-                    "Service": svc,
-                    "Tax": tax,
-                    "Grand Total": grand_total,
-                    "Metode Bayar": pay_method,
-                    "Kasir": order.get('cashier', 'System'),
-                    "Detail Item": "; ".join([f"{i.get('quantity', i.get('qty', 1))}x {i.get('name')}" for i in items]),
-                })
-        except: continue
-    return pd.DataFrame(processed)
-
-def process_data_for_analysis(history_data, menu_data):
-    """Memproses data level Item untuk analisa kategori dan produk terlaris."""
+_TZ_SUFFIX_RE = r'(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)(?:Z|[+-]\d{2}:?\d{2})$'
+_TS_FORMAT_RE = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+def _parse_unique_timestamp_strings(uniques):
+    """
+    Parse string timestamp unik sekaligus. Format dideteksi sekali per batch dari sampel pertama:
+    jika format standar POS, semua diparse dengan format tetap; sisanya (ISO / tanggal saja / zona waktu)
+    lewat jalur ISO8601.
+    """
+    out = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    todo = pd.Series(True, index=uniques.index)
+    if _TS_FORMAT_RE.match(uniques.iloc[0]):
+        out[:] = pd.to_datetime(uniques, format=_TS_FORMAT, errors='coerce')
+        todo = out.isna()
+    if todo.any():
+        txt = uniques[todo].str.strip().str.replace(_TZ_SUFFIX_RE, r'\1', regex=True)
+        out[todo] = pd.to_datetime(txt, format='ISO8601', errors='coerce')
+    return out
+
+def parse_timestamp_column(values):
+    """
+    Versi kolom dari parse_flexible_date: list timestamp -> Series datetime64 (naive, jam lokal).
+    Setiap string unik hanya diparse sekali. Zona waktu dibuang tanpa konversi
+    (sama seperti replace(tzinfo=None)). Gagal parse -> NaT.
+    """
+    s = pd.Series(values, dtype=object)
+    out = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns]')
+    if s.empty: return out
+
+    # Kasus umum: semua string (atau kosong) -> tidak perlu cek tipe per baris
+    all_str = pd.api.types.infer_dtype(s, skipna=True) == 'string'
+    is_str = s.notna() if all_str else s.map(type).eq(str)
+    if is_str.any():
+        codes, uniques = pd.factorize(s[is_str])
+        parsed = _parse_unique_timestamp_strings(pd.Series(uniques, dtype=object))
+        out[is_str] = parsed.to_numpy()[codes]
+
+    # Objek datetime (mis. Timestamp Firestore) -> buang tzinfo
+    if not all_str:
+        is_obj = ~is_str & s.map(lambda v: hasattr(v, 'date'))
+        if is_obj.any():
+            out[is_obj] = pd.to_datetime([v.replace(tzinfo=None) for v in s[is_obj]], errors='coerce')
+    return out
+
+DISPLAY_COLUMNS = ["Kode Unik", "Tanggal", "Waktu", "Jam", "Tipe Order", "Meja", "Subtotal", "Diskon",
+                   "Service", "Tax", "Grand Total", "Metode Bayar", "Kasir", "Detail Item"]
+
+# Kolom tambahan tabel order (tidak ditampilkan, dipakai Excel & relasi ke tabel item)
+ORDER_EXTRA_COLUMNS = ["Order Key", "Timestamp", "Nama Diskon", "Kode Member", "Nama Member",
+                       "Order Void", "Void Oleh", "Alasan Void"]
+
+# Tabel detail berhalaman: "Detail Item" (teks panjang) tidak dimuat, item dibaca per transaksi yang dipilih
+DETAIL_COLUMNS = [c for c in DISPLAY_COLUMNS if c != "Detail Item"]
+DETAIL_ITEM_COLUMNS = ["Nama Menu", "Qty", "Harga Satuan", "Total", "Log Void"]
+
+ITEM_COLUMNS = ["Order Key", "Tanggal", "Nama Menu", "Kategori", "Tipe Order", "Qty", "Harga Satuan", "Total",
+                "Kode Menu", "Kategori Item", "Item Void", "Log Void", "Void Oleh", "Waktu Void", "Alasan Void"]
+
+# --- KOLOM PER KONSUMEN ---
+# Tiap tampilan mendeklarasikan kolom yang dipakai: (kolom tabel order, kolom tabel item).
+# Data layer hanya membaca kolom itu dari mirror (+ kolom dasar yang selalu ikut untuk relasi & filter tanggal).
+ORDER_BASE_COLUMNS = ["Order Key", "Timestamp", "Tanggal", "Dokumen"]
+ITEM_BASE_COLUMNS = ["Order Key", "Tanggal", "Dokumen"]
+
+EXCEL_SHEET_FIELDS = {
+    "Sales Summary": (["Subtotal", "Diskon", "Service", "Tax", "Grand Total"], []),
+    "Payment": (["Metode Bayar", "Grand Total", "Kode Unik"], []),
+    "Category Sales": ([], ["Kategori", "Qty", "Total", "Log Void"]),
+    "Item Sales": ([], ["Nama Menu", "Kategori", "Tipe Order", "Qty", "Total", "Log Void"]),
+    "Hourly Sales": (["Jam", "Grand Total", "Kode Unik"], []),
+    "Transaction Log": (["Kode Unik", "Tipe Order", "Meja", "Kasir", "Metode Bayar", "Grand Total"],
+                        ["Nama Menu", "Qty", "Harga Satuan", "Total", "Log Void"]),
+    "Promotion Report": (["Cabang", "Kode Unik", "Subtotal", "Diskon", "Grand Total", "Nama Diskon", "Kode Member",
+                          "Nama Member", "Kasir"], []),
+    "Cancel Menu": (["Kode Unik", "Kasir", "Order Void", "Void Oleh", "Alasan Void"],
+                    ["Cabang", "Nama Menu", "Kode Menu", "Kategori Item", "Qty", "Total", "Item Void", "Log Void",
+                     "Void Oleh", "Waktu Void", "Alasan Void"]),
+}
+
+def _union_fields(specs):
+    """Gabungkan beberapa deklarasi (kolom order, kolom item) tanpa duplikat, urutan dipertahankan."""
+    orders, items = [], []
+    for o, i in specs: orders += o; items += i
+    return list(dict.fromkeys(orders)), list(dict.fromkeys(items))
+
+CONSUMER_FIELDS = {
+    "kpi": (["Grand Total", "Metode Bayar", "Tipe Order", "Jam"], ["Nama Menu", "Kategori", "Qty", "Total", "Log Void"]),
+    "detail": (DETAIL_COLUMNS, DETAIL_ITEM_COLUMNS),
+    "excel": _union_fields(EXCEL_SHEET_FIELDS.values()),
+}
+
+# Tab dashboard & data yang dibutuhkan masing-masing (hanya tab aktif yang dirender):
+# consumers = konsumen CONSUMER_FIELDS yang tabelnya dimuat (None = tidak perlu transaksi), menu = perlu config menu.
+TAB_KPI, TAB_DETAIL, TAB_MENU_VIEW, TAB_MENU_EDITOR, TAB_USERS = \
+    "📈 Ringkasan & KPI", "📄 Data Detail (Export)", "🍔 Lihat Menu (View)", "📝 Editor Menu (Admin)", "👥 Manajemen User"
+TAB_DATA = {
+    TAB_KPI: {"consumers": ("kpi",), "menu": True},
+    TAB_DETAIL: {"consumers": ("detail",), "menu": True},
+    TAB_MENU_VIEW: {"consumers": None, "menu": True},
+    TAB_MENU_EDITOR: {"consumers": None, "menu": True},
+    TAB_USERS: {"consumers": None, "menu": False},
+}
+
+# Tab yang boleh dibuka per role (urutan = urutan tampil). Role tidak dikenal diperlakukan sebagai staff.
+ROLE_TABS = {
+    "administrator": (TAB_KPI, TAB_DETAIL, TAB_MENU_VIEW, TAB_MENU_EDITOR, TAB_USERS),
+    "manager": (TAB_KPI, TAB_DETAIL, TAB_MENU_VIEW, TAB_MENU_EDITOR),
+    "staff": (TAB_KPI, TAB_DETAIL, TAB_MENU_VIEW),
+}
+
+def consumer_columns(consumers):
+    """
+    Nama konsumen (kunci CONSUMER_FIELDS) -> (kolom order, kolom item) sebagai tuple terurut (bisa jadi key cache).
+    consumers=None -> (None, None) = semua kolom.
+    """
+    if consumers is None: return None, None
+    order_cols, item_cols = _union_fields(CONSUMER_FIELDS[c] for c in consumers)
+    if "Kategori" in item_cols: item_cols.append("Nama Menu")  # Kategori diisi ulang dari Nama Menu + menu
+    # "Cabang" diisi combine_branch_tables (mode Semua Cabang), tidak ada di mirror
+    order_cols, item_cols = [c for c in order_cols if c != "Cabang"], [c for c in item_cols if c != "Cabang"]
+    return tuple(sorted(set(ORDER_BASE_COLUMNS + order_cols))), tuple(sorted(set(ITEM_BASE_COLUMNS + item_cols)))
+
+def _build_category_map(menu_data):
+    """Nama menu -> kategori, dari struktur menu dict maupun list."""
     cat_map = {}
     if isinstance(menu_data, dict):
         for c, items in menu_data.items():
             if isinstance(items, dict):
                  for k in items: cat_map[k] = c
-            elif isinstance(items, list): 
+            elif isinstance(items, list):
                  for m_item in items:
                      if isinstance(m_item, dict):
                          nm = m_item.get('name')
                          if nm: cat_map[nm] = c
+    return cat_map
 
-    analysis = []
-    for order in history_data:
-        try:
-            items = order.get('items', [])
-            if isinstance(items, dict): items = list(items.values())
-            ts = order.get('timestamp') or order.get('completed_time')
-            ot = parse_flexible_date(ts)
-            
-            order_type = order.get('order_type', 'N/A')
-            
-            if ot:
-                if ot.tzinfo is not None: ot = ot.replace(tzinfo=None)
-                for i in items:
-                    nm = i.get('name', 'N/A')
-                    qty = float(i.get('quantity', i.get('qty', 1)))
-                    price = float(i.get('price', 0))
-                    
-                    analysis.append({
-                        "Tanggal": ot.date(),
-                        "Nama Menu": nm,
-                        "Kategori": cat_map.get(nm, 'Lain-lain'),
-                        "Tipe Order": order_type, 
-                        "Qty": qty,
-                        "Harga Satuan": price,
-                        "Total": qty * price
-                    })
-        except: continue
-    return pd.DataFrame(analysis)
+# --- SKEMA RINGKAS ---
+# Tanggal = datetime64 (jam 00:00), Waktu = timedelta64 sejak 00:00, nominal rupiah = int64,
+# kolom teks berulang = Categorical dengan kategori terurut (urutan groupby/sort sama seperti kolom string biasa).
+MONEY_COLUMNS = ["Subtotal", "Diskon", "Service", "Tax", "Grand Total"]
+CATEGORY_COLUMNS = ["Tipe Order", "Metode Bayar", "Kasir", "Nama Menu", "Kategori", "Kategori Item", "Cabang", "Dokumen"]
+
+def as_category(values):
+    """Kolom teks berulang -> Categorical. Nilai campuran (tidak semua string) tetap object (mirror menyimpannya sebagai JSON)."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if isinstance(s.dtype, pd.CategoricalDtype): return s
+    if pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"): return s.astype(object)
+    return s.astype("category")
+
+def to_rupiah(values):
+    """Nominal (float, sudah tanpa NaN) -> int64 rupiah (dibulatkan)."""
+    return values.round().astype("int64")
+
+def menu_categories(nama_menu, cat_map):
+    """Kategori item dari Nama Menu: dipetakan sekali per nama unik (bukan per baris), hasil Categorical."""
+    nama = as_category(nama_menu).astype("category")
+    per_name = pd.Series(nama.cat.categories, dtype=object).map(cat_map).fillna('Lain-lain').tolist() + ['Lain-lain']
+    codes, uniques = pd.factorize(pd.Series(per_name, dtype=object), sort=True)
+    # Kode -1 (Nama Menu kosong) jatuh ke entri terakhir 'Lain-lain'
+    return pd.Series(pd.Categorical.from_codes(codes[nama.cat.codes.to_numpy()], uniques), index=nama.index)
+
+def _is_void_item(itm):
+    try: return itm.get('status') == 'void' or float(itm.get('void_qty', 0) or 0) > 0
+    except (TypeError, ValueError): return False
+
+def normalize_transactions(history_data, menu_data=None):
+    """
+    Satu-satunya tahap yang membaca dict transaksi mentah.
+    Return (df_orders, df_items):
+    - df_orders: 1 baris per transaksi (kolom DISPLAY_COLUMNS + ORDER_EXTRA_COLUMNS).
+    - df_items : 1 baris per item, terhubung ke order lewat "Order Key".
+                 Baris dari list `void_items` ditandai "Log Void" = True (bukan penjualan).
+    Semua tab dashboard & sheet Excel membaca dari dua tabel ini. Tipe kolom: lihat SKEMA RINGKAS.
+    Jumlah baris yang ditolak: df_orders.attrs['rejected_rows'] & df_items.attrs['rejected_items'];
+    "Order Key" asalnya: attrs['rejected_keys'] & attrs['rejected_item_keys'] (dipakai mirror untuk hitungan per dokumen).
+    """
+    cat_map = _build_category_map(menu_data)
+    o = {k: [] for k in ["Order Key", "Kode Unik", "ts", "Tipe Order", "Meja", "Subtotal", "Diskon", "Service", "Tax",
+                         "Grand Total", "Metode Bayar", "Kasir", "Nama Diskon", "Kode Member", "Nama Member",
+                         "Order Void", "Void Oleh", "Alasan Void"]}
+    it = {k: [] for k in ["Order Key", "Nama Menu", "Qty", "Harga Satuan", "Kode Menu", "Kategori Item",
+                          "Item Void", "Log Void", "Void Oleh", "Waktu Void", "Alasan Void"]}
+    rejected = []        # Order Key transaksi yang ditolak
+    rejected_items = []  # Order Key pemilik item yang ditolak
+
+    for key, order in enumerate(history_data):
+        if not isinstance(order, dict):
+            rejected.append(key); continue
+        pay_method = order.get('payment_method', '-')
+        if isinstance(pay_method, list): pay_method = ", ".join(pay_method)
+        member = order.get('member') if isinstance(order.get('member'), dict) else {}
+
+        o["Order Key"].append(key)
+        o["Kode Unik"].append(order.get('order_id', order.get('unique_code', 'N/A')))
+        o["ts"].append(order.get('timestamp') or order.get('completed_time'))
+        o["Tipe Order"].append(order.get('order_type', 'N/A'))
+        o["Meja"].append(order.get('table_number', 'N/A'))
+        o["Subtotal"].append(order.get('subtotal', 0))
+        o["Diskon"].append(order.get('discount_amount', 0))
+        o["Service"].append(order.get('service_charge', 0))
+        o["Tax"].append(order.get('tax_pb1', 0))
+        o["Grand Total"].append(order.get('total_final', order.get('total', 0)))
+        o["Metode Bayar"].append(pay_method)
+        o["Kasir"].append(order.get('cashier', 'System'))
+        o["Nama Diskon"].append(order.get('discount_name', 'General Discount'))
+        o["Kode Member"].append(member.get('code', 'Non Member'))
+        o["Nama Member"].append(member.get('name', 'Non Member'))
+        o["Order Void"].append(order.get('status') == 'void' or order.get('order_status') == 'void')
+        o["Void Oleh"].append(order.get('void_by'))
+        o["Alasan Void"].append(order.get('void_reason'))
+
+        items = order.get('items', [])
+        if isinstance(items, dict): items = list(items.values())
+        void_items = order.get('void_items')
+        sources = [(items if isinstance(items, list) else [], False),
+                   (void_items if isinstance(void_items, list) else [], True)]
+        for item_list, is_log in sources:
+            for itm in item_list:
+                if not isinstance(itm, dict):
+                    rejected_items.append(key); continue
+                it["Order Key"].append(key)
+                it["Nama Menu"].append(itm.get('name'))
+                it["Qty"].append(itm.get('quantity', itm.get('qty', 1)))
+                it["Harga Satuan"].append(itm.get('price', 0))
+                it["Kode Menu"].append(itm.get('code', ''))
+                it["Kategori Item"].append(itm.get('category', 'Food'))
+                it["Item Void"].append(_is_void_item(itm))
+                it["Log Void"].append(is_log)
+                it["Void Oleh"].append(itm.get('void_by'))
+                it["Waktu Void"].append(itm.get('void_time'))
+                it["Alasan Void"].append(itm.get('void_reason'))
+
+    # --- Tabel order ---
+    df_orders = pd.DataFrame(o).astype({"Order Key": int, "Order Void": bool})
+    ot = parse_timestamp_column(df_orders.pop("ts"))
+    valid = ot.notna()
+    for c in MONEY_COLUMNS:
+        df_orders[c] = pd.to_numeric(df_orders[c], errors='coerce').astype(float)
+        valid &= df_orders[c].notna()
+    df_orders["Subtotal"] = df_orders["Subtotal"].mask((df_orders["Subtotal"] == 0) & (df_orders["Grand Total"] > 0),
+                                                       df_orders["Grand Total"]) # Fallback
+    rejected.extend(df_orders.loc[~valid, "Order Key"].tolist())
+    df_orders, ot = df_orders[valid].copy(), ot[valid]
+    for c in MONEY_COLUMNS: df_orders[c] = to_rupiah(df_orders[c])
+    for c in ["Tipe Order", "Metode Bayar", "Kasir"]: df_orders[c] = as_category(df_orders[c])
+    df_orders["Timestamp"] = ot
+    df_orders["Tanggal"] = ot.dt.normalize()
+    df_orders["Waktu"] = ot - df_orders["Tanggal"]
+    df_orders["Jam"] = ot.dt.hour.astype("int8")
+
+    # --- Tabel item ---
+    df_items = pd.DataFrame(it).astype({"Order Key": int, "Item Void": bool, "Log Void": bool})
+    df_items["Qty"] = pd.to_numeric(df_items["Qty"], errors='coerce').astype(float)
+    df_items["Harga Satuan"] = pd.to_numeric(df_items["Harga Satuan"], errors='coerce').astype(float)
+    ok_items = df_items["Qty"].notna() & df_items["Harga Satuan"].notna()
+    rejected_items.extend(df_items.loc[~ok_items, "Order Key"].tolist())
+    df_items = df_items[ok_items & df_items["Order Key"].isin(df_orders["Order Key"])].copy()
+
+    owner = pd.Index(df_orders["Order Key"]).get_indexer(df_items["Order Key"])  # Baris order pemilik tiap item
+    df_items["Tanggal"] = df_orders["Tanggal"].array.take(owner)
+    df_items["Tipe Order"] = df_orders["Tipe Order"].array.take(owner)
+    df_items["Nama Menu"] = as_category(df_items["Nama Menu"].fillna('N/A'))
+    df_items["Kategori"] = menu_categories(df_items["Nama Menu"], cat_map)
+    df_items["Kategori Item"] = as_category(df_items["Kategori Item"])
+    df_items["Total"] = to_rupiah(df_items["Qty"] * df_items["Harga Satuan"])
+    df_items["Harga Satuan"] = to_rupiah(df_items["Harga Satuan"])
+    df_items = df_items[ITEM_COLUMNS].reset_index(drop=True)
+
+    # "Detail Item" untuk tabel transaksi, dibangun dari tabel item
+    sold = df_items[~df_items["Log Void"]]
+    # (item masih berurutan per order di sini, jadi cukup itertools.groupby - tanpa groupby pandas per grup)
+    labels = [f"{q:g}x {nm}" for q, nm in zip(sold["Qty"].tolist(), sold["Nama Menu"].tolist())]
+    detail = {k: "; ".join(lbl for _, lbl in grp)
+              for k, grp in itertools.groupby(zip(sold["Order Key"].tolist(), labels), key=operator.itemgetter(0))}
+    df_orders["Detail Item"] = df_orders["Order Key"].map(detail).fillna("")
+
+    # Urutkan berdasarkan waktu transaksi (item ikut urutan order-nya) -> bisa di-index per hari
+    df_orders = df_orders.sort_values("Timestamp", kind="stable")
+    order_pos = pd.Series(range(len(df_orders)), index=df_orders["Order Key"].to_numpy())
+    df_items = df_items.iloc[df_items["Order Key"].map(order_pos).to_numpy().argsort(kind="stable")].reset_index(drop=True)
+
+    df_orders = df_orders[DISPLAY_COLUMNS + ORDER_EXTRA_COLUMNS].reset_index(drop=True)
+    df_orders.attrs['rejected_rows'] = len(rejected)
+    df_items.attrs['rejected_items'] = len(rejected_items)
+    df_orders.attrs['rejected_keys'] = tuple(rejected)  # Tuple, bukan array: pandas membandingkan attrs saat concat/agg
+    df_items.attrs['rejected_item_keys'] = tuple(rejected_items)
+    if rejected or rejected_items:
+        print(f"WARNING: {len(rejected)} transaksi & {len(rejected_items)} item dilewati (format data tidak valid).")
+    return df_orders, df_items
+
+def concat_tables(parts):
+    """
+    Gabungkan beberapa pasangan (df_orders, df_items) hasil normalize_transactions.
+    - "Order Key" digeser per bagian supaya tetap unik di tabel gabungan.
+    - Order tetap terurut Timestamp (syarat build_day_index), item mengikuti urutan order-nya.
+    - Kolom Categorical disamakan kategorinya dulu, supaya hasil gabungan tetap Categorical (bukan object).
+    """
+    if not parts: return normalize_transactions([])
+    orders, items = [], []
+    offset = 0
+    for df_o, df_i in parts:
+        orders.append(df_o.assign(**{"Order Key": df_o["Order Key"] + offset}))
+        items.append(df_i.assign(**{"Order Key": df_i["Order Key"] + offset}))
+        if not df_o.empty: offset += int(df_o["Order Key"].max()) + 1
+    orders, items = _unify_categories(orders), _unify_categories(items)
+
+    df_orders = pd.concat(orders, ignore_index=True).sort_values("Timestamp", kind="stable").reset_index(drop=True)
+    df_items = pd.concat(items, ignore_index=True)
+    pos = pd.Series(np.arange(len(df_orders)), index=df_orders["Order Key"].to_numpy())
+    df_items = df_items.iloc[np.argsort(df_items["Order Key"].map(pos).to_numpy(), kind="stable")].reset_index(drop=True)
+    df_orders.attrs, df_items.attrs = {}, {}
+    return df_orders, df_items
+
+def _unify_categories(frames):
+    """Kolom CATEGORY_COLUMNS di semua bagian -> Categorical dengan gabungan kategori yang sama (terurut)."""
+    for c in CATEGORY_COLUMNS:
+        cols = [as_category(f[c]) if c in f else None for f in frames]
+        present = [col for col in cols if col is not None]
+        if not present or not all(isinstance(col.dtype, pd.CategoricalDtype) for col in present): continue
+        cats = sorted(set().union(*(col.cat.categories for col in present)))
+        frames = [f if col is None else f.assign(**{c: col.cat.set_categories(cats)}) for f, col in zip(frames, cols)]
+    return frames
+
+def combine_branch_tables(branch_tables):
+    """Gabungkan tabel order & item beberapa cabang -> (df_orders, df_items) dengan kolom "Cabang"."""
+    df_orders, df_items = concat_tables([(df_o.assign(Cabang=b), df_i.assign(Cabang=b)) for b, (df_o, df_i) in branch_tables.items()])
+    df_orders.attrs['rejected_rows'] = sum(df_o.attrs.get('rejected_rows', 0) for df_o, _ in branch_tables.values())
+    df_items.attrs['rejected_items'] = sum(df_i.attrs.get('rejected_items', 0) for _, df_i in branch_tables.values())
+    return df_orders, df_items
+
+def build_day_index(df):
+    """
+    Index offset per hari untuk tabel yang sudah terurut waktu (hasil normalize_transactions).
+    Return (hari_unik, batas): baris hari_unik[i] ada di df.iloc[batas[i]:batas[i+1]].
+    """
+    if df.empty:
+        return np.array([], dtype='datetime64[D]'), np.array([0])
+    days = df['Tanggal'].to_numpy().astype('datetime64[D]')
+    uniq, starts = np.unique(days, return_index=True)
+    return uniq, np.append(starts, len(df))
+
+def slice_by_date(df, day_index, d1, d2):
+    """Baris df dengan d1 <= Tanggal <= d2 lewat 2x binary search pada index hari (tanpa mask per baris)."""
+    uniq, bounds = day_index
+    lo = np.searchsorted(uniq, np.datetime64(d1, 'D'), side='left')
+    hi = np.searchsorted(uniq, np.datetime64(d2, 'D'), side='right')
+    return df.iloc[bounds[lo]:bounds[hi]]
+
+def sales_items(df_items):
+    """Item yang dihitung sebagai penjualan (tanpa baris log `void_items`)."""
+    if df_items.empty: return df_items
+    return df_items[~df_items["Log Void"]]
+
+def display_table(df, columns):
+    """
+    Kolom untuk st.dataframe: Tanggal (datetime64) & Waktu (timedelta64) diformat teks seperti dulu,
+    Meja campuran angka/teks dijadikan teks (Arrow menolak kolom bertipe campuran).
+    """
+    out = df[columns]
+    fmt = {}
+    if "Tanggal" in out: fmt["Tanggal"] = out["Tanggal"].dt.strftime("%Y-%m-%d")
+    if "Waktu" in out: fmt["Waktu"] = (pd.Timestamp(0) + out["Waktu"]).dt.strftime("%H:%M:%S")
+    if "Meja" in out and out["Meja"].dtype == object: fmt["Meja"] = out["Meja"].astype(str)
+    return out.assign(**fmt)
+
+# --- TABEL DETAIL BERHALAMAN ---
+# Filter, cari & urut dikerjakan di server atas tabel order yang sudah ter-index per hari;
+# yang dikirim ke browser hanya 1 halaman baris.
+DETAIL_PAGE_SIZES = [25, 50, 100, 250]
+DETAIL_SORT_OPTIONS = {
+    "Waktu (lama → baru)": ("Timestamp", True),
+    "Waktu (baru → lama)": ("Timestamp", False),
+    "Grand Total (terbesar)": ("Grand Total", False),
+    "Grand Total (terkecil)": ("Grand Total", True),
+    "Kode Unik": ("Kode Unik", True),
+    "Kasir": ("Kasir", True),
+}
+
+def filter_options(values):
+    """Nilai unik (terurut, tanpa kosong) untuk pilihan filter."""
+    return sorted(map(str, values.dropna().unique()))
+
+def query_orders(df_orders, day_index, d1, d2, kasir=(), bayar=(), search="", sort_by="Timestamp", ascending=True):
+    """
+    Transaksi dalam rentang tanggal (lewat index hari) yang lolos filter kasir / metode bayar
+    dan pencarian teks (Kode Unik atau Meja, tanpa beda huruf besar/kecil), terurut sort_by.
+    """
+    rows = slice_by_date(df_orders, day_index, d1, d2)
+    mask = np.ones(len(rows), dtype=bool)
+    if kasir: mask &= rows["Kasir"].isin(kasir).to_numpy()
+    if bayar: mask &= rows["Metode Bayar"].isin(bayar).to_numpy()
+    q = search.strip().lower()
+    if q:
+        mask &= (rows["Kode Unik"].astype(str).str.lower().str.contains(q, regex=False) |
+                 rows["Meja"].astype(str).str.lower().str.contains(q, regex=False)).to_numpy()
+    rows = rows[mask]
+    if sort_by == "Timestamp" and ascending: return rows  # Sudah terurut waktu
+    return rows.sort_values(sort_by, ascending=ascending, kind="stable")
+
+def order_items(df_items, item_day_index, order):
+    """Item 1 transaksi (baris tabel order): cari di hari transaksi itu saja lewat index hari."""
+    day = order["Tanggal"].date()
+    items = slice_by_date(df_items, item_day_index, day, day)
+    return items[items["Order Key"] == order["Order Key"]]
+
+# --- ROLLUP HARIAN (agregat kecil per hari untuk tab KPI & grafik) ---
+# Format panjang: 1 baris per (Tanggal, Dimensi, Kunci). KPI rentang tanggal apa pun = jumlah baris rollup,
+# bukan agregasi ulang seluruh transaksi mentah.
+ROLLUP_COLUMNS = ["Tanggal", "Dimensi", "Kunci", "Total", "Qty", "Jumlah"]
+_ROLLUP_ORDER_DIMS = [("hari", None), ("bayar", "Metode Bayar"), ("tipe_order", "Tipe Order"), ("jam", "Jam"), ("cabang", "Cabang")]
+_ROLLUP_ITEM_DIMS = [("kategori", "Kategori"), ("item", "Nama Menu")]
+
+@st.cache_resource
+def _rollup_store():
+    """
+    Rollup per hari yang sudah dihitung (per proses, dipakai bersama semua sesi).
+    Per scope (nama cabang, atau ("Semua Cabang", cabang-cabang terurut) karena tiap user bisa punya set cabang
+    berbeda): {"menu": versi_menu, "days": {tanggal: (fingerprint, df_rollup)}}
+    """
+    return {"lock": threading.Lock(), "scopes": {}}
+
+def menu_version(*menu_configs):
+    """Versi konfigurasi menu (kategori item ikut menu, jadi rollup kategori dibangun ulang jika menu berubah)."""
+    return hashlib.sha1(json.dumps(menu_configs, sort_keys=True, default=str).encode()).hexdigest()
+
+def compute_daily_rollups(df_orders, df_items):
+    """
+    Agregat per hari dari tabel order & item (format panjang ROLLUP_COLUMNS).
+    Dimensi order (Total = Grand Total, Jumlah = jumlah bon): hari, bayar, tipe_order, jam, cabang.
+    Dimensi item penjualan (Total = Total item, Qty, Jumlah = baris item): kategori, item.
+    """
+    parts = []
+    for dim, col in _ROLLUP_ORDER_DIMS:
+        if col is not None and col not in df_orders: continue
+        g = df_orders.groupby(["Tanggal"] + ([col] if col else []), sort=False, dropna=False, observed=True)["Grand Total"]\
+            .agg(["sum", "size"]).reset_index()
+        parts.append(pd.DataFrame({"Tanggal": g["Tanggal"], "Dimensi": dim, "Kunci": g[col] if col else "",
+                                   "Total": g["sum"], "Qty": 0.0, "Jumlah": g["size"]}))
+    sold = sales_items(df_items)
+    for dim, col in _ROLLUP_ITEM_DIMS:
+        g = sold.groupby(["Tanggal", col], sort=False, dropna=False, observed=True)\
+            .agg(Total=("Total", "sum"), Qty=("Qty", "sum"), Jumlah=("Qty", "size")).reset_index()
+        parts.append(pd.DataFrame({"Tanggal": g["Tanggal"], "Dimensi": dim, "Kunci": g[col],
+                                   "Total": g["Total"], "Qty": g["Qty"], "Jumlah": g["Jumlah"]}))
+    parts = [p for p in parts if not p.empty]
+    if not parts: return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[ROLLUP_COLUMNS]
+
+def _day_positions(bounds, idx):
+    """Posisi baris (iloc) untuk hari-hari ke-idx dari batas build_day_index."""
+    if not idx: return np.array([], dtype=int)
+    return np.concatenate([np.arange(bounds[i], bounds[i + 1]) for i in idx])
+
+# Kolom yang dibaca compute_daily_rollups -> isi fingerprint hari (perubahan kolom lain tidak mengubah rollup)
+_ROLLUP_ORDER_FIELDS = ["Grand Total"] + [c for _, c in _ROLLUP_ORDER_DIMS if c]
+_ROLLUP_ITEM_FIELDS = [c for _, c in _ROLLUP_ITEM_DIMS] + ["Qty", "Total", "Log Void"]
+
+def _day_hashes(df, columns, bounds):
+    """Hash isi per hari (jumlah mod 2^64 hash baris kolom `columns`): berubah jika ada nilai yang berubah."""
+    if len(df) == 0: return []
+    rows = pd.util.hash_pandas_object(df[[c for c in columns if c in df]], index=False).to_numpy()
+    return np.add.reduceat(rows, bounds[:-1]).tolist()
+
+def update_daily_rollups(scope, df_orders, df_items, order_day_index, item_day_index, menu_ver):
+    """
+    Rollup harian untuk satu scope, dihitung ulang HANYA untuk hari yang berubah.
+    Fingerprint hari = (jumlah bon, jumlah item, hash isi kolom rollup order & item), jadi edit metode bayar,
+    tipe order, jam atau tukar item dengan harga sama juga terdeteksi; hari ini selalu dihitung ulang
+    karena POS masih menambah transaksi. Return rollup semua hari di data (terurut Tanggal).
+    """
+    o_days, o_bounds = order_day_index
+    i_days, i_bounds = item_day_index
+    days = o_days.astype(object).tolist()
+    with trace_span("rollup.fingerprint"):
+        order_hashes = _day_hashes(df_orders, _ROLLUP_ORDER_FIELDS, o_bounds)
+        items_by_day = {d: (int(n), h) for d, n, h in zip(i_days.astype(object).tolist(), np.diff(i_bounds),
+                                                          _day_hashes(df_items, _ROLLUP_ITEM_FIELDS, i_bounds))}
+    fingerprints = {d: (int(n), h) + items_by_day.get(d, (0, 0))
+                    for d, n, h in zip(days, np.diff(o_bounds), order_hashes)}
+    today = date.today()
+
+    store = _rollup_store()
+    with store['lock']:
+        entry = store['scopes'].get(scope)
+        if entry is None or entry['menu'] != menu_ver:
+            entry = store['scopes'][scope] = {"menu": menu_ver, "days": {}}
+        stale = [i for i, d in enumerate(days)
+                 if d >= today or entry['days'].get(d, (None,))[0] != fingerprints[d]]
+
+        if stale:
+            i_pos = {d: k for k, d in enumerate(i_days.astype(object).tolist())}
+            fresh = compute_daily_rollups(
+                df_orders.iloc[_day_positions(o_bounds, stale)],
+                df_items.iloc[_day_positions(i_bounds, [i_pos[days[i]] for i in stale if days[i] in i_pos])])
+            by_day = {t.date(): part for t, part in fresh.groupby("Tanggal", sort=False)}
+            for i in stale:
+                d = days[i]
+                entry['days'][d] = (fingerprints[d], by_day.get(d, fresh.iloc[0:0]))
+            print(f"INFO: Rollup {scope}: {len(stale)} hari dihitung ulang, {len(days) - len(stale)} dari cache.")
+        trace_count("rollup.days_recomputed", len(stale)); trace_count("rollup.days_cached", len(days) - len(stale))
+
+        frames = [entry['days'][d][1] for d in days]
+    if not frames: return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def rollup_range(rollups, d1, d2):
+    """Baris rollup untuk d1 <= Tanggal <= d2."""
+    if rollups.empty: return rollups
+    return rollups[(rollups["Tanggal"] >= pd.Timestamp(d1)) & (rollups["Tanggal"] <= pd.Timestamp(d2))]
+
+ROLLUP_METRICS = (("Total", "Total", "sum"), ("Qty", "Qty", "sum"), ("Jumlah", "Jumlah", "sum"))
+
+def rollup_by(rollups, dim, key_name, version=None, date_range=None):
+    """
+    Jumlahkan rollup satu dimensi per kunci -> DataFrame [key_name, Total, Qty, Jumlah].
+    version / date_range: versi rollup & rentang tanggal -> hasil di-memo lewat aggregate (None = hitung langsung).
+    """
+    r = rollups[rollups["Dimensi"] == dim]
+    return aggregate(f"rollup:{dim}", r, ["Kunci"], ROLLUP_METRICS, version, date_range, sort=False)\
+        .rename(columns={"Kunci": key_name})
+
+# --- AGREGAT BERSAMA (MEMO) ---
+# Satu pintu untuk groupby ringkasan (grafik tab KPI & sheet Excel). Hasil di-memo per proses dengan key
+# (sumber, versi data, rentang tanggal, kunci, metrik, urut) -> agregat yang sama dihitung sekali per versi data.
+# Agregat kasar (mis. per Kategori) diturunkan dari agregat lebih rinci yang sudah ada di memo
+# (mis. Kategori + Nama Menu + Tipe Order) jika semua metriknya bisa dijumlah ulang (sum / count / size).
+AGGREGATE_CACHE_MAX = 256       # Jumlah hasil agregat yang disimpan (LRU); hasilnya kecil (1 baris per grup)
+_REAGGREGATABLE = {"sum", "count", "size"}
+
+@st.cache_resource
+def _aggregate_store():
+    """Memo agregat (per proses, dipakai bersama semua sesi & thread job laporan). {key: DataFrame}, urutan LRU."""
+    return {"lock": threading.Lock(), "entries": collections.OrderedDict()}
+
+def data_version(*frames):
+    """Fingerprint isi tabel -> berubah jika ada baris yang bertambah atau berubah."""
+    h = hashlib.sha1()
+    for df in frames:
+        h.update(str(df.shape).encode())
+        if not df.empty:
+            h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _compute_aggregate(df, keys, metrics, sort):
+    """groupby + named aggregation. Grup dengan kunci kosong (NaN) ikut disimpan supaya bisa dijumlah ulang."""
+    g = df.groupby(list(keys), sort=sort, dropna=False, observed=True)
+    return g.agg(**{out: (col, fn) for out, col, fn in metrics}).reset_index()
+
+def _finer_aggregate(entries, key):
+    """Hasil memo dengan sumber/versi/rentang sama, kunci lebih rinci & metrik yang bisa dijumlah ulang (atau None)."""
+    source, version, date_range, keys, metrics, sort = key
+    for (s, v, r, k, m, srt), result in reversed(entries.items()):
+        if (s, v, r, srt) == (source, version, date_range, sort) and set(keys) < set(k) and set(metrics) <= set(m) \
+                and all(fn in _REAGGREGATABLE for _, _, fn in metrics):
+            return result
+    return None
+
+def aggregate(source, df, keys, metrics, version=None, date_range=None, sort=True):
+    """
+    df.groupby(keys).agg(...) lewat memo bersama. Return DataFrame [kunci..., metrik...] (salinan, aman diubah).
+    source  : nama tabel asal (mis. "orders", "items_sold", "rollup:kategori"), supaya kunci sama di tabel lain tidak tertukar.
+    metrics : tuple (kolom_hasil, kolom, fungsi), mis. (("Total", "Total", "sum"), ("Qty", "Qty", "size")).
+    version : versi data (lihat data_version); None = hitung langsung tanpa memo.
+    Seperti groupby bawaan, baris dengan kunci kosong (NaN) tidak ikut di hasil.
+    """
+    keys, metrics = tuple(keys), tuple(metrics)
+    if version is None: return _compute_aggregate(df, keys, metrics, sort).dropna(subset=list(keys))
+    key = (source, version, date_range, keys, metrics, sort)
+    store = _aggregate_store()
+    with store['lock']:
+        result = store['entries'].get(key)
+        if result is not None: store['entries'].move_to_end(key)
+        finer = _finer_aggregate(store['entries'], key) if result is None and sort else None
+
+    if result is not None:
+        trace_count("aggregate.hit")
+    else:
+        if finer is not None:  # Jumlah ulang hasil rinci (kecil), bukan groupby ulang tabel transaksi
+            result = _compute_aggregate(finer, keys, tuple((out, out, "sum") for out, _, _ in metrics), sort)
+            trace_count("aggregate.derived")
+        else:
+            result = _compute_aggregate(df, keys, metrics, sort)
+            trace_count("aggregate.miss")
+        with store['lock']:
+            store['entries'][key] = result
+            while len(store['entries']) > AGGREGATE_CACHE_MAX: store['entries'].popitem(last=False)
+    return result.dropna(subset=list(keys))
+
+# --- MODE LIVE (HARI INI) ---
+# Listener on_snapshot pada dokumen daily_reports/{hari ini} per cabang, dipakai bersama semua sesi.
+# Transaksi baru di-append ke tabel order & item di memori; panel live hanya membaca tabel ini (tanpa fetch ulang)
+# dan tab KPI mengganti baris hari ini dengan tabel ini (merge_live_today).
+# Listener yang tidak dibaca selama LIVE_IDLE_TTL detik dilepas.
+LIVE_REFRESH_SECONDS = 5
+LIVE_IDLE_TTL = 600
+
+@st.cache_resource
+def _live_listeners():
+    """State listener per cabang: {cabang: {"date", "lock", "orders", "items", "seen", "prefix", "version", ...}}."""
+    return {"lock": threading.Lock(), "branches": {}}
+
+def _live_tables(transactions):
+    """normalize_transactions tanpa attrs (jumlah ditolak disimpan di state listener). Return (orders, items, rejected)."""
+    df_orders, df_items = normalize_transactions(transactions)
+    rejected = [df_orders.attrs['rejected_rows'], df_items.attrs['rejected_items']]
+    df_orders.attrs, df_items.attrs = {}, {}
+    return df_orders, df_items, rejected
+
+def _live_state(date_key):
+    df_orders, df_items, _ = _live_tables([])
+    return {"date": date_key, "lock": threading.Lock(), "orders": df_orders, "items": df_items,
+            "seen": 0, "prefix": _content_hash([]), "rejected": [0, 0], "version": 0,
+            "updated": None, "last_read": time.time(), "error": None, "watch": None}
+
+def apply_live_snapshot(state, data):
+    """
+    Terapkan isi terbaru dokumen hari ini ke tabel live.
+    Kasus umum (POS hanya menambah transaksi): hanya transaksi baru yang dinormalisasi lalu di-append.
+    Jika transaksi lama ikut berubah (mis. void) atau berkurang, tabel dibangun ulang dari seluruh isi dokumen.
+    """
+    trx = _doc_to_transactions(state['date'], data or {})
+    with state['lock']:
+        seen = state['seen']
+        if len(trx) >= seen and _content_hash(trx[:seen]) == state['prefix']:
+            new = trx[seen:]
+            if not new: return
+            new_o, new_i, new_rejected = _live_tables(new)
+            df_orders, df_items = concat_tables([(state['orders'], state['items']), (new_o, new_i)])
+            rejected = [a + b for a, b in zip(state['rejected'], new_rejected)]
+        else:
+            df_orders, df_items, rejected = _live_tables(trx)
+            new = trx
+        state.update(orders=df_orders, items=df_items, seen=len(trx), prefix=_content_hash(trx), rejected=rejected,
+                     version=state['version'] + 1, updated=datetime.now(), error=None)
+    print(f"INFO: Live {state['date']}: {len(new)} transaksi diproses, total {len(df_orders)} bon.")
+
+def start_live_listener(branch_name, db=None):
+    """
+    Pasang listener dokumen hari ini untuk cabang (atau pakai listener yang sudah ada). Return state listener.
+    Saat tanggal berganti, listener lama dilepas dan diganti dokumen hari baru.
+    `db` bisa diisi sumber snapshot palsu (objek dengan collection(...).document(...).on_snapshot(callback)).
+    """
+    registry, today, now = _live_listeners(), date.today().isoformat(), time.time()
+    with registry['lock']:
+        for b, other in list(registry['branches'].items()):
+            if b != branch_name and now - other['last_read'] > LIVE_IDLE_TTL: _stop_live(registry, b)
+        state = registry['branches'].get(branch_name)
+        if state and state['date'] == today:
+            state['last_read'] = now
+            return state
+        if state: _stop_live(registry, branch_name)
+
+        state = _live_state(today)
+        def on_snapshot(doc_snapshots, changes, read_time):
+            # Dipanggil di thread listener Firestore (bukan thread Streamlit): jangan panggil st.* di sini
+            try:
+                apply_live_snapshot(state, next((s.to_dict() for s in doc_snapshots if s.exists), {}))
+            except Exception as e:
+                state['error'] = str(e)
+                print(f"WARNING: Live {branch_name} gagal memproses snapshot: {e}")
+        db = db or get_firestore_client()
+        doc_ref = db.collection('branches').document(branch_name).collection('daily_reports').document(today)
+        state['watch'] = doc_ref.on_snapshot(on_snapshot)
+        registry['branches'][branch_name] = state
+    return state
+
+def _stop_live(registry, branch_name):
+    state = registry['branches'].pop(branch_name, None)
+    if state and state['watch'] is not None:
+        try: state['watch'].unsubscribe()
+        except Exception as e: print(f"WARNING: Gagal melepas listener live {branch_name}: {e}")
+
+def stop_live_listener(branch_name):
+    """Lepas listener live satu cabang (mis. setelah data cabang di-reset)."""
+    registry = _live_listeners()
+    with registry['lock']:
+        _stop_live(registry, branch_name)
+
+def merge_live_today(branch_name, df_orders, df_items, d1, d2, menu_data=None):
+    """
+    Ganti baris hari ini di tabel hasil fetch_data dengan tabel live, supaya KPI, grafik & rollup ikut
+    transaksi terbaru (hanya jika rentang d1..d2 memuat hari ini dan listener sudah menerima snapshot).
+    Versi live yang sudah digabung dicatat di session_state['live_merged'] (lihat live_today_panel).
+    """
+    try:
+        state = start_live_listener(branch_name)
+    except Exception:
+        return df_orders, df_items  # Error ditampilkan oleh live_today_panel
+    with state['lock']:
+        live_o, live_i, version = state['orders'], state['items'], state['version']
+    st.session_state['live_merged'] = (branch_name, state['date'], version)
+    today = date.fromisoformat(state['date'])
+    if not version or not d1 <= today <= d2: return df_orders, df_items
+
+    def before_today(df): return df[df['Tanggal'].to_numpy().astype('datetime64[D]') < np.datetime64(today, 'D')]
+    live_o = live_o[[c for c in live_o.columns if c in df_orders.columns]]
+    if "Kategori" in df_items: live_i = live_i.assign(Kategori=menu_categories(live_i["Nama Menu"], _build_category_map(menu_data)))
+    live_i = live_i[[c for c in live_i.columns if c in df_items.columns]]
+    attrs_o, attrs_i = df_orders.attrs, df_items.attrs
+    df_orders, df_items = concat_tables([(before_today(df_orders), before_today(df_items)), (live_o, live_i)])
+    df_orders.attrs, df_items.attrs = attrs_o, attrs_i
+    return df_orders, df_items
 
 # ==============================================================================
 # 5. EXCEL REPORT GENERATOR (FULL 8 SHEETS MERGED)
 # ==============================================================================
-def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, start_date, end_date): 
+def _column_kind(values):
+    """Jenis data satu kolom -> dipakai untuk memilih metode tulis xlsxwriter sekali per kolom."""
+    if isinstance(values.dtype, pd.CategoricalDtype): return _column_kind(values.cat.categories)
+    if pd.api.types.is_bool_dtype(values): return 'generic'
+    if pd.api.types.is_numeric_dtype(values): return 'number'
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'string': return 'string'
+    if kind in ('floating', 'integer', 'mixed-integer-float'): return 'number'
+    if kind in ('date', 'datetime', 'datetime64'): return 'datetime'
+    return 'generic'
+
+def _strftime(values, fmt):
+    """Series.dt.strftime lewat nilai unik (jam/tanggal yang sama berulang di banyak baris -> diformat sekali). NaT -> NaN."""
+    codes, uniques = pd.factorize(values)
+    out = np.asarray(uniques.strftime(fmt), dtype=object)[codes]
+    return pd.Series(out, index=values.index).where(codes >= 0)
+
+PROGRESS_EVERY_ROWS = 2000   # Interval laporan progres write_table (baris)
+_XML_PRESERVE = ' xml:space="preserve"'
+_XML_PLAIN_TEXT = re.compile("[^\x00-\x08\x0b-\x1f&<>\ufffe\uffff]+")
+_XL_SPECIAL_STRING = re.compile(r"=|\{=.*\}$|(ftp|http)s?://|mailto:|(in|ex)ternal:|file://")
+
+def _value_kind(v):
+    """Jenis 1 nilai kolom campuran (dispatch ws.write). None = butuh logika xlsxwriter lain (formula, URL, bool, ...)."""
+    t = v.__class__
+    if t is int or t is float: return 'number'
+    if t is str:
+        if v == "": return 'blank'
+        return None if _XL_SPECIAL_STRING.match(v) else 'string'
+    if t is pd.Timestamp or t is datetime or t is date: return 'datetime'
+    return None
+
+def _stream_rows(ws, first_row, n_rows, plan, progress):
+    """
+    Jalur cepat write_table untuk worksheet constant_memory: XML <row>/<c> dirakit langsung per blok
+    PROGRESS_EVERY_ROWS baris lalu ditulis ke file baris worksheet, tanpa 1 panggilan write_* + 1 objek sel per sel
+    (~85% waktu export sebelumnya habis di sana). Format per kolom diubah ke atribut s="..." sekali,
+    teks di-escape sekali per string unik. Hasil XML identik dengan write_number/write_string/write_datetime/write_blank.
+    Return False (belum ada yang ditulis) jika worksheet / isi tabel butuh jalur xlsxwriter biasa.
+    """
+    if not ws.constant_memory or ws.write_handlers or ws.excel_version != 2007 or ws.default_row_height != ws.original_row_height:
+        return False
+    if first_row < ws.previous_row or (first_row == ws.previous_row and ws.table.get(first_row)) or first_row + n_rows > ws.xls_rowmax:
+        return False
+    if any(r >= first_row for r in itertools.chain(ws.set_rows, ws.comments)): return False
+
+    columns = []
+    for col, kind, vals, fmts in sorted(plan, key=operator.itemgetter(0)):
+        if kind == 'generic':
+            kinds = [v if v is None else _value_kind(v) for v in vals]
+            if any((k is None and v is not None) or (k == 'datetime' and f is None) for k, v, f in zip(kinds, vals, fmts)):
+                return False
+        elif kind == 'number' and not all(map(math.isfinite, filter(None, vals))): return False
+        default = ws.col_info[col][1] if col in ws.col_info else None   # Sel tanpa format ikut format kolom
+        columns.append((xlsxwriter.utility.xl_col_to_name(col), col, kinds if kind == 'generic' else kind, vals, fmts, default))
+
+    styles, texts, dates = {None: ""}, {}, {}
+    def style(fmt):
+        s = styles.get(fmt)
+        if s is None: s = styles[fmt] = f' s="{fmt._get_xf_index()}"'
+        return s
+
+    def text(v):
+        t = texts.get(v)
+        if t is None:
+            if len(v) <= ws.xls_strmax and _XML_PLAIN_TEXT.fullmatch(v) and "_x" not in v and not (v[0].isspace() or v[-1].isspace()):
+                t = f"<t>{v}</t>"   # Kasus umum: tidak ada yang perlu di-escape
+            else:
+                s = ws._escape_control_characters(v[:ws.xls_strmax])
+                if s.startswith("<r>") and s.endswith("</r>"): t = s
+                else: t = f'<t{_XML_PRESERVE if xlsxwriter.utility._preserve_whitespace(s) else ""}>{ws._escape_data(s)}</t>'
+            texts[v] = t
+        return t
+
+    def serial(v):
+        n = dates.get(v)
+        if n is None: n = dates[v] = f"{ws._convert_date_time(v):.16G}"
+        return n
+
+    def body(kind, v):
+        if kind == 'number': return f"><v>{v:.16G}</v></c>"
+        if kind == 'string': return f' t="inlineStr"><is>{text(v)}</is></c>'
+        if kind == 'datetime': return f"><v>{serial(v)}</v></c>"
+        return None   # blank
+
+    def render(name, kind, vals, fmts, default, rows):
+        """Fragmen <c> per baris ("" = sel tidak ditulis: kosong tanpa format)."""
+        if kind == 'number': bodies = [None if v is None else f"><v>{v:.16G}</v></c>" for v in vals]
+        elif kind == 'string':
+            known = texts.get
+            bodies = [None if v is None else f' t="inlineStr"><is>{known(v) or text(v)}</is></c>' for v in vals]
+        elif kind == 'datetime': bodies = [None if v is None else f"><v>{serial(v)}</v></c>" for v in vals]
+        else: bodies = [None if v is None else body(k, v) for k, v in zip(kind, vals)]
+        if kind == 'datetime': default = ws.default_date_format
+        if len(set(fmts)) == 1:
+            fmt = fmts[0]
+            value_attr, blank = style(fmt or default), f'{style(fmt)}/>' if fmt is not None else None
+            return [f'<c r="{name}{r}"{value_attr}{b}' if b is not None else (f'<c r="{name}{r}"{blank}' if blank else "")
+                    for r, b in zip(rows, bodies)]
+        default_attr = style(default)
+        return [f'<c r="{name}{r}"{styles[f] if f is not None else default_attr}{b}' if b is not None
+                else (f'<c r="{name}{r}"{styles[f]}/>' if f is not None else "") for r, b, f in zip(rows, bodies, fmts)]
+
+    if first_row > ws.previous_row: ws._write_single_row(first_row)   # Flush baris yang masih ditahan xlsxwriter
+    used_rows, used_cols = [], set()
+    for start in range(0, n_rows, PROGRESS_EVERY_ROWS):
+        stop = min(start + PROGRESS_EVERY_ROWS, n_rows)
+        rows = [str(r + 1) for r in range(first_row + start, first_row + stop)]
+        # Indeks xf dibagikan xlsxwriter saat format pertama kali dipakai: urutkan seperti penulisan baris per baris
+        new = [(fmts.index(f, start, stop), k, f) for k, (_, _, _, _, fmts, _) in enumerate(columns)
+               for f in dict.fromkeys(fmts[start:stop]) if f is not None and f not in styles]
+        for _, _, f in sorted(new, key=operator.itemgetter(0, 1)): style(f)
+        cells = []
+        for name, col, kinds, vals, fmts, default in columns:
+            rendered = render(name, kinds if isinstance(kinds, str) else kinds[start:stop], vals[start:stop], fmts[start:stop], default, rows)
+            if any(rendered): used_cols.add(col)
+            cells.append(rendered)
+        chunk = []
+        for i, row_cells in enumerate(zip(*cells)):
+            xml = "".join(row_cells)
+            if not xml: continue
+            used_rows.append(first_row + start + i)
+            chunk.append(f'<row r="{rows[i]}">{xml}</row>')
+        ws.fh.write("".join(chunk))
+        if progress: progress(start, n_rows)
+    if progress: progress(n_rows, n_rows)
+
+    if used_rows:
+        ws._check_dimensions(used_rows[0], min(used_cols))
+        ws._check_dimensions(used_rows[-1], max(used_cols))
+        ws.previous_row = used_rows[-1]
+    return True
+
+def write_table(ws, first_row, columns, progress=None):
+    """
+    Tulis blok tabel sekaligus dari kolom utuh (Series / array / list / nilai skalar).
+    columns: list (kolom_ke, nilai, format); format boleh satu Format atau list Format per baris.
+    - Worksheet constant_memory: baris dirakit langsung sebagai XML per blok (_stream_rows).
+      Selain itu (atau ada nilai khusus: formula, URL, bool) metode tulis (write_number / write_string /
+      write_datetime) dipilih sekali per kolom, bukan dicek per sel seperti ws.write.
+    - Ditulis baris per baris dari atas ke bawah (aman untuk mode constant_memory).
+    - Nilai None: sel dikosongkan dengan formatnya (write_blank), atau dilewati jika format None.
+    - progress(baris_selesai, total_baris) dipanggil tiap PROGRESS_EVERY_ROWS baris (opsional).
+    Return: nomor baris setelah baris terakhir.
+    """
+    n_rows = max((len(v) for _, v, _ in columns if not np.isscalar(v)), default=0)
+    plan = []
+    for col, values, fmt in columns:
+        if np.isscalar(values):
+            kind = 'number' if isinstance(values, (int, float)) else ('string' if isinstance(values, str) else 'generic')
+            vals = [values] * n_rows
+        else:
+            series = values if isinstance(values, pd.Series) else pd.Series(values)
+            kind = _column_kind(series)
+            if kind == 'number' and pd.api.types.is_numeric_dtype(series) and not series.isna().any():
+                vals = series.tolist()
+            else:
+                vals = series.astype(object).where(series.notna(), None).tolist()
+                if kind == 'string': vals = [v or None for v in vals]  # "" -> sel kosong, sama seperti ws.write
+        fmts = fmt if isinstance(fmt, list) else [fmt] * n_rows
+        plan.append((col, kind, vals, fmts))
+
+    if n_rows and _stream_rows(ws, first_row, n_rows, plan, progress): return first_row + n_rows
+
+    write_blank = ws.write_blank
+    plan = [(col, {'number': ws.write_number, 'string': ws.write_string, 'datetime': ws.write_datetime}.get(kind, ws.write), vals, fmts)
+            for col, kind, vals, fmts in plan]
+    for i in range(n_rows):
+        r = first_row + i
+        for col, write_fn, vals, fmts in plan:
+            v = vals[i]
+            if v is None:
+                if fmts[i] is not None: write_blank(r, col, None, fmts[i])
+            else:
+                write_fn(r, col, v, fmts[i])
+        if progress and i % PROGRESS_EVERY_ROWS == 0: progress(i, n_rows)
+    if progress: progress(n_rows, n_rows)
+    return first_row + n_rows
+
+REPORT_SHEET_COUNT = 8
+
+SALES_METRICS = (("Qty", "Qty", "sum"), ("Total", "Total", "sum"))
+ORDER_METRICS = (("Grand Total", "Grand Total", "sum"), ("Kode Unik", "Kode Unik", "count"))
+
+def create_esb_style_excel(df_trx, df_items, branch_name, start_date, end_date, output_path=None, progress=None, version=None):
     """
     Export Lengkap dengan 8 Sheet (6 Standard + Promo + Cancel).
+    df_trx / df_items = tabel order & item hasil normalize_transactions (sudah difilter tanggal).
+    Workbook ditulis mode constant_memory (baris langsung di-flush ke file, tidak ditahan di RAM),
+    jadi setiap sheet WAJIB ditulis berurutan dari baris atas ke bawah.
+    progress(no_sheet, nama_sheet, baris_selesai, total_baris): callback opsional (dipakai job background).
+    version: versi data (data_version) -> agregat ringkasan di-memo lewat aggregate (None = hitung langsung).
+    Return: path file .xlsx (default: file temporary, pemanggil yang menghapus).
     """
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        workbook = writer.book
+    items_sold = sales_items(df_items)
+    agg = functools.partial(aggregate, version=version, date_range=(str(start_date), str(end_date)))
+    # Agregat item paling rinci dihitung dulu -> agregat per Kategori diturunkan darinya (tanpa groupby ulang)
+    item_sum = agg("items_sold", items_sold, ["Kategori", "Nama Menu", "Tipe Order"], SALES_METRICS)\
+        .sort_values(['Kategori', 'Total'], ascending=[True, False])
+
+    def sheet_progress(sheet_no, sheet_name):
+        """Lapor mulai sheet, return callback baris untuk write_table di sheet itu."""
+        if progress is None: return None
+        progress(sheet_no, sheet_name, 0, 0)
+        return lambda done, total: progress(sheet_no, sheet_name, done, total)
+
+    if output_path is None:
+        with tempfile.NamedTemporaryFile(prefix="laporan_", suffix=".xlsx", delete=False) as tmp:
+            output_path = tmp.name
+
+    with xlsxwriter.Workbook(output_path, {'constant_memory': True}) as workbook:
         
         # --- STYLING STANDARD ---
         fmt_title = workbook.add_format({'bold': True, 'font_size': 14, 'align': 'left'})
@@ -385,7 +1986,7 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
         # ======================================================================
         # SHEET 1: SALES SUMMARY
         # ======================================================================
-        ws = workbook.add_worksheet('Sales Summary')
+        ws = workbook.add_worksheet('Sales Summary'); sheet_progress(1, 'Sales Summary')
         ws.set_column('A:A', 30); ws.set_column('B:B', 20)
         
         ws.write('A1', f"SALES SUMMARY REPORT - {branch_name}", fmt_title)
@@ -419,19 +2020,18 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
         # ======================================================================
         # SHEET 2: PAYMENT REPORT
         # ======================================================================
-        ws_pay = workbook.add_worksheet('Payment Report')
+        ws_pay = workbook.add_worksheet('Payment Report'); step = sheet_progress(2, 'Payment Report')
         ws_pay.set_column('A:A', 25); ws_pay.set_column('B:B', 20); ws_pay.set_column('C:C', 15)
         ws_pay.write('A1', "PAYMENT METHOD REPORT", fmt_title)
         
         if not df_trx.empty:
-            ws_pay.write('A3', "Payment Method", fmt_th); ws_pay.write('B3', "Total Amount", fmt_th); ws_pay.write('C3', "Trans. Count", fmt_th)
-            pay_sum = df_trx.groupby('Metode Bayar').agg({'Grand Total': 'sum', 'Kode Unik': 'count'}).reset_index()
-            r = 3
-            for idx, row_data in pay_sum.iterrows():
-                ws_pay.write(r, 0, row_data['Metode Bayar'], fmt_text)
-                ws_pay.write(r, 1, row_data['Grand Total'], fmt_curr)
-                ws_pay.write(r, 2, row_data['Kode Unik'], fmt_center)
-                r += 1
+            ws_pay.write_row(2, 0, ["Payment Method", "Total Amount", "Trans. Count"], fmt_th)
+            pay_sum = agg("orders", df_trx, ["Metode Bayar"], ORDER_METRICS)
+            r = write_table(ws_pay, 3, [
+                (0, pay_sum['Metode Bayar'], fmt_text),
+                (1, pay_sum['Grand Total'], fmt_curr),
+                (2, pay_sum['Kode Unik'], fmt_center),
+            ], progress=step)
             ws_pay.write(r, 0, "TOTAL", fmt_total_label)
             ws_pay.write(r, 1, pay_sum['Grand Total'].sum(), fmt_total_val)
             ws_pay.write(r, 2, pay_sum['Kode Unik'].sum(), fmt_total_val)
@@ -439,18 +2039,17 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
         # ======================================================================
         # SHEET 3: CATEGORY SALES
         # ======================================================================
-        if not df_items.empty:
-            ws_cat = workbook.add_worksheet('Category Sales')
+        if not items_sold.empty:
+            ws_cat = workbook.add_worksheet('Category Sales'); step = sheet_progress(3, 'Category Sales')
             ws_cat.set_column('A:A', 25); ws_cat.set_column('B:B', 20); ws_cat.set_column('C:C', 15)
             ws_cat.write('A1', "SALES BY CATEGORY", fmt_title)
-            cat_sum = df_items.groupby('Kategori').agg({'Total': 'sum', 'Qty': 'sum'}).reset_index().sort_values('Total', ascending=False)
-            ws_cat.write('A3', "Category Name", fmt_th); ws_cat.write('B3', "Total Sales", fmt_th); ws_cat.write('C3', "Total Qty", fmt_th)
-            r = 3
-            for idx, row_data in cat_sum.iterrows():
-                ws_cat.write(r, 0, row_data['Kategori'], fmt_text)
-                ws_cat.write(r, 1, row_data['Total'], fmt_curr)
-                ws_cat.write(r, 2, row_data['Qty'], fmt_center)
-                r += 1
+            cat_sum = agg("items_sold", items_sold, ["Kategori"], SALES_METRICS).sort_values('Total', ascending=False)
+            ws_cat.write_row(2, 0, ["Category Name", "Total Sales", "Total Qty"], fmt_th)
+            r = write_table(ws_cat, 3, [
+                (0, cat_sum['Kategori'], fmt_text),
+                (1, cat_sum['Total'], fmt_curr),
+                (2, cat_sum['Qty'], fmt_center),
+            ], progress=step)
             ws_cat.write(r, 0, "TOTAL", fmt_total_label)
             ws_cat.write(r, 1, cat_sum['Total'].sum(), fmt_total_val)
             ws_cat.write(r, 2, cat_sum['Qty'].sum(), fmt_total_val)
@@ -458,39 +2057,35 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
         # ======================================================================
         # SHEET 4: ITEM SALES (DETAIL)
         # ======================================================================
-        if not df_items.empty:
-            ws_item = workbook.add_worksheet('Item Sales')
+        if not items_sold.empty:
+            ws_item = workbook.add_worksheet('Item Sales'); step = sheet_progress(4, 'Item Sales')
             ws_item.set_column('A:A', 20); ws_item.set_column('B:B', 30); ws_item.set_column('C:C', 20); ws_item.set_column('D:D', 10); ws_item.set_column('E:E', 20)
             ws_item.write('A1', "PRODUCT MIX REPORT (ITEM SALES)", fmt_title)
-            item_sum = df_items.groupby(['Kategori', 'Nama Menu', 'Tipe Order']).agg({'Qty': 'sum', 'Total': 'sum'}).reset_index().sort_values(['Kategori', 'Total'], ascending=[True, False])
             headers = ["Category", "Item Name", "Order Type", "Qty Sold", "Total Sales"]
-            for col_num, h in enumerate(headers): ws_item.write(2, col_num, h, fmt_th)
-            r = 3
-            for idx, row_data in item_sum.iterrows():
-                ws_item.write(r, 0, row_data['Kategori'], fmt_text)
-                ws_item.write(r, 1, row_data['Nama Menu'], fmt_text)
-                ws_item.write(r, 2, row_data['Tipe Order'], fmt_center)
-                ws_item.write(r, 3, row_data['Qty'], fmt_center)
-                ws_item.write(r, 4, row_data['Total'], fmt_curr)
-                r += 1
+            ws_item.write_row(2, 0, headers, fmt_th)
+            r = write_table(ws_item, 3, [
+                (0, item_sum['Kategori'], fmt_text),
+                (1, item_sum['Nama Menu'], fmt_text),
+                (2, item_sum['Tipe Order'], fmt_center),
+                (3, item_sum['Qty'], fmt_center),
+                (4, item_sum['Total'], fmt_curr),
+            ], progress=step)
             ws_item.write(r, 3, "TOTAL", fmt_total_label); ws_item.write(r, 4, item_sum['Total'].sum(), fmt_total_val)
 
         # ======================================================================
         # SHEET 5: HOURLY SALES
         # ======================================================================
         if not df_trx.empty:
-            ws_hour = workbook.add_worksheet('Hourly Sales')
+            ws_hour = workbook.add_worksheet('Hourly Sales'); step = sheet_progress(5, 'Hourly Sales')
             ws_hour.set_column('A:A', 15); ws_hour.set_column('B:B', 20); ws_hour.set_column('C:C', 15)
             ws_hour.write('A1', "HOURLY SALES TREND", fmt_title)
-            hour_sum = df_trx.groupby('Jam').agg({'Grand Total': 'sum', 'Kode Unik': 'count'}).reset_index().sort_values('Jam')
-            ws_hour.write('A3', "Hour", fmt_th); ws_hour.write('B3', "Total Sales", fmt_th); ws_hour.write('C3', "Trans. Count", fmt_th)
-            r = 3
-            for idx, row_data in hour_sum.iterrows():
-                jam_str = f"{int(row_data['Jam']):02d}:00 - {int(row_data['Jam'])+1:02d}:00"
-                ws_hour.write(r, 0, jam_str, fmt_center)
-                ws_hour.write(r, 1, row_data['Grand Total'], fmt_curr)
-                ws_hour.write(r, 2, row_data['Kode Unik'], fmt_center)
-                r += 1
+            hour_sum = agg("orders", df_trx, ["Jam"], ORDER_METRICS).sort_values('Jam')
+            ws_hour.write_row(2, 0, ["Hour", "Total Sales", "Trans. Count"], fmt_th)
+            r = write_table(ws_hour, 3, [
+                (0, [f"{int(h):02d}:00 - {int(h)+1:02d}:00" for h in hour_sum['Jam']], fmt_center),
+                (1, hour_sum['Grand Total'], fmt_curr),
+                (2, hour_sum['Kode Unik'], fmt_center),
+            ], progress=step)
             chart = workbook.add_chart({'type': 'column'})
             chart.add_series({'name': 'Sales Amount', 'categories': ['Hourly Sales', 3, 0, r-1, 0], 'values': ['Hourly Sales', 3, 1, r-1, 1], 'fill': {'color': '#3498DB'}})
             ws_hour.insert_chart('E3', chart)
@@ -498,59 +2093,47 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
         # ======================================================================
         # SHEET 6: TRANSACTION LOG (RAW DATA)
         # ======================================================================
-        ws_log = workbook.add_worksheet('Transaction Log')
+        ws_log = workbook.add_worksheet('Transaction Log'); step = sheet_progress(6, 'Transaction Log')
         headers_log = ['Kode Unik', 'Tanggal', 'Waktu', 'Tipe Order', 'Meja', 'Kasir', 'Metode Bayar', 'Grand Total', 'Item Name', 'Qty', 'Item Price', 'Item Total']
-        for i, h in enumerate(headers_log): ws_log.write(0, i, h, fmt_th)
+        ws_log.write_row(0, 0, headers_log, fmt_th)
         ws_log.set_column('A:A', 20); ws_log.set_column('B:C', 12); ws_log.set_column('D:D', 15); ws_log.set_column('G:G', 15); ws_log.set_column('H:H', 15); ws_log.set_column('I:I', 35)
         
-        curr_row = 1
-        if raw_data_filtered:
-            for trx in raw_data_filtered:
-                trx_id = trx.get('order_id', trx.get('unique_code', 'N/A'))
-                ts = trx.get('timestamp') or trx.get('completed_time')
-                ot = parse_flexible_date(ts)
-                tgl_str = ot.strftime("%Y-%m-%d") if ot else "-"
-                jam_str = ot.strftime("%H:%M:%S") if ot else "-"
-                trx_type = trx.get('order_type', '-')
-                table = trx.get('table_number', '-')
-                cashier = trx.get('cashier', 'System')
-                pay_method = trx.get('payment_method', '-')
-                if isinstance(pay_method, list): pay_method = ", ".join(pay_method)
-                grand_total = float(trx.get('total_final', trx.get('total', 0)))
-                items = trx.get('items', [])
-                if isinstance(items, dict): items = list(items.values())
-                
-                first_item_in_trx = True
-                if not items:
-                    ws_log.write(curr_row, 0, trx_id, fmt_text); ws_log.write(curr_row, 1, tgl_str, fmt_center)
-                    ws_log.write(curr_row, 2, jam_str, fmt_center); ws_log.write(curr_row, 3, trx_type, fmt_center)
-                    ws_log.write(curr_row, 4, table, fmt_center); ws_log.write(curr_row, 5, cashier, fmt_center)
-                    ws_log.write(curr_row, 6, pay_method, fmt_text); ws_log.write(curr_row, 7, grand_total, fmt_curr)
-                    ws_log.write(curr_row, 8, "NO ITEMS", fmt_text)
-                    curr_row += 1
-                else:
-                    for item in items:
-                        if first_item_in_trx:
-                            ws_log.write(curr_row, 0, trx_id, fmt_text); ws_log.write(curr_row, 1, tgl_str, fmt_center)
-                            ws_log.write(curr_row, 2, jam_str, fmt_center); ws_log.write(curr_row, 3, trx_type, fmt_center)
-                            ws_log.write(curr_row, 4, table, fmt_center); ws_log.write(curr_row, 5, cashier, fmt_center)
-                            ws_log.write(curr_row, 6, pay_method, fmt_text); ws_log.write(curr_row, 7, grand_total, fmt_curr)
-                            first_item_in_trx = False
-                        else:
-                            for c in range(8): ws_log.write(curr_row, c, "", fmt_empty_border)
-                        
-                        i_name = item.get('name', 'Unknown')
-                        i_qty = float(item.get('quantity', item.get('qty', 1)))
-                        i_price = float(item.get('price', 0))
-                        i_total = i_qty * i_price
-                        ws_log.write(curr_row, 8, i_name, fmt_text); ws_log.write(curr_row, 9, i_qty, fmt_center)
-                        ws_log.write(curr_row, 10, i_price, fmt_curr); ws_log.write(curr_row, 11, i_total, fmt_curr)
-                        curr_row += 1
+        if not df_trx.empty:
+            log_df = df_trx[["Order Key", "Kode Unik", "Timestamp", "Tipe Order", "Meja", "Kasir", "Metode Bayar", "Grand Total"]]\
+                .merge(items_sold[["Order Key", "Nama Menu", "Qty", "Harga Satuan", "Total"]], on="Order Key", how="left", indicator=True)
+            # Baris item ke-2 dst dalam 1 transaksi: kolom order dikosongkan (border saja)
+            first_item = log_df["Order Key"].ne(log_df["Order Key"].shift())
+            no_items = (log_df["_merge"] == 'left_only').to_numpy()
+            first_list = first_item.tolist()
+
+            def order_col(values):
+                return values.where(first_item)
+
+            def order_fmt(fmt):
+                return [fmt if f else fmt_empty_border for f in first_list]
+
+            def item_fmt(fmt):
+                return [None if x else fmt for x in no_items]
+
+            write_table(ws_log, 1, [
+                (0, order_col(log_df["Kode Unik"]), order_fmt(fmt_text)),
+                (1, _strftime(order_col(log_df["Timestamp"]).dt.normalize(), "%Y-%m-%d"), order_fmt(fmt_center)),
+                (2, _strftime(order_col(log_df["Timestamp"]), "%H:%M:%S"), order_fmt(fmt_center)),
+                (3, order_col(log_df["Tipe Order"]), order_fmt(fmt_center)),
+                (4, order_col(log_df["Meja"]), order_fmt(fmt_center)),
+                (5, order_col(log_df["Kasir"]), order_fmt(fmt_center)),
+                (6, order_col(log_df["Metode Bayar"]), order_fmt(fmt_text)),
+                (7, order_col(log_df["Grand Total"]), order_fmt(fmt_curr)),
+                (8, log_df["Nama Menu"].astype(object).where(~no_items, "NO ITEMS"), fmt_text),
+                (9, log_df["Qty"], item_fmt(fmt_center)),
+                (10, log_df["Harga Satuan"], item_fmt(fmt_curr)),
+                (11, log_df["Total"], item_fmt(fmt_curr)),
+            ], progress=step)
 
         # ======================================================================
         # SHEET 7: PROMOTION REPORT (NEW)
         # ======================================================================
-        ws_promo = workbook.add_worksheet('Promotion Report')
+        ws_promo = workbook.add_worksheet('Promotion Report'); step = sheet_progress(7, 'Promotion Report')
         
         # Header
         ws_promo.write('A1', "Promotion Report", fmt_title)
@@ -570,62 +2153,46 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
             "Discount Total", "Voucher Discount", "Bill Total"
         ]
         
-        for col, h in enumerate(headers_promo):
-            ws_promo.write(9, col, h, fmt_table_header_gray)
+        ws_promo.write_row(9, 0, headers_promo, fmt_table_header_gray)
         
         ws_promo.set_column('A:A', 25); ws_promo.set_column('B:B', 12); ws_promo.set_column('C:E', 20)
         ws_promo.set_column('H:I', 15); ws_promo.set_column('V:X', 15)
         
-        row_idx = 10
-        if raw_data_filtered:
-            for trx in raw_data_filtered:
-                ts = trx.get('timestamp') or trx.get('completed_time')
-                ot = parse_flexible_date(ts)
-                sales_date = ot.date() if ot else None
-                sales_no = trx.get('order_id', trx.get('unique_code', '-'))
-                subtotal = float(trx.get('subtotal', 0))
-                bill_total = float(trx.get('total_final', 0))
-                disc_amt = float(trx.get('discount_amount', 0))
-                
-                member = trx.get('member', {}) if isinstance(trx.get('member'), dict) else {}
-                mem_code = member.get('code', 'Non Member')
-                mem_name = member.get('name', 'Non Member')
-                cashier_name = trx.get('cashier', '-')
-                
-                if disc_amt > 0:
-                    promo_name = trx.get('discount_name', 'General Discount')
-                    promo_type = "DISCOUNT (%)" if ("%" in promo_name or "percent" in promo_name.lower()) else "DISCOUNT (AMT)"
-                    
-                    ws_promo.write(row_idx, 0, branch_name, fmt_text)
-                    ws_promo.write(row_idx, 1, sales_date, fmt_date_val)
-                    ws_promo.write(row_idx, 2, promo_type, fmt_text)
-                    ws_promo.write(row_idx, 3, f"{promo_name} (BILL DISCOUNT)", fmt_text)
-                    ws_promo.write(row_idx, 4, sales_no, fmt_text)
-                    ws_promo.write(row_idx, 5, subtotal, fmt_number)
-                    ws_promo.write(row_idx, 6, subtotal - disc_amt, fmt_number)
-                    ws_promo.write(row_idx, 7, mem_code, fmt_text)
-                    ws_promo.write(row_idx, 8, mem_name, fmt_text)
-                    ws_promo.write(row_idx, 9, "Non Member", fmt_text)
-                    ws_promo.write(row_idx, 10, "Non Member", fmt_text)
-                    ws_promo.write(row_idx, 11, "-", fmt_text)
-                    ws_promo.write(row_idx, 12, "-", fmt_text)
-                    ws_promo.write(row_idx, 13, cashier_name, fmt_text)
-                    ws_promo.write(row_idx, 14, "-", fmt_text)
-                    ws_promo.write(row_idx, 15, "-", fmt_text)
-                    ws_promo.write(row_idx, 16, "-", fmt_text)
-                    ws_promo.write(row_idx, 17, "-", fmt_text)
-                    ws_promo.write(row_idx, 18, "-", fmt_text)
-                    ws_promo.write(row_idx, 19, "-", fmt_text)
-                    ws_promo.write(row_idx, 20, 1.0, fmt_number)
-                    ws_promo.write(row_idx, 21, disc_amt, fmt_number)
-                    ws_promo.write(row_idx, 22, 0.0, fmt_number)
-                    ws_promo.write(row_idx, 23, bill_total, fmt_number)
-                    row_idx += 1
+        if not df_trx.empty:
+            promo_df = df_trx[df_trx["Diskon"] > 0]
+            promo_name = promo_df["Nama Diskon"].astype(str)
+            is_percent = promo_name.str.contains("%", regex=False) | promo_name.str.lower().str.contains("percent", regex=False)
+            write_table(ws_promo, 10, [
+                (0, promo_df["Cabang"] if "Cabang" in promo_df else branch_name, fmt_text),  # Semua Cabang: cabang per baris
+                (1, promo_df["Tanggal"], fmt_date_val),
+                (2, np.where(is_percent, "DISCOUNT (%)", "DISCOUNT (AMT)"), fmt_text),
+                (3, promo_name + " (BILL DISCOUNT)", fmt_text),
+                (4, promo_df["Kode Unik"], fmt_text),
+                (5, promo_df["Subtotal"], fmt_number),
+                (6, promo_df["Subtotal"] - promo_df["Diskon"], fmt_number),
+                (7, promo_df["Kode Member"], fmt_text),
+                (8, promo_df["Nama Member"], fmt_text),
+                (9, "Non Member", fmt_text),
+                (10, "Non Member", fmt_text),
+                (11, "-", fmt_text),
+                (12, "-", fmt_text),
+                (13, promo_df["Kasir"], fmt_text),
+                (14, "-", fmt_text),
+                (15, "-", fmt_text),
+                (16, "-", fmt_text),
+                (17, "-", fmt_text),
+                (18, "-", fmt_text),
+                (19, "-", fmt_text),
+                (20, 1.0, fmt_number),
+                (21, promo_df["Diskon"], fmt_number),
+                (22, 0.0, fmt_number),
+                (23, promo_df["Grand Total"], fmt_number),
+            ], progress=step)
 
         # ======================================================================
         # SHEET 8: CANCEL MENU DETAIL REPORT (NEW)
         # ======================================================================
-        ws_cancel = workbook.add_worksheet('Cancel Menu Detail Report')
+        ws_cancel = workbook.add_worksheet('Cancel Menu Detail Report'); step = sheet_progress(8, 'Cancel Menu Detail Report')
         
         ws_cancel.write('A1', "Cancel Menu Detail Report", fmt_title)
         ws_cancel.write('A2', "PT Hoki Berkat Jaya", fmt_header_doc)
@@ -642,287 +2209,525 @@ def create_esb_style_excel(df_trx, df_items, raw_data_filtered, branch_name, sta
             "Subtotal", "Service Charge", "Tax", "Total"
         ]
         
-        for col, h in enumerate(headers_cancel):
-            ws_cancel.write(9, col, h, fmt_table_header_gray)
+        ws_cancel.write_row(9, 0, headers_cancel, fmt_table_header_gray)
             
         ws_cancel.set_column('A:B', 20); ws_cancel.set_column('C:C', 25); ws_cancel.set_column('H:J', 18)
         
-        row_c = 10
-        if raw_data_filtered:
-            for trx in raw_data_filtered:
-                voids_found = []
-                if 'void_items' in trx and isinstance(trx['void_items'], list):
-                    voids_found.extend(trx['void_items'])
-                if 'items' in trx and isinstance(trx['items'], list):
-                    for itm in trx['items']:
-                        if isinstance(itm, dict) and (itm.get('status') == 'void' or itm.get('void_qty', 0) > 0):
-                            voids_found.append(itm)
-                if trx.get('status') == 'void' or trx.get('order_status') == 'void':
-                    if 'items' in trx:
-                        voids_found.extend(trx['items'])
-
-                if voids_found:
-                    sales_no = trx.get('order_id', trx.get('unique_code', '-'))
-                    ts = trx.get('timestamp') or trx.get('completed_time')
-                    order_time = parse_flexible_date(ts)
-                    order_time_str = order_time.strftime("%Y-%m-%d %H:%M:%S") if order_time else "-"
-                    order_by = trx.get('cashier', 'System')
-                    
-                    for v_item in voids_found:
-                        m_name = v_item.get('name', 'Unknown')
-                        m_code = v_item.get('code', '')
-                        m_cat = v_item.get('category', 'Food')
-                        v_by = v_item.get('void_by', trx.get('void_by', order_by))
-                        v_time = v_item.get('void_time', order_time_str)
-                        v_notes = v_item.get('void_reason', trx.get('void_reason', 'Cancelled'))
-                        qty = float(v_item.get('quantity', v_item.get('qty', 1)))
-                        price = float(v_item.get('price', 0))
-                        subtotal = qty * price
-                        svc = subtotal * 0.05
-                        tax = (subtotal + svc) * 0.10
-                        total = subtotal + svc + tax
-
-                        ws_cancel.write(row_c, 0, sales_no, fmt_text)
-                        ws_cancel.write(row_c, 1, branch_name, fmt_text)
-                        ws_cancel.write(row_c, 2, m_name, fmt_text)
-                        ws_cancel.write(row_c, 3, m_code, fmt_text)
-                        ws_cancel.write(row_c, 4, m_cat, fmt_text)
-                        ws_cancel.write(row_c, 5, m_cat, fmt_text)
-                        ws_cancel.write(row_c, 6, order_by, fmt_center)
-                        ws_cancel.write(row_c, 7, order_time_str, fmt_center)
-                        ws_cancel.write(row_c, 8, v_by, fmt_center)
-                        ws_cancel.write(row_c, 9, v_time, fmt_center)
-                        ws_cancel.write(row_c, 10, "Cancel", fmt_center)
-                        ws_cancel.write(row_c, 11, v_notes, fmt_text)
-                        ws_cancel.write(row_c, 12, qty, fmt_number)
-                        ws_cancel.write(row_c, 13, subtotal, fmt_number)
-                        ws_cancel.write(row_c, 14, svc, fmt_number)
-                        ws_cancel.write(row_c, 15, tax, fmt_number)
-                        ws_cancel.write(row_c, 16, total, fmt_number)
-                        row_c += 1
-
-    return output
+        if not df_items.empty and not df_trx.empty:
+            # Urutan per transaksi sama seperti dulu: void_items -> item berstatus void -> semua item order void
+            void_keys = df_trx.loc[df_trx["Order Void"], "Order Key"]
+            cancel_df = pd.concat([
+                df_items[df_items["Log Void"]].assign(_urut=0),
+                items_sold[items_sold["Item Void"]].assign(_urut=1),
+                items_sold[items_sold["Order Key"].isin(void_keys)].assign(_urut=2),
+            ])
+            cancel_df["_pos"] = cancel_df["Order Key"].map(pd.Series(np.arange(len(df_trx)), index=df_trx["Order Key"].to_numpy()))
+            cancel_df = cancel_df.sort_values(["_pos", "_urut"], kind="stable")
+            cancel_df = cancel_df.merge(df_trx[["Order Key", "Kode Unik", "Kasir", "Timestamp", "Void Oleh", "Alasan Void"]],
+                                        on="Order Key", suffixes=("", " Order"))
+
+            order_time_str = _strftime(cancel_df["Timestamp"], "%Y-%m-%d %H:%M:%S")
+            subtotal = cancel_df["Total"]
+            svc = subtotal * 0.05
+            tax = (subtotal + svc) * 0.10
+            write_table(ws_cancel, 10, [
+                (0, cancel_df["Kode Unik"], fmt_text),
+                (1, cancel_df["Cabang"] if "Cabang" in cancel_df else branch_name, fmt_text),
+                (2, cancel_df["Nama Menu"], fmt_text),
+                (3, cancel_df["Kode Menu"], fmt_text),
+                (4, cancel_df["Kategori Item"], fmt_text),
+                (5, cancel_df["Kategori Item"], fmt_text),
+                (6, cancel_df["Kasir"], fmt_center),
+                (7, order_time_str, fmt_center),
+                (8, cancel_df["Void Oleh"].fillna(cancel_df["Void Oleh Order"]).fillna(cancel_df["Kasir"]), fmt_center),
+                (9, cancel_df["Waktu Void"].fillna(order_time_str), fmt_center),
+                (10, "Cancel", fmt_center),
+                (11, cancel_df["Alasan Void"].fillna(cancel_df["Alasan Void Order"]).fillna('Cancelled'), fmt_text),
+                (12, cancel_df["Qty"], fmt_number),
+                (13, subtotal, fmt_number),
+                (14, svc, fmt_number),
+                (15, tax, fmt_number),
+                (16, subtotal + svc + tax, fmt_number),
+            ], progress=step)
+
+    return output_path
+
+# --- JOB LAPORAN DI BACKGROUND + CACHE FILE HASIL ---
+# Workbook dibangun di thread worker (bukan thread script Streamlit), jadi klik ulang / ganti tanggal
+# tidak membuang pekerjaan yang sedang jalan. File jadi disimpan di disk dengan key
+# (cabang, tanggal awal, tanggal akhir, versi data) sehingga download ulang periode yang sama langsung tersedia.
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dashboard_resto_reports"))
+REPORT_CACHE_MAX_FILES = 20      # File laporan terlama (mtime) dibuang jika lebih dari ini
+REPORT_JOB_TTL = 3600            # Detik; job yang sudah selesai lebih lama dari ini dihapus dari registry
+REPORT_WORKERS = 2
+REPORT_LAYOUT_VERSION = 1        # Naikkan jika layout Excel berubah (file lama otomatis tidak dipakai)
+
+@st.cache_resource
+def _report_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="excel-report")
+
+@st.cache_resource
+def _report_jobs():
+    """Registry job laporan (per proses, dipakai bersama semua sesi). {job_id: job_dict}"""
+    return {"lock": threading.Lock(), "jobs": {}}
+
+def report_cache_key(branch_name, start_date, end_date, data_version):
+    raw = f"{REPORT_LAYOUT_VERSION}|{branch_name}|{start_date}|{end_date}|{data_version}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+def _report_cache_path(key):
+    return os.path.join(REPORT_CACHE_DIR, f"{key}.xlsx")
+
+def _prune_report_cache():
+    """Batasi jumlah file di cache laporan (buang yang paling lama tidak disentuh)."""
+    try:
+        files = [os.path.join(REPORT_CACHE_DIR, f) for f in os.listdir(REPORT_CACHE_DIR) if f.endswith(".xlsx")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for old in files[REPORT_CACHE_MAX_FILES:]: os.remove(old)
+    except OSError as e:
+        print(f"WARNING: Gagal membersihkan cache laporan: {e}")
+
+def _run_report_job(job, df_trx, df_items):
+    """Dijalankan di thread worker. Menulis ke file sementara lalu rename (file di cache selalu utuh)."""
+    def on_progress(sheet_no, sheet_name, done, total):
+        job.update(sheet_no=sheet_no, sheet=sheet_name, rows_done=done, rows_total=total)
+
+    tmp_path = _report_cache_path(job['id']) + f".{threading.get_ident()}.tmp"
+    try:
+        t0 = time.perf_counter()
+        create_esb_style_excel(df_trx, df_items, job['branch'], job['start'], job['end'],
+                               output_path=tmp_path, progress=on_progress, version=job['version'])
+        os.replace(tmp_path, job['path'])
+        job.update(status="done", finished=time.time())
+        print(f"INFO: Laporan {job['branch']} {job['start']} s/d {job['end']} selesai ({time.perf_counter() - t0:.1f} detik).")
+        _prune_report_cache()
+    except Exception as e:
+        job.update(status="error", error=str(e), finished=time.time())
+        print(f"WARNING: Gagal membuat laporan {job['id']}: {e}")
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def submit_report_job(df_trx, df_items, branch_name, start_date, end_date):
+    """
+    Minta laporan Excel. Return job_id (= key cache).
+    - File sudah ada di cache disk -> job langsung "done", tidak membangun ulang.
+    - Job dengan key sama sedang berjalan -> dipakai bersama (tidak diduplikasi).
+    - Selain itu -> dikirim ke thread pool.
+    """
+    version = data_version(df_trx, df_items)
+    key = report_cache_key(branch_name, start_date, end_date, version)
+    path = _report_cache_path(key)
+    registry = _report_jobs()
+    with registry['lock']:
+        now = time.time()
+        for jid in [j for j, v in registry['jobs'].items() if v.get('finished') and now - v['finished'] > REPORT_JOB_TTL]:
+            del registry['jobs'][jid]
+
+        job = registry['jobs'].get(key)
+        if job and job['status'] in ("queued", "running"): return key
+        if os.path.exists(path):
+            os.utime(path)  # Tandai baru dipakai (untuk pembersihan cache)
+            registry['jobs'][key] = {"id": key, "branch": branch_name, "start": start_date, "end": end_date,
+                                     "path": path, "status": "done", "cached": True, "finished": now,
+                                     "sheet_no": REPORT_SHEET_COUNT, "sheet": "", "rows_done": 0, "rows_total": 0}
+            return key
+
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        job = {"id": key, "branch": branch_name, "start": start_date, "end": end_date, "path": path, "version": version,
+               "status": "running", "cached": False, "finished": None, "error": None,
+               "sheet_no": 0, "sheet": "", "rows_done": 0, "rows_total": 0}
+        registry['jobs'][key] = job
+    _report_executor().submit(_run_report_job, job, df_trx, df_items)
+    return key
+
+def get_report_job(job_id):
+    """Snapshot status job (dict) atau None jika tidak dikenal / sudah kedaluwarsa."""
+    registry = _report_jobs()
+    with registry['lock']:
+        job = registry['jobs'].get(job_id)
+        return dict(job) if job else None
+
+def report_job_fraction(job):
+    """Perkiraan progres 0..1 dari nomor sheet dan counter baris sheet yang sedang ditulis."""
+    if job['status'] == "done": return 1.0
+    if not job['sheet_no']: return 0.0
+    within = job['rows_done'] / job['rows_total'] if job['rows_total'] else 0.0
+    return min(((job['sheet_no'] - 1) + within) / REPORT_SHEET_COUNT, 0.99)
 
 # ==============================================================================
 # 6. MAIN APP FLOW
 # ==============================================================================
 
-if not st.session_state['logged_in']:
-    initialize_firebase() # Init once to allow Auto-Create Admin
-    login_page()
-else:
-    # Sidebar
-    with st.sidebar:
-        st.title("⚙️ Pengaturan")
-        st.info(f"User: **{st.session_state['user_name']}**\nRole: {st.session_state.get('user_role')}")
-        if st.button("LOGOUT", use_container_width=True): logout()
-        st.divider()
-        debug_mode = st.checkbox("🔧 Mode Debug", value=False)
-    
-    st.title(f"📊 Dashboard Monitoring (Enterprise)")
-    initialize_firebase()
+@st.fragment(run_every=1.0)
+def _report_job_progress(job_id):
+    """Polling progres job laporan (hanya fragment ini yang di-rerun tiap detik, bukan seluruh halaman)."""
+    job = get_report_job(job_id)
+    if job is None or job['status'] != "running":
+        st.rerun()  # Selesai -> render ulang halaman untuk menampilkan tombol simpan
+    label = f"Generating Report... Sheet {job['sheet_no']}/{REPORT_SHEET_COUNT}"
+    if job['sheet']: label += f" - {job['sheet']}"
+    if job['rows_total']: label += f" ({job['rows_done']:,}/{job['rows_total']:,} baris)"
+    st.progress(report_job_fraction(job), text=label)
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_today_panel(branch_name):
+    """KPI & grafik per jam hari ini dari listener on_snapshot (hanya fragment ini yang di-rerun, tanpa fetch ulang)."""
+    try:
+        state = start_live_listener(branch_name)
+    except Exception as e:
+        st.error(f"Mode live gagal dipasang: {e}")
+        return
+    with state['lock']:
+        df_live, updated, error, version = state['orders'], state['updated'], state['error'], state['version']
+    if st.session_state.get('live_merged', (branch_name, state['date'], version)) != (branch_name, state['date'], version):
+        st.rerun()  # Ada transaksi baru sejak KPI halaman dihitung -> rerun penuh supaya KPI & grafik ikut (merge_live_today)
+
+    st.write(f"##### 🔴 Live Hari Ini ({state['date']})")
+    tot = df_live['Grand Total'].sum()
+    trx_count = len(df_live)
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Omset Hari Ini", f"Rp {tot:,.0f}")
+    k2.metric("Transaksi Hari Ini", f"{trx_count} Bon")
+    k3.metric("Rata-rata per Bon", f"Rp {tot / trx_count if trx_count else 0:,.0f}")
+    if not df_live.empty:
+        hourly = df_live.groupby("Jam")["Grand Total"].agg(["sum", "size"]).reset_index()\
+                        .rename(columns={"sum": "Grand Total", "size": "Bon"})
+        st.altair_chart(alt.Chart(hourly).mark_bar().encode(
+            x=alt.X('Jam:O', title='Jam'), y=alt.Y('Grand Total', title='Omset'), tooltip=['Jam', 'Grand Total', 'Bon']
+        ), use_container_width=True)
+    if error: st.warning(f"⚠️ Update live terakhir gagal: {error}")
+    st.caption(f"Update terakhir: {updated:%H:%M:%S}" if updated else "Menunggu data dari POS...")
+
+def trace_panel(trace):
+    """Rincian waktu rerun ini (Mode Debug): waktu per tahap, Firestore, cache hit/miss, ukuran DataFrame."""
+    with st.expander(f"⏱️ Trace rerun ({trace['total_ms']:,.0f} ms)", expanded=True):
+        spans = pd.DataFrame(trace['spans'])
+        if not spans.empty:
+            st.caption("Waktu per tahap (span bersarang ikut terhitung di induknya)")
+            per_stage = spans.groupby("name", sort=False)["ms"].agg(["count", "sum", "max"]).reset_index()\
+                             .rename(columns={"name": "Tahap", "count": "Kali", "sum": "Total ms", "max": "Maks ms"})
+            st.dataframe(per_stage.sort_values("Total ms", ascending=False), hide_index=True, use_container_width=True)
+
+        counters = trace['counters']
+        rows = [(k, v) for k, v in counters.items() if not k.startswith("cache.")]
+        for name in ("tables", "menu"):
+            calls, miss = counters.get(f"cache.{name}.calls", 0), counters.get(f"cache.{name}.miss", 0)
+            if calls: rows.append((f"cache.{name} hit / miss", f"{calls - miss} / {miss}"))
+        if rows:
+            st.caption("Firestore, cache & rollup")
+            st.dataframe(pd.DataFrame(rows, columns=["Counter", "Nilai"]).astype(str), hide_index=True, use_container_width=True)
 
-    # --- LOGIKA HAK AKSES CABANG ---
-    user_access = st.session_state.get('user_branches', [])
-    if "ALL" in user_access:
-        available_branches = ALL_BRANCHES_MASTER
+        if trace['frames']:
+            st.caption("DataFrame")
+            st.dataframe(pd.DataFrame.from_dict(trace['frames'], orient="index").rename(columns={"mb": "MB"}), use_container_width=True)
+
+        st.download_button("📄 Download trace (JSON Lines)", file_name=f"trace_{trace['id']}.jsonl", mime="application/jsonl",
+                           data="\n".join(json.dumps(rec, default=str) for rec in trace_records(trace)))
+
+def report_job_panel():
+    """Status job laporan milik sesi ini: progress bar, tombol simpan, atau pesan error."""
+    job = get_report_job(st.session_state.get('report_job'))
+    if job is None: return
+    if job['status'] == "running":
+        _report_job_progress(job['id'])
+    elif job['status'] == "error":
+        st.error(f"Gagal membuat laporan: {job['error']}")
     else:
-        available_branches = [b for b in ALL_BRANCHES_MASTER if b in user_access]
+        try:
+            with open(job['path'], 'rb') as excel_file:
+                st.download_button(
+                    label="📥 Klik Disini Untuk Simpan File",
+                    data=excel_file,
+                    file_name=st.session_state.get('report_filename', os.path.basename(job['path'])),
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+            if job['cached']: st.caption("⚡ Laporan periode ini sudah pernah dibuat, diambil dari cache.")
+        except FileNotFoundError:
+            st.session_state.pop('report_job', None)
+            st.info("File laporan sudah dibersihkan dari cache, silakan klik Download lagi.")
 
-    if not available_branches:
-        st.error("Akun Anda tidak memiliki akses ke cabang manapun.")
-        st.stop()
+DEFAULT_RANGE_DAYS = 30   # Rentang awal tab KPI & Detail: 30 hari terakhir s/d hari ini
 
-    selected_branch = st.selectbox("Pilih Cabang:", available_branches)
+def selected_date_range(scope):
+    """
+    Rentang tanggal aktif untuk scope (cabang / "Semua Cabang"), dibaca SEBELUM data dimuat supaya hanya hari dalam
+    rentang yang dibaca dari mirror/Firestore. Nilai widget tanggal (key per scope) dipakai jika ada; rentang yang
+    diubah user dipertahankan saat pindah tab, jika belum diubah ikut DEFAULT_RANGE_DAYS terakhir.
+    """
+    default = (date.today() - timedelta(days=DEFAULT_RANGE_DAYS - 1), date.today())
+    keys = (f"range_start_{scope}", f"range_end_{scope}")
+    if all(k in st.session_state for k in keys): return st.session_state[keys[0]], st.session_state[keys[1]]
+    saved = st.session_state.setdefault('date_ranges', {}).get(scope)
+    start, end = saved['range'] if saved and saved['range'] != saved['default'] else default
+    st.session_state[keys[0]], st.session_state[keys[1]] = start, end  # Nilai awal widget (belum dirender di run ini)
+    return start, end
 
-    if selected_branch:
-        with st.spinner("Memuat data dari Cloud Firestore..."):
-            history_data = fetch_data(selected_branch, debug_mode)
-            current_menu_config = fetch_menu_config(selected_branch)
+def date_range_filter(scope):
+    """Input rentang tanggal yang dipakai bersama oleh tab KPI & Detail (nilai awal dari selected_date_range)."""
+    default = (date.today() - timedelta(days=DEFAULT_RANGE_DAYS - 1), date.today())
+    c1, c2 = st.columns(2)
+    d1 = c1.date_input("Dari Tanggal", key=f"range_start_{scope}")
+    d2 = c2.date_input("Sampai Tanggal", key=f"range_end_{scope}")
+    st.session_state.setdefault('date_ranges', {})[scope] = {"range": (d1, d2), "default": default}
+    return d1, d2
 
-        # TAB DEFINITION
-        # Tab Admin & Editor hanya muncul utk Owner/Manager
-        user_role = st.session_state.get('user_role', 'staff')
-        
-        tab_list = ["📈 Ringkasan & KPI", "📄 Data Detail (Export)", "🍔 Lihat Menu (View)"]
-        if user_role in ['administrator', 'manager']:
-            tab_list.append("📝 Editor Menu (Admin)")
-        if user_role == 'administrator':
-            tab_list.append("👥 Manajemen User")
-        
-        tabs = st.tabs(tab_list)
+def detail_table(df_orders, df_items, order_day_index, item_day_index, d1, d2, columns):
+    """
+    Tabel transaksi berhalaman (filter/cari/urut di server); item dimuat saat 1 baris dipilih.
+    order_day_index / item_day_index: dari build_day_index (dibuat sekali oleh pemanggil).
+    """
+    c1, c2, c3, c4 = st.columns([2, 2, 2, 1])
+    kasir = c1.multiselect("Kasir", filter_options(df_orders["Kasir"]))
+    bayar = c2.multiselect("Metode Bayar", filter_options(df_orders["Metode Bayar"]))
+    search = c3.text_input("Cari Kode Unik / Meja")
+    sort_by, ascending = DETAIL_SORT_OPTIONS[c4.selectbox("Urutkan", list(DETAIL_SORT_OPTIONS))]
+
+    with trace_span("detail.query"):
+        rows = query_orders(df_orders, order_day_index, d1, d2, kasir, bayar, search, sort_by, ascending)
+    if rows.empty:
+        st.info("Tidak ada transaksi yang cocok dengan filter.")
+        return
+
+    p1, p2, p3 = st.columns([1, 1, 4])
+    page_size = p1.selectbox("Baris per halaman", DETAIL_PAGE_SIZES)
+    n_pages = -(-len(rows) // page_size)
+    if st.session_state.get('detail_page', 1) > n_pages: st.session_state['detail_page'] = n_pages  # Filter berubah
+    page = p2.number_input("Halaman", min_value=1, max_value=n_pages, key="detail_page")
+    start = (page - 1) * page_size
+    page_rows = rows.iloc[start:start + page_size]
+    p3.caption(f"Menampilkan {start + 1:,}–{start + len(page_rows):,} dari {len(rows):,} transaksi (halaman {page}/{n_pages}). "
+               "Pilih 1 baris untuk melihat item.")
+
+    event = st.dataframe(display_table(page_rows, columns), hide_index=True, use_container_width=True,
+                         on_select="rerun", selection_mode="single-row",
+                         key=f"detail_rows_{hash((d1, d2, tuple(kasir), tuple(bayar), search, sort_by, ascending, page, page_size))}")
+    if event.selection.rows:
+        order = page_rows.iloc[event.selection.rows[0]]
+        items = order_items(df_items, item_day_index, order)
+        st.write(f"##### 🧾 Item {order['Kode Unik']}")
+        st.dataframe(items[DETAIL_ITEM_COLUMNS].rename(columns={"Log Void": "Void"}), hide_index=True, use_container_width=True)
 
-        # PROSES DATA
-        df_display = process_data_for_display(history_data)
-        df_analysis = process_data_for_analysis(history_data, current_menu_config)
+def main():
+    st.set_page_config(layout="wide", page_title="Dashboard X-POS (Enterprise)")
+    init_session()
+
+    if not st.session_state['logged_in']:
+        initialize_firebase() # Init once to allow Auto-Create Admin
+        login_page()
+    else:
+        initialize_firebase()
+        # Hak akses dari policy (bukan dari session): perubahan role/cabang oleh admin berlaku tanpa login ulang
+        policy = get_user_policy(st.session_state['user_name'])
+        if policy is None:
+            st.session_state['logged_in'] = False
+            st.error("Akun Anda sudah dihapus. Silakan hubungi administrator.")
+            st.stop()
+
+        # Sidebar
+        with st.sidebar:
+            st.title("⚙️ Pengaturan")
+            st.info(f"User: **{st.session_state['user_name']}**\nRole: {policy['role']}")
+            if st.button("LOGOUT", use_container_width=True): logout()
+            st.divider()
+            debug_mode = st.checkbox("🔧 Mode Debug", value=False)
+            reset_cache = debug_mode and st.checkbox("♻️ Lewati cache tiap rerun", value=False,
+                                                     help="Hanya untuk sesi ini: sinkron ulang mirror (inkremental) & baca tabel tanpa cache bersama.")
+        trace = start_trace() if debug_mode else stop_trace()
+    
+        st.title(f"📊 Dashboard Monitoring (Enterprise)")
+
+        # --- LOGIKA HAK AKSES CABANG ---
+        available_branches = list(policy['branches'])
+        if not available_branches:
+            st.error("Akun Anda tidak memiliki akses ke cabang manapun.")
+            st.stop()
+
+        branch_options = available_branches + ([ALL_BRANCHES_OPTION] if len(available_branches) > 1 else [])
+        selected_branch = st.selectbox("Pilih Cabang:", branch_options)
+        is_all_branches = selected_branch == ALL_BRANCHES_OPTION
+
+        if debug_mode and policy['role'] == 'administrator':
+            with st.sidebar:
+                if st.button("🔁 Sinkron ulang data cabang", use_container_width=True,
+                             help="Untuk semua user: hapus mirror, cache tabel, listener live & rollup cabang terpilih, "
+                                  "lalu baca ulang semua dokumen dari Firestore (listing penuh)."):
+                    for b in (available_branches if is_all_branches else [selected_branch]):
+                        invalidate_branch_cache(b, kinds=("data",))
+                    st.toast(f"Data {selected_branch} akan dibaca ulang dari Firestore.")
+
+        if selected_branch:
+            # TAB DEFINITION (per role, lihat ROLE_TABS); Editor Menu hanya per cabang
+            tab_list = [t for t in policy['tabs'] if not (t == TAB_MENU_EDITOR and is_all_branches)]
+
+            # Hanya tab aktif yang dirender & memuat datanya (isi st.tabs selalu dijalankan untuk semua tab)
+            if st.session_state.get('active_tab') not in tab_list: st.session_state['active_tab'] = tab_list[0]
+            active_tab = st.segmented_control("Tampilan", tab_list, key="active_tab", label_visibility="collapsed") or tab_list[0]
+            needs = TAB_DATA[active_tab]
+
+            current_menu_config = fetch_menu_config(selected_branch) if needs['menu'] and not is_all_branches else {}  # Menu dilihat/diedit per cabang
+            if needs['consumers']:
+                d1, d2 = selected_date_range(selected_branch)  # Hanya hari dalam rentang yang dibaca
+                with st.spinner("Memuat data dari Cloud Firestore..."), trace_span("page.fetch", branch=selected_branch):
+                    # Hanya kolom yang dipakai tab aktif; kolom Excel dibaca saat export
+                    if is_all_branches:
+                        branch_data = fetch_branches_parallel(available_branches, debug_mode, d1, d2, consumers=needs['consumers'],
+                                                              refresh=reset_cache)
+                        df_display, df_items = combine_branch_tables({b: (o, i) for b, (o, i, _) in branch_data.items()})
+                    else:
+                        df_display, df_items = fetch_data(selected_branch, debug_mode, d1, d2, menu_data=current_menu_config,
+                                                          consumers=needs['consumers'], refresh=reset_cache)
+                trace_frame("df_orders", df_display); trace_frame("df_items", df_items)
+                if debug_mode and (df_display.attrs.get('rejected_rows') or df_items.attrs.get('rejected_items')):
+                    st.warning(f"⚠️ {df_display.attrs.get('rejected_rows', 0)} transaksi & {df_items.attrs.get('rejected_items', 0)} item dilewati karena format data tidak valid.")
         
-        # --- TAB 1: RINGKASAN & ANALISA ---
-        with tabs[0]:
-            st.subheader("📊 Analisa Bisnis")
-            if not df_display.empty:
-                min_date = df_display['Tanggal'].min(); max_date = df_display['Tanggal'].max()
-            else:
-                min_date = date.today(); max_date = date.today()
-                
-            c1, c2 = st.columns(2)
-            d1 = c1.date_input("Dari Tanggal", min_date)
-            d2 = c2.date_input("Sampai Tanggal", max_date)
-            
-            # --- FILTER LOGIC ---
-            df_filtered = pd.DataFrame()
-            df_filtered_analysis = pd.DataFrame()
-            raw_data_filtered = []
-
-            if not df_display.empty:
-                mask_display = (df_display['Tanggal'] >= d1) & (df_display['Tanggal'] <= d2)
-                df_filtered = df_display[mask_display]
-                
-                if not df_analysis.empty:
-                    mask_analysis = (df_analysis['Tanggal'] >= d1) & (df_analysis['Tanggal'] <= d2)
-                    df_filtered_analysis = df_analysis[mask_analysis]
-                
-                # Filter Raw List of Dicts (untuk Excel Export yang akurat)
-                for trx in history_data:
-                    ts = trx.get('timestamp') or trx.get('completed_time')
-                    ot = parse_flexible_date(ts)
-                    if ot:
-                        trx_date = ot.date()
-                        if d1 <= trx_date <= d2:
-                            raw_data_filtered.append(trx)
+            # --- TAB 1: RINGKASAN & ANALISA ---
+            if active_tab == TAB_KPI:
+                st.subheader("📊 Analisa Bisnis")
+                if not is_all_branches and st.toggle("🔴 Mode Live (hari ini)", help="KPI hari ini ter-update otomatis saat ada transaksi baru."):
+                    df_display, df_items = merge_live_today(selected_branch, df_display, df_items, d1, d2, current_menu_config)
+                    live_today_panel(selected_branch)
+                    st.divider()
+
+                d1, d2 = date_range_filter(selected_branch)
+
+                if not df_display.empty:
+                    # Rollup harian (hanya hari yang berubah dihitung ulang)
+                    with trace_span("page.day_index"):
+                        order_day_index = build_day_index(df_display)
+                        item_day_index = build_day_index(df_items)
+                    with trace_span("page.rollups"):
+                        menu_ver = menu_version(*[m for _, _, m in branch_data.values()]) if is_all_branches else menu_version(current_menu_config)
+                        rollup_scope = (ALL_BRANCHES_OPTION, tuple(sorted(available_branches))) if is_all_branches else selected_branch
+                        daily_rollups = update_daily_rollups(rollup_scope, df_display, df_items, order_day_index, item_day_index, menu_ver)
+                        rollup_ver = data_version(daily_rollups)
+
+                    # KPI & grafik dihitung dari rollup harian (bukan transaksi mentah)
+                    period_rollups = rollup_range(daily_rollups, d1, d2)
+                    period = (rollup_ver, (str(d1), str(d2)))  # Key memo agregat grafik (lihat aggregate)
+                    day_rollups = period_rollups[period_rollups["Dimensi"] == "hari"]
                 
-                # KPI Cards
-                tot = df_filtered['Grand Total'].sum()
-                trx_count = len(df_filtered)
-                avg_basket = tot / trx_count if trx_count > 0 else 0
+                    # KPI Cards
+                    tot = day_rollups['Total'].sum()
+                    trx_count = int(day_rollups['Jumlah'].sum())
+                    avg_basket = tot / trx_count if trx_count > 0 else 0
                 
-                k1, k2, k3 = st.columns(3)
-                k1.metric("Total Omset", f"Rp {tot:,.0f}")
-                k2.metric("Total Transaksi", f"{trx_count} Bon")
-                k3.metric("Rata-rata per Bon", f"Rp {avg_basket:,.0f}")
+                    k1, k2, k3 = st.columns(3)
+                    k1.metric("Total Omset", f"Rp {tot:,.0f}")
+                    k2.metric("Total Transaksi", f"{trx_count} Bon")
+                    k3.metric("Rata-rata per Bon", f"Rp {avg_basket:,.0f}")
+
+                    if is_all_branches:
+                        st.write("##### 🏪 Per Cabang")
+                        per_branch = rollup_by(period_rollups, "cabang", "Cabang", *period).set_index("Cabang").reindex(available_branches, fill_value=0)
+                        for col, (branch, row) in zip(st.columns(len(per_branch)), per_branch.iterrows()):
+                            b_avg = row['Total'] / row['Jumlah'] if row['Jumlah'] > 0 else 0
+                            col.metric(branch, f"Rp {row['Total']:,.0f}")
+                            col.caption(f"{int(row['Jumlah'])} Bon · Rata-rata Rp {b_avg:,.0f}")
                 
-                st.divider()
+                    st.divider()
                 
-                # Charts (Restored)
-                col_c1, col_c2 = st.columns([2, 1])
-                with col_c1:
-                    st.write("##### 📈 Tren Penjualan Harian")
-                    daily_chart = df_filtered.groupby('Tanggal')['Grand Total'].sum().reset_index()
-                    st.altair_chart(alt.Chart(daily_chart).mark_line(point=True).encode(
-                        x='Tanggal', y='Grand Total', tooltip=['Tanggal', 'Grand Total']
-                    ).interactive(), use_container_width=True)
+                    # Charts (Restored)
+                    col_c1, col_c2 = st.columns([2, 1])
+                    with col_c1, trace_span("chart.tren_harian"):
+                        st.write("##### 📈 Tren Penjualan Harian")
+                        daily_chart = day_rollups[['Tanggal', 'Total']].rename(columns={'Total': 'Grand Total'})
+                        st.altair_chart(alt.Chart(daily_chart).mark_line(point=True).encode(
+                            x='Tanggal', y='Grand Total', tooltip=['Tanggal', 'Grand Total']
+                        ).interactive(), use_container_width=True)
                 
-                with col_c2:
-                    st.write("##### 🍩 Proporsi Kategori (Rp)")
-                    if not df_filtered_analysis.empty:
-                        cat_chart = df_filtered_analysis.groupby('Kategori')['Total'].sum().reset_index()
-                        base = alt.Chart(cat_chart).encode(theta=alt.Theta("Total", stack=True))
-                        pie = base.mark_arc(outerRadius=120).encode(
-                            color=alt.Color("Kategori"),
-                            order=alt.Order("Total", sort="descending"),
-                            tooltip=["Kategori", "Total"]
-                        )
-                        st.altair_chart(pie, use_container_width=True)
+                    with col_c2, trace_span("chart.kategori"):
+                        st.write("##### 🍩 Proporsi Kategori (Rp)")
+                        cat_chart = rollup_by(period_rollups, "kategori", "Kategori", *period)[['Kategori', 'Total']]
+                        if not cat_chart.empty:
+                            base = alt.Chart(cat_chart).encode(theta=alt.Theta("Total", stack=True))
+                            pie = base.mark_arc(outerRadius=120).encode(
+                                color=alt.Color("Kategori"),
+                                order=alt.Order("Total", sort="descending"),
+                                tooltip=["Kategori", "Total"]
+                            )
+                            st.altair_chart(pie, use_container_width=True)
                 
-                st.write("##### 🏆 Top 5 Menu Terlaris (Qty)")
-                if not df_filtered_analysis.empty:
-                    top_menu = df_filtered_analysis.groupby('Nama Menu')['Qty'].sum().reset_index()\
-                               .sort_values('Qty', ascending=False).head(5)
-                    st.altair_chart(alt.Chart(top_menu).mark_bar().encode(
-                        x=alt.X('Qty', title='Terjual'),
-                        y=alt.Y('Nama Menu', sort='-x'),
-                        tooltip=['Nama Menu', 'Qty'],
-                        color=alt.value("#FF8C00") 
-                    ).interactive(), use_container_width=True)
-            else:
-                st.info("Belum ada data transaksi di sistem.")
+                    st.write("##### 🏆 Top 5 Menu Terlaris (Qty)")
+                    with trace_span("chart.top_menu"):
+                        top_menu = rollup_by(period_rollups, "item", "Nama Menu", *period)[['Nama Menu', 'Qty']]\
+                                   .sort_values('Qty', ascending=False).head(5)
+                        if not top_menu.empty:
+                            st.altair_chart(alt.Chart(top_menu).mark_bar().encode(
+                                x=alt.X('Qty', title='Terjual'),
+                                y=alt.Y('Nama Menu', sort='-x'),
+                                tooltip=['Nama Menu', 'Qty'],
+                                color=alt.value("#FF8C00") 
+                            ).interactive(), use_container_width=True)
+                else:
+                    st.info("Belum ada data transaksi pada rentang tanggal ini.")
 
-        # --- TAB 2: DETAIL & EXPORT (RESTORED FULL EXCEL) ---
-        with tabs[1]:
-            st.subheader("📄 Laporan Detail & Export")
-            if df_display.empty: 
-                st.info("Data kosong.")
-            else:
-                st.write("Data transaksi detail (Preview):")
-                st.dataframe(df_display, use_container_width=True)
+            # --- TAB 2: DETAIL & EXPORT (RESTORED FULL EXCEL) ---
+            elif active_tab == TAB_DETAIL:
+                st.subheader("📄 Laporan Detail & Export")
+                d1, d2 = date_range_filter(selected_branch)
+                if df_display.empty: 
+                    st.info("Data kosong pada rentang tanggal ini.")
+                else:
+                    with trace_span("page.day_index"):
+                        order_day_index = build_day_index(df_display)
+                        item_day_index = build_day_index(df_items)
+                    detail_table(df_display, df_items, order_day_index, item_day_index, d1, d2,
+                                 (["Cabang"] if is_all_branches else []) + DETAIL_COLUMNS)
                 
-                st.divider()
-                st.write("### 📥 Download Laporan Lengkap")
-                st.info("Laporan Excel ini berisi: Sales Summary, Payment, Category, Item, Hourly, Transaction Log, **Promotion Report**, dan **Cancel Menu Detail Report**.")
+                    st.divider()
+                    st.write("### 📥 Download Laporan Lengkap")
+                    st.info("Laporan Excel ini berisi: Sales Summary, Payment, Category, Item, Hourly, Transaction Log, **Promotion Report**, dan **Cancel Menu Detail Report**.")
                 
-                if st.button("Download Excel (All-in-One)"):
-                    if not df_filtered.empty:
-                        export_trx = df_filtered
-                        export_items = df_filtered_analysis
-                        export_raw = raw_data_filtered
+                    if st.button("Download Excel (All-in-One)"):
+                        if is_all_branches:
+                            export_data = fetch_branches_parallel(available_branches, start_date=d1, end_date=d2, consumers=("excel",))
+                            export_trx, export_items = combine_branch_tables({b: (o, i) for b, (o, i, _) in export_data.items()})
+                        else:
+                            export_trx, export_items = fetch_data(selected_branch, start_date=d1, end_date=d2,
+                                                                  menu_data=current_menu_config, consumers=("excel",))
                         f_start = str(d1); f_end = str(d2)
-                    else:
-                        export_trx = df_display
-                        export_items = df_analysis
-                        export_raw = history_data
-                        f_start = "ALL"; f_end = "ALL"
-
-                    filename = f"Laporan_Lengkap_{selected_branch}_{f_start}_sd_{f_end}.xlsx"
-                    
-                    with st.spinner("Generating Report..."):
-                        excel_file = create_esb_style_excel(export_trx, export_items, export_raw, selected_branch, f_start, f_end)
-                        
-                        st.download_button(
-                            label="📥 Klik Disini Untuk Simpan File",
-                            data=excel_file.getvalue(),
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-
-        # --- TAB 3: LIHAT MENU ---
-        with tabs[2]:
-            st.subheader(f"Daftar Menu Aktif - {selected_branch}")
-            view_data = []
-            if current_menu_config:
-                for category, items in current_menu_config.items():
-                    if isinstance(items, dict):
-                        for k, v in items.items():
-                            view_data.append({
-                                "Kategori": category, "Nama Menu": k,
-                                "Harga": float(v.get('price', 0)), "Harga Online": float(v.get('online_price', 0)),
-                                "Printer": v.get('printer', 'KITCHEN')
-                            })
-                    elif isinstance(items, list):
-                        for item in items:
-                            if isinstance(item, dict):
-                                view_data.append({
-                                    "Kategori": category, "Nama Menu": item.get('name', ''),
-                                    "Harga": float(item.get('price', 0)), "Harga Online": float(item.get('online_price', 0)),
-                                    "Printer": item.get('printer', 'KITCHEN')
-                                })
-            
-            if view_data:
-                df_view = pd.DataFrame(view_data).sort_values(by=["Kategori", "Nama Menu"])
-                st.dataframe(df_view, use_container_width=True, hide_index=True, column_config={"Harga": st.column_config.NumberColumn(format="Rp %d"), "Harga Online": st.column_config.NumberColumn(format="Rp %d")})
-            else:
-                st.info("Data menu belum tersedia.")
 
-        # --- TAB 4: EDITOR MENU (Conditional for Owner/Manager) ---
-        if user_role in ['administrator', 'manager'] and "📝 Editor Menu (Admin)" in tab_list:
-            # Cari index dari list
-            idx_edit = tab_list.index("📝 Editor Menu (Admin)")
-            with tabs[idx_edit]:
-                st.subheader(f"🛠️ Editor Menu - {selected_branch}")
-                st.info("Edit menu di bawah ini. 'Online Price' sudah ditambahkan.")
-                
-                edit_data = []
-                known_categories = set()
-                default_categories = ["FOOD", "BEVERAGE", "SNACK", "OTHERS", "PAKET", "APPETIZER (FOOD)", "MAIN COURSE (FOOD)"]
+                        st.session_state['report_job'] = submit_report_job(export_trx, export_items, selected_branch, f_start, f_end)
+                        st.session_state['report_filename'] = f"Laporan_Lengkap_{selected_branch}_{f_start}_sd_{f_end}.xlsx"
 
+                    report_job_panel()
+
+            # --- TAB 3: LIHAT MENU ---
+            elif active_tab == TAB_MENU_VIEW:
+                st.subheader(f"Daftar Menu Aktif - {selected_branch}")
+                view_data = []
                 if current_menu_config:
                     for category, items in current_menu_config.items():
-                        known_categories.add(category)
                         if isinstance(items, dict):
                             for k, v in items.items():
-                                 edit_data.append({"Kategori": category, "Nama Menu": k, "Harga": float(v.get('price', 0)), "Harga Online": float(v.get('online_price', 0)), "Printer": v.get('printer', 'KITCHEN')})
+                                view_data.append({
+                                    "Kategori": category, "Nama Menu": k,
+                                    "Harga": float(v.get('price', 0)), "Harga Online": float(v.get('online_price', 0)),
+                                    "Printer": v.get('printer', 'KITCHEN')
+                                })
                         elif isinstance(items, list):
                             for item in items:
                                 if isinstance(item, dict):
-                                    edit_data.append({"Kategori": category, "Nama Menu": item.get('name', ''), "Harga": float(item.get('price', 0)), "Harga Online": float(item.get('online_price', 0)), "Printer": item.get('printer', 'KITCHEN')})
+                                    view_data.append({
+                                        "Kategori": category, "Nama Menu": item.get('name', ''),
+                                        "Harga": float(item.get('price', 0)), "Harga Online": float(item.get('online_price', 0)),
+                                        "Printer": item.get('printer', 'KITCHEN')
+                                    })
+            
+                if view_data:
+                    df_view = pd.DataFrame(view_data).sort_values(by=["Kategori", "Nama Menu"])
+                    st.dataframe(df_view, use_container_width=True, hide_index=True, column_config={"Harga": st.column_config.NumberColumn(format="Rp %d"), "Harga Online": st.column_config.NumberColumn(format="Rp %d")})
+                else:
+                    st.info("Pilih satu cabang untuk melihat daftar menu." if is_all_branches else "Data menu belum tersedia.")
+
+            # --- TAB 4: EDITOR MENU (Conditional for Owner/Manager) ---
+            elif active_tab == TAB_MENU_EDITOR:  # active_tab selalu anggota tab_list (sudah difilter role)
+                st.subheader(f"🛠️ Editor Menu - {selected_branch}")
+                st.info("Edit menu di bawah ini. 'Online Price' sudah ditambahkan.")
+                
+                known_categories = set(current_menu_config)
+                default_categories = ["FOOD", "BEVERAGE", "SNACK", "OTHERS", "PAKET", "APPETIZER (FOOD)", "MAIN COURSE (FOOD)"]
+                edit_data = [{"Kategori": category, "Nama Menu": name, "Harga": v['price'], "Harga Online": v['online_price'], "Printer": v['printer']}
+                             for category, items in menu_items(current_menu_config).items() for name, v in items.items()]
 
                 all_cat_options = list(known_categories.union(set(default_categories)))
                 all_cat_options.sort()
@@ -943,7 +2748,7 @@ else:
                 if st.button("💾 Simpan Perubahan ke Cloud", type="primary"):
                     new_menu_dict = {}
                     try:
-                        for index, row in edited_df.iterrows():
+                        for row in edited_df.to_dict('records'):
                             cat = row['Kategori'].strip() if row['Kategori'] else "OTHERS"
                             name = str(row['Nama Menu']).strip()
                             price = float(row['Harga'])
@@ -954,7 +2759,7 @@ else:
                             new_menu_dict[cat][name] = {"price": price, "online_price": online_price, "printer": printer}
                         
                         with st.spinner("Menyimpan ke Cloud..."):
-                            success, msg = save_menu_config_to_cloud(selected_branch, new_menu_dict)
+                            success, msg = save_menu_config_to_cloud(selected_branch, new_menu_dict, current_menu_config)
                         if success:
                             st.success(f"✅ {msg}")
                             time.sleep(1.5)
@@ -964,10 +2769,8 @@ else:
                     except Exception as e:
                         st.error(f"Error: {e}")
 
-        # --- TAB 5: USER MANAGEMENT (Owner Only) ---
-        if user_role == 'administrator' and "👥 Manajemen User" in tab_list:
-            idx_user = tab_list.index("👥 Manajemen User")
-            with tabs[idx_user]:
+            # --- TAB 5: USER MANAGEMENT (Owner Only) ---
+            elif active_tab == TAB_USERS:
                 st.subheader("Manajemen Hak Akses User")
                 col_add, col_list = st.columns([1, 2])
                 
@@ -991,7 +2794,7 @@ else:
                 
                 with col_list:
                     st.write("#### Daftar User Aktif")
-                    users = get_all_users()
+                    users = fetch_all_users()
                     if users:
                         clean_users = []
                         for u in users:
@@ -1003,6 +2806,20 @@ else:
                             })
                         st.dataframe(pd.DataFrame(clean_users), use_container_width=True)
                         
+                        st.write("#### Ubah Akses User")
+                        by_name = {u['username']: u for u in users}
+                        edit_u = st.selectbox("Pilih User untuk diubah", list(by_name))
+                        with st.form(f"edit_access_form_{edit_u}"):  # Default form ikut user yang dipilih
+                            roles = ["administrator", "manager", "staff"]
+                            cur = by_name[edit_u]
+                            edit_r = st.selectbox("Role", roles, index=roles.index(cur['role']) if cur.get('role') in roles else 2)
+                            opts = ["ALL"] + ALL_BRANCHES_MASTER
+                            edit_b = st.multiselect("Akses Cabang", opts, default=[b for b in cur.get('access_branches', []) if b in opts])
+                            if st.form_submit_button("Simpan Akses"):
+                                scs, msg = update_user_access(edit_u, edit_r, edit_b)
+                                if scs: st.success(msg); time.sleep(1); st.rerun()
+                                else: st.error(msg)
+
                         st.write("#### Hapus User")
                         del_user = st.selectbox("Pilih User untuk dihapus", [u['username'] for u in users if u['username'] != 'admin'])
                         if st.button(f"Hapus User {del_user}", type="primary"):
@@ -1012,3 +2829,11 @@ else:
                                 st.error("Gagal menghapus.")
                     else:
                         st.info("Belum ada user lain.")
+
+        if trace is not None:
+            end_trace(trace)
+            with st.sidebar: trace_panel(trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Backend data palsu untuk dashboard: Firestore in-memory + generator data cabang sintetis.
+
+Client palsu meniru subset API client Firestore yang dipakai dashboard.py (collection/document,
+get/set/create/update/delete, batch & write_option, where/order_by/limit/select/stream, get_all dengan field_paths, on_snapshot,
+update_time), jadi jalur kode yang diuji & di-benchmark sama persis dengan produksi.
+
+Contoh:
+    DASHBOARD_BACKEND=fake streamlit run dashboard.py
+    DASHBOARD_BACKEND=fake DASHBOARD_FAKE_DAYS=365 DASHBOARD_FAKE_TRX=2000 streamlit run dashboard.py
+
+    from fake_backend import FakeFirestore, generate_branch
+    db = FakeFirestore()
+    generate_branch(db, "Testing", days=30, trx_per_day=200)
+"""
+import os
+import pickle
+import random
+import threading
+from datetime import datetime, date, timedelta, timezone
+
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
+
+
+def _dump(data):
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _get_path(data, field_path, doc_id=None):
+    """Nilai field bertitik ("master_data.menu") atau KeyError. FieldPath.document_id() -> ID dokumen."""
+    if field_path == FieldPath.document_id(): return doc_id
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data: raise KeyError(field_path)
+        data = data[part]
+    return data
+
+
+def _mask(data, field_paths):
+    """Salin hanya field_paths (boleh bertitik) dari dict dokumen."""
+    out = {}
+    for field_path in field_paths:
+        try: value = _get_path(data, field_path)
+        except KeyError: continue
+        *parents, leaf = field_path.split('.')
+        node = out
+        for part in parents: node = node.setdefault(part, {})
+        node[leaf] = value
+    return out
+
+
+def _apply_sentinels(data, now):
+    """Salinan dict dengan SERVER_TIMESTAMP -> waktu tulis (rekursif di dalam dict)."""
+    return {k: now if v is firestore.SERVER_TIMESTAMP else _apply_sentinels(v, now) if isinstance(v, dict) else v
+            for k, v in data.items()}
+
+
+def _set_field(node, key, value):
+    """Tulis 1 field: DELETE_FIELD menghapus, Increment menambah nilai lama (field belum ada = 0)."""
+    if value is firestore.DELETE_FIELD: node.pop(key, None)
+    elif isinstance(value, firestore.Increment): node[key] = node.get(key, 0) + value.value
+    else: node[key] = value
+
+
+def _deep_merge(current, data):
+    """Semantik set(merge=True): map digabung rekursif, DELETE_FIELD menghapus field, Increment menambah."""
+    for k, v in data.items():
+        if isinstance(v, dict) and isinstance(current.get(k), dict): _deep_merge(current[k], v)
+        else: _set_field(current, k, v)
+    return current
+
+
+_COMPARE = {
+    '==': lambda a, b: a == b, '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b, '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b, 'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, blob=None, update_time=None, create_time=None, field_paths=None):
+        self.reference, self.id = reference, reference.id
+        self.exists = blob is not None
+        self.update_time, self.create_time = update_time, create_time
+        self._blob, self._field_paths = blob, field_paths
+
+    def to_dict(self):
+        if self._blob is None: return None
+        data = pickle.loads(self._blob)  # Setara biaya deserialisasi dokumen dari server
+        return _mask(data, self._field_paths) if self._field_paths is not None else data
+
+    def get(self, field_path):
+        return _get_path(self.to_dict(), field_path)
+
+
+class _Watch:
+    def __init__(self, client, path, callback):
+        self._client, self._path, self._callback = client, path, callback
+
+    def unsubscribe(self):
+        with self._client._lock:
+            watchers = self._client._watchers.get(self._path, [])
+            if self in watchers: watchers.remove(self)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client, self.path = client, path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None):
+        return self._client._snapshot(self, field_paths)
+
+    def set(self, data, merge=False):
+        self._client._write(self, data, mode="merge" if merge else "set")
+
+    def create(self, data):
+        """Seperti set, tapi gagal (AlreadyExists) jika dokumen sudah ada."""
+        with self._client._lock:
+            self._client._check(self, "create")
+            self._client._write(self, data, mode="set")
+
+    def update(self, field_updates, option=None):
+        """
+        Key boleh bertitik ("items.BEVERAGE"), bertanda petik (FieldPath.to_api_repr) atau FieldPath;
+        nilai DELETE_FIELD menghapus field, Increment menambah.
+        option: write_option(last_update_time=...) -> FailedPrecondition jika dokumen sudah ditulis sejak itu.
+        """
+        with self._client._lock:
+            self._client._check(self, "update", option)
+            self._client._write(self, field_updates, mode="update")
+
+    def delete(self):
+        self._client._delete(self)
+
+    def on_snapshot(self, callback):
+        """callback([snapshot], changes, read_time) dipanggil langsung sekali, lalu setiap kali dokumen ditulis."""
+        return self._client._watch(self, callback)
+
+
+class _LastUpdateOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteBatch:
+    """
+    Tulis beberapa dokumen sekaligus: semua syarat (create / update / write_option) dicek dulu,
+    lalu semua operasi diterapkan saat commit(), di bawah 1 lock (atomik: semua atau tidak sama sekali).
+    """
+
+    def __init__(self, client):
+        self._client, self._ops = client, []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append((reference, "merge" if merge else "set", data, None))
+
+    def create(self, reference, data):
+        self._ops.append((reference, "create", data, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._ops.append((reference, "update", field_updates, option))
+
+    def delete(self, reference):
+        self._ops.append((reference, "delete", None, None))
+
+    def commit(self):
+        with self._client._lock:
+            for ref, mode, _, option in self._ops: self._client._check(ref, mode, option)
+            for ref, mode, data, _ in self._ops:
+                if mode == "delete": self._client._delete(ref)
+                else: self._client._write(ref, data, mode="set" if mode == "create" else mode)
+        self._ops = []
+
+
+class Query:
+    DESCENDING = firestore.Query.DESCENDING
+    ASCENDING = firestore.Query.ASCENDING
+
+    def __init__(self, client, path, filters=(), orders=(), limit_to=None, field_paths=None):
+        self._client, self._path = client, path
+        self._filters, self._orders, self._limit, self._field_paths = filters, orders, limit_to, field_paths
+
+    def _copy(self, **changes):
+        params = dict(filters=self._filters, orders=self._orders, limit_to=self._limit, field_paths=self._field_paths)
+        params.update(changes)
+        return Query(self._client, self._path, **params)
+
+    def where(self, field_path, op_string, value):
+        if isinstance(value, DocumentReference): value = value.id  # Filter FieldPath.document_id()
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_to=count)
+
+    def select(self, field_paths):
+        return self._copy(field_paths=list(field_paths))
+
+    def stream(self):
+        return iter(self._client._query(self))
+
+    def get(self):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id):
+        return DocumentReference(self._client, f"{self._path}/{document_id}")
+
+
+class FakeFirestore:
+    """
+    Client Firestore palsu (thread-safe, satu proses). Dokumen disimpan ter-serialisasi (pickle) supaya
+    setiap baca membayar biaya deserialisasi seperti client sungguhan. `reads` menghitung dokumen yang dibaca.
+    Callback on_snapshot dipanggil sinkron di thread penulis (client sungguhan: thread listener).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections = {}   # path koleksi -> {doc_id: (blob, create_time, update_time)}
+        self._watchers = {}      # path dokumen -> [_Watch]
+        self._clock = datetime.now(timezone.utc)
+        self.reads = 0
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def document(self, path):
+        return DocumentReference(self, path)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    @staticmethod
+    def write_option(last_update_time):
+        return _LastUpdateOption(last_update_time)
+
+    def get_all(self, references, field_paths=None):
+        for ref in references:
+            yield self._snapshot(ref, field_paths)
+
+    # --- internal ---
+    def _now(self):
+        self._clock = max(datetime.now(timezone.utc), self._clock + timedelta(microseconds=1))
+        return self._clock
+
+    def _split(self, path):
+        coll, doc_id = path.rsplit('/', 1)
+        return self._collections.setdefault(coll, {}), doc_id
+
+    def _exists(self, path):
+        with self._lock:
+            docs, doc_id = self._split(path)
+            return doc_id in docs
+
+    def _check(self, ref, mode, option=None):
+        """Syarat tulis seperti Firestore: create -> AlreadyExists, update -> NotFound, write_option -> FailedPrecondition."""
+        with self._lock:
+            docs, doc_id = self._split(ref.path)
+            entry = docs.get(doc_id)
+        if mode == "create" and entry is not None: raise google_exceptions.AlreadyExists(f"Dokumen sudah ada: {ref.path}")
+        if mode == "update" and entry is None: raise google_exceptions.NotFound(f"Dokumen tidak ada: {ref.path}")
+        if option is not None and (entry is None or entry[2] != option.last_update_time):
+            raise google_exceptions.FailedPrecondition(f"Dokumen sudah berubah: {ref.path}")
+
+    def _snapshot(self, ref, field_paths=None):
+        with self._lock:
+            docs, doc_id = self._split(ref.path)
+            entry = docs.get(doc_id)
+            self.reads += 1
+        if entry is None: return DocumentSnapshot(ref)
+        blob, created, updated = entry
+        return DocumentSnapshot(ref, blob, updated, created, field_paths)
+
+    def _write(self, ref, data, mode="set"):
+        with self._lock:
+            docs, doc_id = self._split(ref.path)
+            now = self._now()
+            entry = docs.get(doc_id)
+            current = pickle.loads(entry[0]) if entry is not None and mode != "set" else {}
+            if mode == "update":
+                for field_path, value in data.items():
+                    parts = field_path.parts if hasattr(field_path, 'parts') else FieldPath.from_string(field_path).parts
+                    node = current
+                    for part in parts[:-1]: node = node.setdefault(part, {})
+                    _set_field(node, parts[-1], value)
+            else:
+                _deep_merge(current, data)
+            docs[doc_id] = (_dump(_apply_sentinels(current, now)), entry[1] if entry else now, now)
+        self._notify(ref)
+
+    def _delete(self, ref):
+        with self._lock:
+            docs, doc_id = self._split(ref.path)
+            docs.pop(doc_id, None)
+        self._notify(ref)
+
+    def _query(self, query):
+        with self._lock:
+            entries = sorted(self._collections.get(query._path, {}).items())
+        rows = []
+        for doc_id, (blob, created, updated) in entries:
+            if query._filters or query._orders:
+                data = pickle.loads(blob)
+                try:
+                    if not all(_COMPARE[op](_get_path(data, f, doc_id), v) for f, op, v in query._filters): continue
+                    keys = [_get_path(data, f, doc_id) for f, _ in query._orders]  # Dokumen tanpa field urutan tidak ikut
+                except KeyError: continue
+            else: keys = []
+            rows.append((keys, doc_id, blob, created, updated))
+        for i in reversed(range(len(query._orders))):
+            rows.sort(key=lambda r: r[0][i], reverse=query._orders[i][1] == Query.DESCENDING)
+        if query._limit is not None: rows = rows[:query._limit]
+        with self._lock: self.reads += max(1, len(rows))  # Query kosong tetap dihitung 1 baca
+        ref = CollectionReference(self, query._path)
+        return [DocumentSnapshot(ref.document(doc_id), blob, updated, created, query._field_paths)
+                for _, doc_id, blob, created, updated in rows]
+
+    def _watch(self, ref, callback):
+        watch = _Watch(self, ref.path, callback)
+        with self._lock: self._watchers.setdefault(ref.path, []).append(watch)
+        callback([self._snapshot(ref)], [], self._now())
+        return watch
+
+    def _notify(self, ref):
+        with self._lock: watchers = list(self._watchers.get(ref.path, []))
+        if not watchers: return
+        snap, read_time = self._snapshot(ref), self._now()
+        for watch in watchers: watch._callback([snap], [], read_time)
+
+
+# ==============================================================================
+# GENERATOR DATA SINTETIS
+# ==============================================================================
+
+MENU_CATALOG = {
+    "APPETIZER (FOOD)": [("CALAMARI", 48000), ("FRENCH FRIES", 32000), ("CHICKEN WINGS", 45000), ("SPRING ROLL", 35000)],
+    "MAIN COURSE (FOOD)": [("NASI GORENG HOKEE", 58000), ("MIE GORENG SEAFOOD", 62000), ("CHAR SIEW RICE", 65000),
+                           ("BEEF HOR FUN", 68000), ("HAINANESE CHICKEN", 60000), ("LAKSA", 55000)],
+    "BEVERAGE": [("ICED MILK TEA", 28000), ("HOT COFFEE", 25000), ("LEMON TEA", 24000), ("CHOCOLATE", 35000),
+                 ("MINERAL WATER", 12000)],
+    "PASTRY": [("EGG TART", 18000), ("PINEAPPLE BUN", 22000), ("CROISSANT", 26000)],
+}
+PRINTER_BY_CATEGORY = {"APPETIZER (FOOD)": "KITCHEN", "MAIN COURSE (FOOD)": "KITCHEN", "BEVERAGE": "BAR", "PASTRY": "PASTRY"}
+ITEM_CATEGORY = {"APPETIZER (FOOD)": "Food", "MAIN COURSE (FOOD)": "Food", "BEVERAGE": "Beverage", "PASTRY": "Pastry"}
+CASHIERS = ["Ani", "Budi", "Citra", "Dewi"]
+PAYMENTS = ["Cash", "QRIS", "Debit BCA", "Credit Card", "GoPay"]
+ORDER_TYPES = ["Dine In", "Dine In", "Dine In", "Take Away", "GoFood"]
+HOUR_WEIGHTS = {10: 2, 11: 5, 12: 9, 13: 8, 14: 4, 15: 3, 16: 3, 17: 5, 18: 8, 19: 9, 20: 7, 21: 3}
+SERVICE_RATE, TAX_RATE = 0.05, 0.10
+
+
+def generate_menu():
+    """Konfigurasi menu (format configuration/menu: {kategori: {nama: {price, online_price, printer}}})."""
+    return {cat: {name: {"price": float(price), "online_price": float(round(price * 1.2, -2)),
+                         "printer": PRINTER_BY_CATEGORY[cat]} for name, price in items}
+            for cat, items in MENU_CATALOG.items()}
+
+
+MENU_CODES = {name: f"M{k:03d}" for k, name in enumerate(n for items in MENU_CATALOG.values() for n, _ in items)}
+
+
+def _item(rnd, cat, name, price, day):
+    itm = {"name": name, "price": price, "code": MENU_CODES[name], "category": ITEM_CATEGORY[cat]}
+    itm["quantity" if rnd.random() < 0.8 else "qty"] = rnd.choices([1, 2, 3], weights=[8, 3, 1])[0]
+    if rnd.random() < 0.03:
+        itm.update(status="void", void_by=rnd.choice(CASHIERS), void_reason=rnd.choice(["Salah input", "Customer batal"]),
+                   void_time=f"{day} {rnd.randint(10, 21):02d}:{rnd.randint(0, 59):02d}:00")
+    return itm
+
+
+def make_transaction(rnd, day, seq, prefix="HK", catalog=None):
+    """
+    Satu transaksi POS realistis untuk tanggal `day` (YYYY-MM-DD): campuran bentuk `items` list/dict,
+    item & order void, log `void_items`, diskon persen/nominal, member, pembayaran split, format timestamp campuran.
+    """
+    catalog = catalog or [(cat, name, price) for cat, items in MENU_CATALOG.items() for name, price in items]
+    hour = rnd.choices(list(HOUR_WEIGHTS), weights=list(HOUR_WEIGHTS.values()))[0]
+    ts = f"{day} {hour:02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}"
+    r = rnd.random()
+    if r < 0.05: ts = ts.replace(' ', 'T') + ".000Z"
+    elif r < 0.08: ts = datetime.fromisoformat(ts).replace(tzinfo=timezone.utc)  # Timestamp Firestore
+
+    items = [_item(rnd, *rnd.choice(catalog), day) for _ in range(rnd.choices([1, 2, 3, 4, 5, 6], weights=[3, 5, 4, 3, 2, 1])[0])]
+    subtotal = float(sum(i["price"] * i.get("quantity", i.get("qty", 1)) for i in items if i.get("status") != "void"))
+    order = {"order_id": f"{prefix}{day.replace('-', '')[2:]}{seq:04d}", "timestamp": ts,
+             "order_type": rnd.choice(ORDER_TYPES), "table_number": rnd.randint(1, 20) if rnd.random() < 0.8 else f"X{rnd.randint(1, 7)}",
+             "cashier": rnd.choice(CASHIERS), "subtotal": subtotal,
+             "items": {str(k): v for k, v in enumerate(items)} if rnd.random() < 0.25 else items}
+
+    discount = 0.0
+    r = rnd.random()
+    if r < 0.08: discount, order["discount_name"] = round(subtotal * 0.10, -2), "Promo 10%"
+    elif r < 0.12: discount, order["discount_name"] = min(subtotal, 10000.0), "Potongan Member"
+    service = round((subtotal - discount) * SERVICE_RATE)
+    tax = round((subtotal - discount + service) * TAX_RATE)
+    order.update(discount_amount=discount, service_charge=service, tax_pb1=tax, total_final=subtotal - discount + service + tax)
+
+    order["payment_method"] = rnd.sample(PAYMENTS, 2) if rnd.random() < 0.05 else rnd.choice(PAYMENTS)
+    if rnd.random() < 0.10: order["member"] = {"code": f"M{rnd.randint(1, 500):04d}", "name": f"Member {rnd.randint(1, 500)}"}
+    if rnd.random() < 0.04:
+        order["void_items"] = [_item(rnd, *rnd.choice(catalog), day) | {"void_by": rnd.choice(CASHIERS), "void_reason": "Koreksi"}]
+    if rnd.random() < 0.02:
+        order.update(status="void", void_by=rnd.choice(CASHIERS), void_reason="Customer batal")
+    else:
+        order["status"] = "completed"
+    return order
+
+
+def make_daily_report(rnd, day, trx_per_day, prefix="HK", zreport=False, menu=None):
+    """Dokumen daily_reports 1 hari. zreport=True: hari tutup buku lama tanpa `transactions`, hanya `summary`."""
+    catalog = [(cat, name, price) for cat, items in MENU_CATALOG.items() for name, price in items]
+    n = max(0, int(rnd.gauss(trx_per_day, trx_per_day * 0.15)))
+    transactions = [make_transaction(rnd, day, seq, prefix, catalog) for seq in range(1, n + 1)]
+    total_sales = sum(t["total_final"] for t in transactions if t["status"] != "void")
+    doc = {"date": day, "summary": {"total_sales": total_sales, "total_transactions": n}}
+    if not zreport: doc["transactions"] = transactions
+    if menu is not None:  # Salinan menu versi lama (bentuk list) yang ikut tersimpan di dokumen harian
+        doc["master_data"] = {"menu": {cat: [dict(v, name=k) for k, v in items.items()] for cat, items in menu.items()}}
+    return doc
+
+
+def generate_branch(db, branch_name, days=30, trx_per_day=150, end_date=None, seed=0, zreport_ratio=0.05, prefix="HK"):
+    """
+    Isi satu cabang di `db`: configuration/menu + daily_reports untuk `days` hari s/d end_date (default hari ini).
+    Sebagian hari (zreport_ratio) hanya berisi summary Z-REPORT. Return jumlah transaksi yang dibuat.
+    """
+    rnd = random.Random(f"{branch_name}:{seed}")
+    end_date = end_date or date.today()
+    menu = generate_menu()
+    branch = db.collection('branches').document(branch_name)
+    branch.collection('configuration').document('menu').set({"items": menu, "updated_by": "generator"})
+    reports = branch.collection('daily_reports')
+    total = 0
+    for offset in range(days - 1, -1, -1):
+        day = (end_date - timedelta(days=offset)).isoformat()
+        is_zreport = offset > 0 and rnd.random() < zreport_ratio  # Hari ini selalu punya transaksi
+        doc = make_daily_report(rnd, day, trx_per_day, prefix, zreport=is_zreport, menu=menu)
+        reports.document(day).set(doc)
+        total += doc["summary"]["total_transactions"]
+    return total
+
+
+def make_fake_client(branch_names, days=30, trx_per_day=150, seed=0, end_date=None):
+    """FakeFirestore berisi beberapa cabang sintetis."""
+    db = FakeFirestore()
+    for k, branch_name in enumerate(branch_names):
+        generate_branch(db, branch_name, days, trx_per_day, end_date=end_date, seed=seed, prefix=f"B{k}")
+    return db
+
+
+def client_from_env(branch_names):
+    """
+    FakeFirestore untuk DASHBOARD_BACKEND=fake. Ukuran data dari environment:
+    DASHBOARD_FAKE_DAYS (default 30), DASHBOARD_FAKE_TRX (transaksi/hari, default 150), DASHBOARD_FAKE_SEED (default 0).
+    """
+    days = int(os.environ.get("DASHBOARD_FAKE_DAYS", 30))
+    trx_per_day = int(os.environ.get("DASHBOARD_FAKE_TRX", 150))
+    seed = int(os.environ.get("DASHBOARD_FAKE_SEED", 0))
+    print(f"INFO: Backend palsu: {len(branch_names)} cabang x {days} hari x ~{trx_per_day} transaksi/hari (seed {seed}).")
+    return make_fake_client(branch_names, days, trx_per_day, seed)
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dashboard  # noqa: E402
+import fake_backend  # noqa: E402
+import streamlit as st  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Mirror di folder sementara + registry cache_resource (listener live, generasi cache) kosong tiap test."""
+    monkeypatch.setattr(dashboard, "MIRROR_DIR", str(tmp_path / "mirror"))
+    st.cache_resource.clear()
+    yield
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """FakeFirestore berisi 1 cabang sintetis; juga dipakai fungsi yang memanggil get_firestore_client()."""
+    db = fake_backend.make_fake_client(["Testing"], days=10, trx_per_day=15, seed=3)
+    monkeypatch.setattr(dashboard, "get_firestore_client", lambda: db)
+    return db
@@ -0,0 +1,43 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import xlsxwriter
+
+import dashboard
+
+
+def sheet_xml(path, monkeypatch, stream):
+    """Tulis 1 tabel campuran lewat write_table; stream=False memaksa jalur write_* per sel xlsxwriter."""
+    if not stream: monkeypatch.setattr(dashboard, "_stream_rows", lambda *args: False)
+    with xlsxwriter.Workbook(str(path), {'constant_memory': True}) as workbook:
+        bold, num = workbook.add_format({'bold': True}), workbook.add_format({'num_format': '#,##0'})
+        date_fmt = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        ws = workbook.add_worksheet()
+        ws.write_row(0, 0, ["A", "B", "C", "D", "E"], bold)
+        r = dashboard.write_table(ws, 1, [
+            (0, pd.Series(["x", " spasi ", "a & <b>", None, "_x0041_ \x01"]), bold),
+            (1, pd.Series([1, 2.5, np.nan, 4, 1e20]), [num, None, num, bold, num]),
+            (2, pd.Series(pd.to_datetime(["2024-01-02", None, "2024-03-04 05:06:07", "2024-01-02", "2025-12-31"], format="ISO8601")), date_fmt),
+            (3, pd.Series([3, "meja 4", "", None, 5.5], dtype=object), [None, bold, bold, bold, None]),
+            (4, "-", num),
+        ])
+        ws.write(r, 0, "TOTAL", bold)
+    with zipfile.ZipFile(path) as z:
+        return z.read("xl/worksheets/sheet1.xml"), z.read("xl/styles.xml")
+
+
+def test_streamed_rows_match_xlsxwriter(tmp_path, monkeypatch):
+    streamed = sheet_xml(tmp_path / "stream.xlsx", monkeypatch, stream=True)
+    per_cell = sheet_xml(tmp_path / "cell.xlsx", monkeypatch, stream=False)
+    assert streamed == per_cell
+
+
+@pytest.mark.parametrize("value", ["=SUM(A1)", "http://example.com", True])
+def test_special_values_use_xlsxwriter_path(tmp_path, value):
+    with xlsxwriter.Workbook(str(tmp_path / "x.xlsx"), {'constant_memory': True}) as workbook:
+        ws = workbook.add_worksheet()
+        plan = [(0, 'generic', [1, value], [None, None])]
+        assert dashboard._stream_rows(ws, 0, 2, plan, None) is False
+        assert ws.previous_row == 0 and not ws.table
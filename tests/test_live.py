@@ -0,0 +1,117 @@
+import random
+from datetime import date
+
+import pytest
+
+import dashboard
+import fake_backend
+
+BRANCH = "Live"
+
+
+def make_transactions(n, seed=0, start=1):
+    rnd, today = random.Random(seed), date.today().isoformat()
+    return [fake_backend.make_transaction(rnd, today, seq, prefix="LV") for seq in range(start, start + n)]
+
+
+def expected_orders(transactions):
+    df_orders, _ = dashboard.normalize_transactions(dashboard._doc_to_transactions(date.today().isoformat(),
+                                                                                   {"transactions": transactions}))
+    return sorted(zip(df_orders['Kode Unik'], df_orders['Grand Total'], df_orders['Metode Bayar'].astype(str)))
+
+
+def live_orders(state):
+    df = state['orders']
+    return sorted(zip(df['Kode Unik'], df['Grand Total'], df['Metode Bayar'].astype(str)))
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """(db, today_ref, state, calls): listener cabang BRANCH di FakeFirestore; calls = jumlah trx tiap normalisasi."""
+    db = fake_backend.FakeFirestore()
+    today_ref = db.collection('branches').document(BRANCH).collection('daily_reports').document(date.today().isoformat())
+    calls, live_tables = [], dashboard._live_tables
+    monkeypatch.setattr(dashboard, "_live_tables", lambda trx: calls.append(len(trx)) or live_tables(trx))
+    state = dashboard.start_live_listener(BRANCH, db=db)
+    yield db, today_ref, state, calls
+    dashboard.stop_live_listener(BRANCH)
+
+
+def test_new_transactions_are_appended(live):
+    db, today_ref, state, calls = live
+    base = make_transactions(5)
+    today_ref.set({"date": date.today().isoformat(), "transactions": base})
+    assert live_orders(state) == expected_orders(base)
+
+    calls.clear()
+    grown = base + make_transactions(3, seed=1, start=6)
+    today_ref.set({"date": date.today().isoformat(), "transactions": grown})
+    assert calls == [3]  # Hanya transaksi baru yang dinormalisasi
+    assert live_orders(state) == expected_orders(grown)
+    assert state['seen'] == 8
+
+
+def test_changed_transaction_rebuilds(live):
+    db, today_ref, state, calls = live
+    trx = make_transactions(6)
+    today_ref.set({"date": date.today().isoformat(), "transactions": trx})
+    version = state['version']
+
+    calls.clear()
+    trx[2] = {**trx[2], "payment_method": "QRIS", "total_final": trx[2]["total_final"] + 1000}
+    today_ref.set({"date": date.today().isoformat(), "transactions": trx})
+    assert calls == [6]  # Transaksi lama berubah -> dibangun ulang dari seluruh dokumen
+    assert state['version'] == version + 1
+    assert live_orders(state) == expected_orders(trx)
+
+
+def test_shrunk_or_replaced_document_rebuilds(live):
+    db, today_ref, state, calls = live
+    trx = make_transactions(6)
+    today_ref.set({"date": date.today().isoformat(), "transactions": trx})
+
+    today_ref.set({"date": date.today().isoformat(), "transactions": trx[:4]})
+    assert live_orders(state) == expected_orders(trx[:4])
+    assert state['seen'] == 4
+
+    replaced = make_transactions(2, seed=9, start=50)
+    today_ref.set({"date": date.today().isoformat(), "transactions": replaced})
+    assert live_orders(state) == expected_orders(replaced)
+
+    today_ref.delete()
+    assert state['orders'].empty and state['seen'] == 0
+
+
+def test_stop_unsubscribes(live):
+    db, today_ref, state, calls = live
+    today_ref.set({"date": date.today().isoformat(), "transactions": make_transactions(3)})
+    version, orders = state['version'], state['orders']
+
+    dashboard.stop_live_listener(BRANCH)
+    today_ref.set({"date": date.today().isoformat(), "transactions": make_transactions(7, seed=2)})
+    assert state['version'] == version and state['orders'] is orders
+    assert BRANCH not in dashboard._live_listeners()['branches']
+
+
+def test_merge_replaces_today_rows(live):
+    db, today_ref, state, calls = live
+    yesterday = date.fromordinal(date.today().toordinal() - 1)
+    rnd = random.Random(4)
+    old_trx = [fake_backend.make_transaction(rnd, yesterday.isoformat(), seq, prefix="LV") for seq in range(1, 4)]
+    stale = make_transactions(2)  # Hari ini versi cache (sebelum transaksi baru masuk)
+    fetched = dashboard.normalize_transactions(dashboard._doc_to_transactions(yesterday.isoformat(), {"transactions": old_trx})
+                                               + dashboard._doc_to_transactions(date.today().isoformat(), {"transactions": stale}))
+
+    fresh = stale + make_transactions(4, seed=1, start=3)
+    today_ref.set({"date": date.today().isoformat(), "transactions": fresh})
+    df_orders, df_items = dashboard.merge_live_today(BRANCH, *fetched, yesterday, date.today())
+
+    today = df_orders['Tanggal'].dt.date == date.today()
+    assert sorted(zip(df_orders.loc[today, 'Kode Unik'], df_orders.loc[today, 'Grand Total'],
+                      df_orders.loc[today, 'Metode Bayar'].astype(str))) == expected_orders(fresh)
+    assert (~today).sum() == len(old_trx)
+    assert len(df_items) == len(fetched[1][fetched[1]['Tanggal'].dt.date < date.today()]) + len(state['items'])
+    assert list(df_orders.columns) == list(fetched[0].columns)
+
+    # Rentang tanpa hari ini -> tabel tidak diubah
+    assert dashboard.merge_live_today(BRANCH, *fetched, yesterday, yesterday)[0] is fetched[0]
@@ -0,0 +1,65 @@
+import copy
+
+import dashboard
+
+BRANCH = "Testing"
+
+
+def menu_ref(db):
+    return db.collection('branches').document(BRANCH).collection('configuration').document('menu')
+
+
+def edited(items):
+    """Salinan menu dengan item diubah, ditambah (nama bertitik/spasi), dihapus, dan 1 kategori dihapus seluruhnya."""
+    new = copy.deepcopy(items)
+    category = sorted(new)[0]
+    first, second = sorted(new[category])[:2]
+    new[category][first]["price"] += 1000
+    new[category][first]["printer"] = "BAR"
+    del new[category][second]
+    new[category]["Es Teh 1.5 L"] = {"price": 8000.0, "online_price": 10000.0, "printer": "BAR"}
+    del new[sorted(new)[-1]]
+    return new, category, first, second
+
+
+def test_diff_menu_entries(fake_db):
+    current = dashboard.menu_items(dashboard.load_menu_config(BRANCH, db=fake_db))
+    new, category, first, second = edited(current)
+    diff = dashboard.diff_menu(current, new)
+
+    assert {"category": category, "name": "Es Teh 1.5 L", "item": new[category]["Es Teh 1.5 L"]} in diff["added"]
+    assert {"category": category, "name": second} in diff["removed"]
+    assert [(e["name"], e["fields"]) for e in diff["changed"]] == [(first, ["price", "printer"])]
+    dropped = sorted(current)[-1]
+    assert {e["name"] for e in diff["removed"] if e["category"] == dropped} == set(current[dropped])
+    assert dashboard.diff_menu(current, copy.deepcopy(current)) == {"added": [], "removed": [], "changed": []}
+
+
+def test_field_updates_round_trip(fake_db):
+    current = dashboard.load_menu_config(BRANCH, db=fake_db)
+    new, category, first, second = edited(dashboard.menu_items(current))
+    diff = dashboard.diff_menu(dashboard.menu_items(current), new)
+    updates = dashboard.menu_field_updates(current, new, diff)
+
+    # Hanya field yang berubah yang ditulis, bukan seluruh menu
+    assert len(updates) == 1 + 1 + 2 + 1  # tambah, hapus, 2 field diubah, kategori dihapus
+    menu_ref(fake_db).update(updates)
+    assert dashboard.menu_items(dashboard.load_menu_config(BRANCH, db=fake_db)) == new
+
+
+def test_save_menu_writes_changelog_and_rejects_stale_base(fake_db):
+    current = dashboard.load_menu_config(BRANCH, db=fake_db)
+    new, category, first, second = edited(dashboard.menu_items(current))
+
+    ok, msg = dashboard.save_menu_config_to_cloud(BRANCH, new, current)
+    assert ok, msg
+    assert dashboard.menu_items(dashboard.load_menu_config(BRANCH, db=fake_db)) == new
+    log = menu_ref(fake_db).collection('changelog').document(f"{1:08d}").get()
+    assert log.exists and log.to_dict()["version"] == 1
+
+    # Editor lain masih membuka menu lama: simpan ditolak, menu tidak tertimpa
+    stale = dashboard.menu_items(current)
+    stale[category][second]["price"] += 500
+    ok, msg = dashboard.save_menu_config_to_cloud(BRANCH, stale, current)
+    assert not ok and msg == dashboard.MENU_CONFLICT_MSG
+    assert dashboard.menu_items(dashboard.load_menu_config(BRANCH, db=fake_db)) == new
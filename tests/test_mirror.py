@@ -0,0 +1,76 @@
+from datetime import date
+
+import pandas as pd
+
+import dashboard
+
+BRANCH = "Testing"
+DAYS = 10
+
+
+def as_plain(df):
+    """Tabel tanpa kolom yang bergantung pada urutan baca/asal dokumen; dtype & nilai kosong disamakan, urut per bon."""
+    df = df.drop(columns=[c for c in ("Dokumen", "Order Key") if c in df]).astype(object)
+    return df.where(df.notna(), None).sort_values(list(df.columns[:2]), kind="stable").reset_index(drop=True)
+
+
+def test_sync_cold_then_warm_reads(fake_db):
+    reads = fake_db.reads
+    manifest, open_days = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    cold = fake_db.reads - reads
+    assert cold == 2 * DAYS  # Listing + payload penuh semua hari
+    assert len(manifest['docs']) == DAYS - 1 and list(open_days) == [date.today().isoformat()]
+
+    reads = fake_db.reads
+    manifest, open_days = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    relisted = dashboard.MIRROR_RELIST_DAYS + 2  # Hari tutup buku yang di-listing ulang + hari terbaru + hari ini
+    assert fake_db.reads - reads == relisted + 1  # Listing sebagian + payload hari ini saja
+    assert len(manifest['docs']) == DAYS - 1 and list(open_days) == [date.today().isoformat()]
+
+
+def _edit_day(fake_db, day):
+    ref = fake_db.collection('branches').document(BRANCH).collection('daily_reports').document(day)
+    ref.update({"edited_by": "admin"})
+
+
+def test_sync_refetches_only_changed_day(fake_db):
+    manifest, _ = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    _edit_day(fake_db, max(manifest['docs']))
+
+    reads = fake_db.reads
+    dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    relisted = dashboard.MIRROR_RELIST_DAYS + 2
+    assert fake_db.reads - reads == relisted + 2  # Listing sebagian + hari yang diedit + hari ini
+
+
+def test_old_day_edit_needs_resync(fake_db):
+    manifest, _ = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    day = min(manifest['docs'])
+    _edit_day(fake_db, day)
+    t_before = manifest['docs'][day]['t']
+
+    manifest, _ = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    assert manifest['docs'][day]['t'] == t_before  # Di luar jendela listing -> tidak terbaca
+
+    dashboard.clear_branch_mirror(BRANCH)
+    reads = fake_db.reads
+    manifest, _ = dashboard.sync_branch_mirror(BRANCH, db=fake_db)
+    assert fake_db.reads - reads == 2 * DAYS  # Sinkron ulang: listing penuh + payload semua hari
+    assert manifest['docs'][day]['t'] != t_before
+
+
+def test_load_branch_tables_matches_normalize(fake_db):
+    df_orders, df_items = dashboard.load_branch_tables(BRANCH, db=fake_db)
+
+    transactions = []
+    for doc in fake_db.collection('branches').document(BRANCH).collection('daily_reports').stream():
+        transactions += dashboard._doc_to_transactions(doc.id, doc.to_dict())
+    exp_orders, exp_items = dashboard.normalize_transactions(transactions)
+
+    pd.testing.assert_frame_equal(as_plain(df_orders), as_plain(exp_orders))
+    pd.testing.assert_frame_equal(as_plain(df_items), as_plain(exp_items))
+
+    # Pembacaan kedua dari mirror menghasilkan tabel yang sama
+    again_orders, again_items = dashboard.load_branch_tables(BRANCH, db=fake_db)
+    pd.testing.assert_frame_equal(as_plain(again_orders), as_plain(df_orders))
+    pd.testing.assert_frame_equal(as_plain(again_items), as_plain(df_items))